@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLStore:
+    """
+    Thread-safe in-process key/value store with a fixed TTL and a size bound.
+    Entries are kept in insertion order, which with a fixed TTL is also expiry
+    order, so eviction only ever looks at the head of the dict.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            return default if entry is None else entry[1]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            self._evict(now)
+
+    def setdefault(self, key, value):
+        """Atomically store value unless key is present; return the stored value."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+            self._entries[key] = (now + self.ttl_seconds, value)
+            return value
+
+    def replace(self, key, value):
+        """Update the value of a live entry without extending its TTL."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class DerivedCache:
+    """
+    TTLStore for values derived from the database and dropped on writes.
+    Every invalidate() bumps the key's generation; a value built while a
+    write committed is returned to its caller but never stored, so a
+    concurrent rebuild cannot cache what the write just made stale.
+
+    With group(key) several keys share one generation (e.g. every date window
+    of one dimension) and invalidate_group() drops them all at once.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000, group=None):
+        self._store = TTLStore(ttl_seconds, max_entries)
+        self._group = group or (lambda key: key)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        value = self._store.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            generation = self._generations.get(self._group(key), 0)
+        value = build()
+        with self._lock:
+            if self._generations.get(self._group(key), 0) == generation:
+                self._store.set(key, value)
+        return value
+
+    def update(self, key, patch) -> bool:
+        """
+        Replace a cached value with patch(value) (keeping its expiry) and
+        count as an invalidation for builds in flight. Returns False when the
+        key was not cached or patch returned None; the key is then dropped.
+        """
+        with self._lock:
+            group = self._group(key)
+            self._generations[group] = self._generations.get(group, 0) + 1
+            value = self._store.get(key)
+            patched = None if value is None else patch(value)
+            if patched is None:
+                self._store.pop(key)
+                return False
+            self._store.replace(key, patched)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            group = self._group(key)
+            self._generations[group] = self._generations.get(group, 0) + 1
+        self._store.pop(key)
+
+    def invalidate_group(self, group):
+        """Drop every key with group(key) == group, builds in flight included."""
+        with self._lock:
+            self._generations[group] = self._generations.get(group, 0) + 1
+        self._store.invalidate(lambda key: self._group(key) == group)
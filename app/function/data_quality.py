@@ -0,0 +1,222 @@
+import logging
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import delete, func, insert, literal, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from . import shifts_fn
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 50000
+OVERRUN_FACTOR = 1.5  # actual above target_qty * cavities * this is implausible
+STALE_SCAN_HOURS = 6  # a scan still "running" after this died with its process
+
+RULE_ACTUAL_OVER_CAPACITY = "actual_over_capacity"
+RULE_DOWNTIME_OVER_SHIFT = "downtime_over_shift"
+RULE_REJECTION_OVER_ACTUAL = "rejection_over_actual"
+RULES = (RULE_ACTUAL_OVER_CAPACITY, RULE_DOWNTIME_OVER_SHIFT, RULE_REJECTION_OVER_ACTUAL)
+
+
+def _keys(log_dates, log_ids):
+    """(log_date, id) packed into one sortable int64, matching the scan order."""
+    return log_dates.astype(np.int64) * (1 << 32) + log_ids
+
+
+def _child_totals(db: Session, child, value_column, tenant_id: int, first: date, last: date):
+    """Per-log sums of a child table over the chunk's dates, as (keys, totals) arrays."""
+    rows = db.execute(
+        select(child.log_date, child.production_log_id, func.sum(value_column))
+        .where(child.tenant_id == tenant_id, child.log_date.between(first, last))
+        .group_by(child.log_date, child.production_log_id)
+    ).all()
+    n = len(rows)
+    days = np.fromiter((r[0].toordinal() for r in rows), dtype=np.int64, count=n)
+    ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+    totals = np.fromiter((r[2] or 0 for r in rows), dtype=np.float64, count=n)
+    return _keys(days, ids), totals
+
+
+def _spread(log_keys, child_keys, totals):
+    """Child totals aligned to the (sorted) chunk keys, 0 where a log has no children."""
+    out = np.zeros(len(log_keys))
+    if len(child_keys) and len(log_keys):
+        at = np.minimum(np.searchsorted(log_keys, child_keys), len(log_keys) - 1)
+        hit = log_keys[at] == child_keys
+        out[at[hit]] = totals[hit]
+    return out
+
+
+def evaluate(actual, target, cavities, shift_min, downtime, rejected):
+    """Rule name -> (mask, value, limit) over one chunk; all inputs are aligned arrays."""
+    capacity = target * cavities * OVERRUN_FACTOR
+    return {
+        RULE_ACTUAL_OVER_CAPACITY: (actual > capacity, actual, capacity),
+        RULE_DOWNTIME_OVER_SHIFT: (downtime > shift_min, downtime, shift_min),
+        RULE_REJECTION_OVER_ACTUAL: (rejected > actual, rejected, actual),
+    }
+
+
+def _shift_minutes(db: Session, tenant_id: int):
+    timings = (
+        db.query(models.ShiftTiming.id, models.ShiftTiming.shift_start, models.ShiftTiming.shift_end)
+        .join(models.TenantShift, models.TenantShift.id == models.ShiftTiming.tenant_shift_id)
+        .filter(models.TenantShift.tenant_id == tenant_id)
+        .order_by(models.ShiftTiming.id)
+        .all()
+    )
+    ids = np.array([t.id for t in timings], dtype=np.int64)
+    minutes = np.array([shifts_fn.calculate_duration(t.shift_start, t.shift_end) * 60 for t in timings])
+    return ids, minutes
+
+
+def scan(
+    db: Session,
+    tenant_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    scan_id: Optional[int] = None
+) -> dict:
+    """
+    Check the tenant's production logs in [start_date, end_date] in keyset
+    chunks of CHUNK_SIZE (log_date, id), one commit per chunk. Each chunk's
+    children are summed per log over the chunk's dates, the rules run as
+    array comparisons, and the findings of the chunk's key range are
+    replaced, so fixed logs lose their findings on the next scan.
+    """
+    log = models.ProductionLog
+    finding = models.DataQualityFinding
+    timing_ids, timing_minutes = _shift_minutes(db, tenant_id)
+
+    in_range = [log.tenant_id == tenant_id]
+    finding_range = [finding.tenant_id == tenant_id]
+    if start_date is not None:
+        in_range.append(log.log_date >= start_date)
+        finding_range.append(finding.log_date >= start_date)
+    if end_date is not None:
+        in_range.append(log.log_date <= end_date)
+        finding_range.append(finding.log_date <= end_date)
+
+    cursor = None
+    scanned = found = 0
+    while True:
+        query = (
+            select(log.log_date, log.id, log.shift_time_id, log.actual_qty, log.target_qty, models.Mold.cavities)
+            .join(models.Mold, models.Mold.id == log.mold_id)
+            .where(*in_range)
+            .order_by(log.log_date, log.id)
+            .limit(CHUNK_SIZE)
+        )
+        if cursor is not None:
+            query = query.where(tuple_(log.log_date, log.id) > tuple_(literal(cursor[0]), literal(cursor[1])))
+        rows = db.execute(query).all()
+
+        replaced = list(finding_range)
+        if cursor is not None:
+            replaced.append(tuple_(finding.log_date, finding.production_log_id) > tuple_(literal(cursor[0]), literal(cursor[1])))
+        if not rows:
+            # findings past the last log in range belong to logs deleted since
+            db.execute(delete(finding).where(*replaced))
+            db.commit()
+            break
+
+        n = len(rows)
+        log_dates = np.fromiter((r[0].toordinal() for r in rows), dtype=np.int64, count=n)
+        log_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)
+        shift_ids = np.fromiter((r[2] for r in rows), dtype=np.int64, count=n)
+        values = np.array([(r[3], r[4], r[5]) for r in rows], dtype=np.float64)
+        keys = _keys(log_dates, log_ids)
+
+        first, last = rows[0][0], rows[-1][0]
+        downtime = _spread(keys, *_child_totals(
+            db, models.ProductionDowntime, models.ProductionDowntime.duration_min, tenant_id, first, last
+        ))
+        rejected = _spread(keys, *_child_totals(
+            db, models.ProductionRejection, models.ProductionRejection.quantity, tenant_id, first, last
+        ))
+        at = np.minimum(np.searchsorted(timing_ids, shift_ids), max(len(timing_ids) - 1, 0))
+        shift_min = np.where(timing_ids[at] == shift_ids, timing_minutes[at], np.inf) if len(timing_ids) else np.full(n, np.inf)
+
+        findings = []
+        for rule, (mask, value, limit) in evaluate(values[:, 0], values[:, 1], values[:, 2], shift_min, downtime, rejected).items():
+            for i in np.flatnonzero(mask):
+                findings.append({
+                    "tenant_id": tenant_id,
+                    "production_log_id": int(log_ids[i]),
+                    "log_date": rows[i][0],
+                    "rule": rule,
+                    "value": float(value[i]),
+                    "limit": float(limit[i]),
+                    "scan_id": scan_id
+                })
+
+        cursor = (rows[-1][0], rows[-1][1])
+        replaced.append(tuple_(finding.log_date, finding.production_log_id) <= tuple_(literal(cursor[0]), literal(cursor[1])))
+        db.execute(delete(finding).where(*replaced))
+        if findings:
+            db.execute(insert(finding), findings)
+
+        scanned += n
+        found += len(findings)
+        if scan_id is not None:
+            db.execute(
+                update(models.DataQualityScan)
+                .where(models.DataQualityScan.id == scan_id)
+                .values(scanned_logs=scanned, finding_count=found)
+            )
+        db.commit()
+
+    return {"scanned_logs": scanned, "finding_count": found}
+
+
+def start_scan(db: Session, tenant_id: int, user_id: Optional[int], start_date: Optional[date], end_date: Optional[date]):
+    """Queue a scan for the tenant; raises ValueError while another one is in flight."""
+    db.execute(
+        update(models.DataQualityScan)
+        .where(
+            models.DataQualityScan.tenant_id == tenant_id,
+            models.DataQualityScan.status.in_(("queued", "running")),
+            models.DataQualityScan.created_at < func.now() - text(f"interval '{STALE_SCAN_HOURS} hours'")
+        )
+        .values(status="failed", error="abandoned", finished_at=func.now())
+    )
+    scan_row = models.DataQualityScan(
+        tenant_id=tenant_id, start_date=start_date, end_date=end_date, status="queued", created_by=user_id
+    )
+    db.add(scan_row)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("A data quality scan is already queued or running for this tenant")
+    db.refresh(scan_row)
+    return scan_row
+
+
+def run_scan(scan_id: int):
+    """Execute a queued scan on its own session (background task or CLI)."""
+    db = SessionLocal()
+    try:
+        scan_row = db.get(models.DataQualityScan, scan_id)
+        scan_row.status = "running"
+        db.commit()
+        scan(db, scan_row.tenant_id, scan_row.start_date, scan_row.end_date, scan_id)
+        scan_row.status = "done"
+        scan_row.finished_at = func.now()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.exception("data quality scan %s failed", scan_id)
+        db.execute(
+            update(models.DataQualityScan)
+            .where(models.DataQualityScan.id == scan_id)
+            .values(status="failed", error=str(e)[:1000], finished_at=func.now())
+        )
+        db.commit()
+    finally:
+        db.close()
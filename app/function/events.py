@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+QUEUE_SIZE = 100
+
+
+class EventBroker:
+    """
+    In-process, tenant-scoped fan-out. Each subscriber (one WebSocket) owns a
+    bounded asyncio.Queue on its event loop; publish() may be called from any
+    thread (sync endpoints, the write-behind worker) and serialises the event
+    once for all subscribers. A subscriber that falls behind loses its oldest
+    events instead of blocking publishers. One broker per worker process.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, tenant_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[tenant_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, tenant_id: int, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(tenant_id)
+            if subscribers:
+                subscribers.difference_update({s for s in subscribers if s[1] is queue})
+                if not subscribers:
+                    del self._subscribers[tenant_id]
+
+    def subscriber_count(self, tenant_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(tenant_id, ()))
+
+    def publish(self, tenant_id: int, events: List[dict]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(tenant_id, ()))
+        if not subscribers or not events:
+            return
+        messages = [json.dumps(jsonable_encoder(e), separators=(",", ":")) for e in events]
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, messages)
+            except RuntimeError:
+                # event loop already closed, the socket is gone
+                self.unsubscribe(tenant_id, queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, messages: List[str]):
+        for message in messages:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+
+broker = EventBroker()
+
+
+def _production_event(payload: dict, result: dict) -> dict:
+    return {
+        "type": "production_log",
+        "status": result["status"],
+        "production_log_id": result["production_log_id"],
+        "efficiency": result["efficiency"],
+        "machine_id": payload["machine_id"],
+        "mold_id": payload["mold_id"],
+        "shift_id": payload["shift_id"],
+        "log_date": payload["log_date"],
+        "actual_qty": payload["actual_qty"],
+    }
+
+
+def _inspection_event(payload: dict, result: dict) -> dict:
+    return {
+        "type": "inspection_result",
+        "status": result["status"],
+        "result_id": result["result_id"],
+        "inspection_id": payload["inspection_id"],
+        "shift_timingid": payload["shift_timingid"],
+        "inspection_date": payload["inspection_date"],
+        "inspection_hour": payload["inspection_hour"],
+        "measured_value": payload.get("measured_value"),
+        "go_no_go": payload.get("go_no_go"),
+    }
+
+
+_EVENT_BUILDERS = {
+    "production_log": _production_event,
+    "inspection_result": _inspection_event,
+}
+
+
+def publish_writes(kind: str, tenant_id: int, payloads: List[dict], results: List[dict]):
+    """
+    Broadcast committed writes to the tenant's subscribers. Call only after
+    commit; rejected entries are skipped. payloads are the request bodies as
+    dicts, results the matching write results (same order).
+    """
+    if not broker.subscriber_count(tenant_id):
+        return
+    build = _EVENT_BUILDERS[kind]
+    broker.publish(tenant_id, [
+        build(payload, result)
+        for payload, result in zip(payloads, results)
+        if result and result.get("status") != "rejected"
+    ])
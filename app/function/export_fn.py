@@ -0,0 +1,159 @@
+import csv
+import io
+from datetime import date
+from typing import Iterator, Optional
+
+from sqlalchemy import literal, select, true, union_all
+from sqlalchemy.orm import Session
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is disabled without it, CSV still works
+    pa = pq = None
+
+from .. import models
+from ..database import SessionLocal
+
+CHUNK_ROWS = 2000
+
+EXPORT_COLUMNS = [
+    "production_log_id", "log_date", "shift_time_id", "machine_id", "machine_code",
+    "mold_id", "mold_no", "operator", "target_qty", "actual_qty",
+    "record_type", "reason_id", "reason_name", "value"
+]
+
+
+def export_statement(
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    machine_id: Optional[int] = None,
+    mold_id: Optional[int] = None
+):
+    """
+    One row per downtime or rejection record (record_type "downtime"/"rejection",
+    value = minutes/quantity) repeated with its log columns; logs without
+    children still get a single row with empty child columns.
+    """
+    log = models.ProductionLog
+    downtimes = (
+        select(
+            literal("downtime").label("record_type"),
+            models.ProductionDowntime.downtime_id.label("reason_id"),
+            models.DownTime.downtime_name.label("reason_name"),
+            models.ProductionDowntime.duration_min.label("value")
+        )
+        .join(models.DownTime, models.DownTime.id == models.ProductionDowntime.downtime_id)
+        .where(
+            models.ProductionDowntime.production_log_id == log.id,
+            models.ProductionDowntime.log_date == log.log_date
+        )
+    )
+    rejections = (
+        select(
+            literal("rejection"),
+            models.ProductionRejection.defect_id,
+            models.Defect.defect_name,
+            models.ProductionRejection.quantity
+        )
+        .join(models.Defect, models.Defect.id == models.ProductionRejection.defect_id)
+        .where(
+            models.ProductionRejection.production_log_id == log.id,
+            models.ProductionRejection.log_date == log.log_date
+        )
+    )
+    children = union_all(downtimes, rejections).subquery().lateral("children")
+
+    stmt = (
+        select(
+            log.id, log.log_date, log.shift_time_id, log.machine_id, models.Machine.machine_code,
+            log.mold_id, models.Mold.mold_no, log.operator, log.target_qty, log.actual_qty,
+            children.c.record_type, children.c.reason_id, children.c.reason_name, children.c.value
+        )
+        .join(models.Machine, models.Machine.id == log.machine_id)
+        .join(models.Mold, models.Mold.id == log.mold_id)
+        .outerjoin(children, true())
+        .where(log.tenant_id == tenant_id, log.log_date.between(start_date, end_date))
+        .order_by(log.log_date, log.id, children.c.record_type, children.c.reason_id)
+    )
+    if machine_id is not None:
+        stmt = stmt.where(log.machine_id == machine_id)
+    if mold_id is not None:
+        stmt = stmt.where(log.mold_id == mold_id)
+    return stmt
+
+
+def _partitions(stmt) -> Iterator[list]:
+    """
+    Yield lists of at most CHUNK_ROWS rows from a server-side cursor.
+    The session is owned here, not by the request, because the response body
+    is produced after the endpoint (and its get_db session) has returned.
+    """
+    db: Session = SessionLocal()
+    try:
+        result = db.execute(stmt, execution_options={"yield_per": CHUNK_ROWS})
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
+
+
+def stream_csv(stmt) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in _partitions(stmt):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def stream_parquet(stmt) -> Iterator[bytes]:
+    """One Parquet row group per cursor chunk. Needs pyarrow, see parquet_available()."""
+    schema = pa.schema([
+        ("production_log_id", pa.int64()), ("log_date", pa.date32()), ("shift_time_id", pa.int64()),
+        ("machine_id", pa.int64()), ("machine_code", pa.string()), ("mold_id", pa.int64()),
+        ("mold_no", pa.string()), ("operator", pa.int64()), ("target_qty", pa.int64()),
+        ("actual_qty", pa.int64()), ("record_type", pa.string()), ("reason_id", pa.int64()),
+        ("reason_name", pa.string()), ("value", pa.int64())
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in _partitions(stmt):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,80 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Date, cast, extract, func, or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def missing_entries(
+    db: Session,
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    machine_id: Optional[int] = None,
+    limit: int = 1000
+) -> dict:
+    """
+    Every (date, shift timing, mold-machine mapping) in the range that has no
+    production_log, found with one query: generate_series over the dates,
+    joined to the shift timings running on that weekday (weekday NULL means
+    every day) and to the tenant's mold-machine mappings, anti-joined against
+    production_log on its unique key. Cells before the timing or the mapping
+    existed, or of shifts that have not ended yet, are not expected.
+    """
+    days = select(
+        cast(func.generate_series(start_date, end_date, func.make_interval(0, 0, 0, 1)), Date).label("day")
+    ).subquery("days")
+    timing = models.ShiftTiming
+    mapping = models.MoldMachine
+    log = models.ProductionLog
+
+    weekday = extract("isodow", days.c.day) - 1  # ShiftTiming.weekday: 0 = Monday
+    grid = (
+        select(
+            days.c.day.label("log_date"),
+            timing.id.label("shift_time_id"),
+            timing.tenant_shift_id,
+            mapping.mold_id,
+            mapping.machine_id,
+            func.count().over().label("total_missing")
+        )
+        .select_from(days)
+        .join(timing, or_(timing.weekday.is_(None), timing.weekday == weekday))
+        .join(models.TenantShift, models.TenantShift.id == timing.tenant_shift_id)
+        .join(mapping, mapping.tenant_id == models.TenantShift.tenant_id)
+        .where(
+            models.TenantShift.tenant_id == tenant_id,
+            days.c.day >= func.date(timing.created_at),
+            days.c.day >= func.date(mapping.created_at),
+            # same rule as create: a shift can be logged once it has ended
+            days.c.day + timing.shift_end <= func.localtimestamp(),
+            ~select(log.id).where(
+                log.tenant_id == tenant_id,
+                log.log_date == days.c.day,
+                log.shift_time_id == timing.id,
+                log.mold_id == mapping.mold_id,
+                log.machine_id == mapping.machine_id
+            ).exists()
+        )
+        .order_by(days.c.day, timing.id, mapping.machine_id, mapping.mold_id)
+        .limit(limit)
+    )
+    if machine_id is not None:
+        grid = grid.where(mapping.machine_id == machine_id)
+
+    rows = db.execute(grid).all()
+    return {
+        "total_missing": rows[0].total_missing if rows else 0,
+        "items": [
+            {
+                "log_date": r.log_date,
+                "shift_time_id": r.shift_time_id,
+                "tenant_shift_id": r.tenant_shift_id,
+                "mold_id": r.mold_id,
+                "machine_id": r.machine_id
+            }
+            for r in rows
+        ]
+    }
@@ -0,0 +1,77 @@
+import hashlib
+import json
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from .cache import TTLStore
+
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_KEY_LENGTH = 255
+
+# (scope, key) -> (payload digest, (status_code, compact JSON body) or None while in flight)
+_store = TTLStore(IDEMPOTENCY_TTL_SECONDS, max_entries=100000)
+
+
+def fingerprint(payload) -> bytes:
+    """sha256 digest of the canonical JSON form of the request payload."""
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).digest()
+
+
+def run(key: Optional[str], scope: str, payload, fn: Callable, status_code: int = status.HTTP_200_OK):
+    """
+    Execute fn() once per (scope, Idempotency-Key).
+    A replay with the same payload gets the stored response back without calling fn,
+    a replay with a different payload is rejected with 422 and a replay while the
+    first request is still running gets 409. Failed requests are not stored, so
+    they can be retried with the same key.
+    """
+    if not key:
+        return fn()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"
+        )
+
+    store_key = (scope, key)
+    digest = fingerprint(payload)
+    entry = (digest, None)
+    existing = _store.setdefault(store_key, entry)
+
+    if existing is not entry:
+        stored_digest, response = existing
+        if stored_digest != digest:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request payload"
+            )
+        if response is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        stored_status, body = response
+        return Response(
+            content=body,
+            status_code=stored_status,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    try:
+        result = fn()
+    except BaseException:
+        _store.pop(store_key)
+        raise
+
+    if isinstance(result, JSONResponse):
+        response = (result.status_code, bytes(result.body))
+    else:
+        body = json.dumps(jsonable_encoder(result), separators=(",", ":")).encode()
+        response = (status_code, body)
+    _store.replace(store_key, (digest, response))
+    return result
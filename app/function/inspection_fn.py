@@ -0,0 +1,205 @@
+from datetime import time
+from typing import List
+
+from sqlalchemy import func, insert, text, tuple_
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from . import events, inspection_stats, run_rules, spc, timeapp
+
+MAX_INSPECTIONS_PER_SHIFT = 8  # per dimension (inspection_id), shift timing and date
+MAX_BATCH_SIZE = 1000
+BACKFILL_BATCH_SIZE = 50000
+
+
+def _rejected(index: int, status_code: int, detail: str) -> dict:
+    return {"index": index, "status": "rejected", "status_code": status_code, "detail": detail}
+
+
+def validate_results(db: Session, tenant_id: int, rows: List[schemas.ProductInspectionResultCreate]):
+    """
+    Validate a batch of inspection results with one query per rule
+    (inspection, inspector, shift timing, per-shift cap, duplicates); the
+    hour/shift window check runs in memory. The cap and the duplicate key are
+    per dimension: each inspection_id gets one reading per hour and at most
+    MAX_INSPECTIONS_PER_SHIFT per shift. Returns (accepted, results) where
+    accepted is a list of (index, payload, drawing_id) and results holds the
+    rejection entry for every rejected index.
+    """
+    results = [None] * len(rows)
+
+    inspection_ids = {r.inspection_id for r in rows}
+    inspector_ids = {r.inspector_id for r in rows}
+    shift_ids = {r.shift_timingid for r in rows}
+    shift_dates = {(r.inspection_id, r.shift_timingid, r.inspection_date) for r in rows}
+    keys = {(r.inspection_id, r.inspection_date, r.inspection_hour) for r in rows}
+
+    inspections = {
+        row.id: row.drawing_id for row in
+        db.query(models.ProductInspection.id, models.ProductInspection.drawing_id)
+        .filter(models.ProductInspection.id.in_(inspection_ids), models.ProductInspection.tenant_id == tenant_id)
+        .all()
+    }
+
+    inspectors = {
+        uid for (uid,) in
+        db.query(models.User.id)
+        .filter(models.User.id.in_(inspector_ids), models.User.tenant_id == tenant_id)
+        .all()
+    }
+
+    shifts = {
+        row.id: (row.shift_start, row.shift_end) for row in
+        db.query(models.ShiftTiming.id, models.ShiftTiming.shift_start, models.ShiftTiming.shift_end)
+        .join(models.TenantShift)
+        .filter(models.ShiftTiming.id.in_(shift_ids), models.TenantShift.tenant_id == tenant_id)
+        .all()
+    }
+
+    result = models.ProductInspectionResult
+    counts = {
+        (row.inspection_id, row.shift_timingid, row.inspection_date): row.total for row in
+        db.query(result.inspection_id, result.shift_timingid, result.inspection_date, func.count().label("total"))
+        .filter(tuple_(result.inspection_id, result.shift_timingid, result.inspection_date).in_(shift_dates))
+        .group_by(result.inspection_id, result.shift_timingid, result.inspection_date)
+        .all()
+    }
+
+    duplicates = {
+        tuple(row) for row in
+        db.query(result.inspection_id, result.inspection_date, result.inspection_hour)
+        .filter(tuple_(result.inspection_id, result.inspection_date, result.inspection_hour).in_(keys))
+        .all()
+    }
+
+    accepted = []
+    for i, r in enumerate(rows):
+        key = (r.inspection_id, r.inspection_date, r.inspection_hour)
+        shift_date = (r.inspection_id, r.shift_timingid, r.inspection_date)
+
+        if r.inspection_id not in inspections:
+            results[i] = _rejected(i, 404, f"Inspection {r.inspection_id} not found for this tenant.")
+        elif r.inspector_id is None or r.shift_timingid is None or r.inspection_hour is None:
+            results[i] = _rejected(i, 400, "inspector_id, shift_timingid and inspection_hour are required.")
+        elif r.inspector_id not in inspectors:
+            results[i] = _rejected(i, 400, f"Inspector ID {r.inspector_id} does not exist for this tenant.")
+        elif r.shift_timingid not in shifts:
+            results[i] = _rejected(i, 400, "Invalid shift_timingid for this tenant.")
+        elif not timeapp.is_time_in_shift_range(time(r.inspection_hour, 0), *shifts[r.shift_timingid]):
+            shift_start, shift_end = shifts[r.shift_timingid]
+            results[i] = _rejected(
+                i, 400,
+                f"Inspection hour {r.inspection_hour:02d}:00 is outside shift time range "
+                f"{shift_start.strftime('%H:%M')} - {shift_end.strftime('%H:%M')}."
+            )
+        elif counts.get(shift_date, 0) >= MAX_INSPECTIONS_PER_SHIFT:
+            results[i] = _rejected(
+                i, 400, f"Maximum inspection count ({MAX_INSPECTIONS_PER_SHIFT}) reached for this dimension and shift."
+            )
+        elif key in duplicates:
+            results[i] = _rejected(i, 400, "Duplicate inspection result detected.")
+        else:
+            # Later rows in the batch see the ones accepted before them
+            counts[shift_date] = counts.get(shift_date, 0) + 1
+            duplicates.add(key)
+            accepted.append((i, r, inspections[r.inspection_id]))
+
+    return accepted, results
+
+
+def write_results(db: Session, tenant_id: int, user_id: int, rows: List[schemas.ProductInspectionResultCreate]) -> List[dict]:
+    """
+    Validate and insert a batch of inspection results with one multi-row INSERT
+    and fold them into the running stats. Nothing is committed; the caller owns
+    the transaction.
+    Returns one result entry per input row, in input order.
+    """
+    accepted, results = validate_results(db, tenant_id, rows)
+    if not accepted:
+        return results
+
+    new_ids = db.scalars(
+        insert(models.ProductInspectionResult).returning(models.ProductInspectionResult.id, sort_by_parameter_order=True),
+        [
+            {**r.model_dump(), "tenant_id": tenant_id, "drawing_id": drawing_id, "created_by": user_id, "updated_by": user_id}
+            for _, r, drawing_id in accepted
+        ]
+    ).all()
+    inspection_stats.add_results(db, new_ids)
+
+    for (i, _, _), result_id in zip(accepted, new_ids):
+        results[i] = {"index": i, "status": "created", "result_id": result_id}
+
+    return results
+
+
+def committed(tenant_id: int, payloads: List[dict], results: List[dict]):
+    """Side effects that must wait for the commit: cached SPC charts, live events and run-rule alerts."""
+    for inspection_id in {p["inspection_id"] for p, r in zip(payloads, results) if r["status"] == "created"}:
+        spc.invalidate(tenant_id, inspection_id)
+    events.publish_writes("inspection_result", tenant_id, payloads, results)
+    run_rules.evaluate(tenant_id, payloads, results)
+
+
+def use_per_dimension_keys(db: Session) -> bool:
+    """
+    One-off for databases created with the old per-shift-hour unique key
+    (one reading per shift and hour across all dimensions): swap it for the
+    per-dimension key. Returns False when there is nothing to do.
+    """
+    old = db.execute(text("SELECT 1 FROM pg_constraint WHERE conname = 'uix_shift_hourly_unique'")).scalar()
+    if not old:
+        return False
+    db.execute(text("ALTER TABLE product_inspection_result DROP CONSTRAINT uix_shift_hourly_unique"))
+    db.execute(text(
+        "ALTER TABLE product_inspection_result ADD CONSTRAINT uix_inspection_hourly_unique"
+        " UNIQUE (inspection_id, inspection_date, inspection_hour)"
+    ))
+    return True
+
+
+def denormalize_tenant(db: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    One-off for databases created before product_inspection and
+    product_inspection_result carried tenant_id (and the result drawing_id):
+    add the columns, backfill the results in id ranges of batch_size with a
+    commit each so row locks stay short, then enforce NOT NULL and build the
+    tenant indexes. Safe to re-run. Returns the number of results backfilled.
+    """
+    for statement in (
+        "ALTER TABLE product_inspection ADD COLUMN IF NOT EXISTS tenant_id integer REFERENCES tenant(id) ON DELETE CASCADE",
+        "ALTER TABLE product_inspection_result ADD COLUMN IF NOT EXISTS tenant_id integer REFERENCES tenant(id) ON DELETE CASCADE",
+        "ALTER TABLE product_inspection_result ADD COLUMN IF NOT EXISTS drawing_id integer REFERENCES product_drawing(id) ON DELETE CASCADE",
+    ):
+        db.execute(text(statement))
+    db.execute(text(
+        "UPDATE product_inspection AS i SET tenant_id = p.tenant_id"
+        " FROM product_drawing AS d JOIN product AS p ON p.id = d.product_id"
+        " WHERE d.id = i.drawing_id AND i.tenant_id IS NULL"
+    ))
+    db.commit()
+
+    backfilled = 0
+    last_id = db.execute(text("SELECT coalesce(max(id), 0) FROM product_inspection_result")).scalar()
+    for low in range(0, last_id, batch_size):
+        backfilled += db.execute(text(
+            "UPDATE product_inspection_result AS r SET tenant_id = i.tenant_id, drawing_id = i.drawing_id"
+            " FROM product_inspection AS i"
+            " WHERE i.id = r.inspection_id AND r.id > :low AND r.id <= :high AND r.tenant_id IS NULL"
+        ), {"low": low, "high": low + batch_size}).rowcount
+        db.commit()
+
+    for statement in (
+        "ALTER TABLE product_inspection ALTER COLUMN tenant_id SET NOT NULL",
+        "ALTER TABLE product_inspection_result ALTER COLUMN tenant_id SET NOT NULL",
+        "ALTER TABLE product_inspection_result ALTER COLUMN drawing_id SET NOT NULL",
+    ):
+        db.execute(text(statement))
+    for model, name in (
+        (models.ProductInspection, "ix_product_inspection_tenant_drawing"),
+        (models.ProductInspectionResult, "ix_product_inspection_result_tenant_date"),
+        (models.ProductInspectionResult, "ix_product_inspection_result_tenant_drawing"),
+    ):
+        next(i for i in model.__table__.indexes if i.name == name).create(db.connection(), checkfirst=True)
+    db.commit()
+    return backfilled
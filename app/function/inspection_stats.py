@@ -0,0 +1,172 @@
+import math
+from typing import Iterable, List, Optional
+
+from sqlalchemy import case, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import spc
+
+COLUMNS = [
+    "tenant_id", "inspection_id", "reading_count", "value_count",
+    "mean", "m2", "min_value", "max_value", "out_of_tolerance"
+]
+
+
+def _aggregate(*where):
+    """Per-dimension partial stats of the matching results, in the order of COLUMNS."""
+    result = models.ProductInspectionResult
+    inspection = models.ProductInspection
+    value = result.measured_value
+    out_of_tolerance = or_(result.go_no_go.is_(False), value < inspection.lower_limit, value > inspection.upper_limit)
+    return (
+        select(
+            result.tenant_id,
+            result.inspection_id,
+            func.count(),
+            func.count(value),
+            func.coalesce(func.avg(value), 0.0),
+            func.coalesce(func.var_pop(value) * func.count(value), 0.0),
+            func.min(value),
+            func.max(value),
+            func.count().filter(out_of_tolerance)
+        )
+        .join(inspection, inspection.id == result.inspection_id)
+        .where(*where)
+        .group_by(result.tenant_id, result.inspection_id)
+        # stable row-lock order between transactions
+        .order_by(result.inspection_id)
+    )
+
+
+def add_results(db: Session, result_ids: Iterable[int]):
+    """
+    Fold freshly written results into the running stats with one upsert:
+    the batch's (n, mean, M2) per dimension is combined with the stored one
+    using Chan et al.'s pairwise update, so concurrent writers never lose
+    readings. Nothing is committed.
+    """
+    result_ids = list(result_ids)
+    if not result_ids:
+        return
+    stats = models.InspectionStats
+    stmt = pg_insert(stats).from_select(COLUMNS, _aggregate(models.ProductInspectionResult.id.in_(result_ids)))
+    batch = stmt.excluded
+    count = stats.value_count + batch.value_count
+    delta = batch.mean - stats.mean
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["inspection_id"],
+        set_={
+            "reading_count": stats.reading_count + batch.reading_count,
+            "value_count": count,
+            "mean": case((count == 0, 0.0), else_=stats.mean + delta * batch.value_count / count),
+            "m2": case((count == 0, 0.0), else_=stats.m2 + batch.m2 + delta * delta * stats.value_count * batch.value_count / count),
+            "min_value": func.least(stats.min_value, batch.min_value),
+            "max_value": func.greatest(stats.max_value, batch.max_value),
+            "out_of_tolerance": stats.out_of_tolerance + batch.out_of_tolerance,
+            "updated_at": func.now()
+        }
+    ))
+
+
+def snapshot(db: Session, result_ids: Iterable[int]) -> List[dict]:
+    """Partial stats of results about to change or go; pass them to remove_results afterwards."""
+    rows = db.execute(_aggregate(models.ProductInspectionResult.id.in_(list(result_ids)))).all()
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def remove_results(db: Session, parts: List[dict]):
+    """
+    Take snapshot() parts back out of the running stats (the inverse of the
+    pairwise update). Call once the change is flushed: a removed extreme is
+    recomputed from the remaining results. Nothing is committed.
+    """
+    stats = models.InspectionStats
+    result = models.ProductInspectionResult
+    for part in parts:
+        count = stats.value_count - part["value_count"]
+        mean = (stats.mean * stats.value_count - part["mean"] * part["value_count"]) / count
+        m2 = stats.m2 - part["m2"] - (part["mean"] - mean) * (part["mean"] - mean) * count * part["value_count"] / stats.value_count
+        values = {
+            "reading_count": stats.reading_count - part["reading_count"],
+            "value_count": count,
+            "mean": case((count <= 0, 0.0), else_=mean),
+            "m2": case((count <= 0, 0.0), else_=func.greatest(m2, 0.0)),
+            "out_of_tolerance": stats.out_of_tolerance - part["out_of_tolerance"],
+            "updated_at": func.now()
+        }
+        remaining = result.inspection_id == part["inspection_id"]
+        if part["min_value"] is not None:
+            values["min_value"] = case(
+                (stats.min_value >= part["min_value"], select(func.min(result.measured_value)).where(remaining).scalar_subquery()),
+                else_=stats.min_value
+            )
+        if part["max_value"] is not None:
+            values["max_value"] = case(
+                (stats.max_value <= part["max_value"], select(func.max(result.measured_value)).where(remaining).scalar_subquery()),
+                else_=stats.max_value
+            )
+        db.execute(update(stats).where(stats.inspection_id == part["inspection_id"]).values(values))
+
+
+def rebuild(db: Session, tenant_id: Optional[int] = None, inspection_id: Optional[int] = None):
+    """
+    Recompute the running stats from the raw results: for every tenant, one
+    tenant or one dimension (e.g. after its limits changed). Also clears the
+    drift that removals can leave in M2.
+    """
+    stats = models.InspectionStats
+    scope, where = [], []
+    if tenant_id is not None:
+        scope.append(stats.tenant_id == tenant_id)
+        where.append(models.ProductInspectionResult.tenant_id == tenant_id)
+    if inspection_id is not None:
+        scope.append(stats.inspection_id == inspection_id)
+        where.append(models.ProductInspectionResult.inspection_id == inspection_id)
+
+    db.execute(delete(stats).where(*scope))
+    stmt = pg_insert(stats).from_select(COLUMNS, _aggregate(*where))
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["inspection_id"],
+        set_={**{c: stmt.excluded[c] for c in COLUMNS[2:]}, "updated_at": func.now()}
+    ))
+
+
+def lifetime(db: Session, tenant_id: int, inspection_id: int) -> Optional[dict]:
+    """Lifetime stats, yield and Cp/Cpk of the tenant's dimension from its stats row; None if it is not theirs."""
+    inspection = models.ProductInspection
+    stats = models.InspectionStats
+    row = (
+        db.query(inspection.id, inspection.dimension_name, inspection.lower_limit, inspection.upper_limit, stats)
+        .outerjoin(stats, stats.inspection_id == inspection.id)
+        .filter(inspection.id == inspection_id, inspection.tenant_id == tenant_id)
+        .first()
+    )
+    if not row:
+        return None
+
+    s = row.InspectionStats
+    readings = s.reading_count if s else 0
+    values = s.value_count if s else 0
+    sigma = math.sqrt(s.m2 / (values - 1)) if values > 1 else None
+    cp = cpk = None
+    if sigma is not None:
+        cp, cpk = spc.capability(s.mean, sigma, row.lower_limit, row.upper_limit)
+    return {
+        "inspection_id": row.id,
+        "dimension_name": row.dimension_name,
+        "lower_limit": row.lower_limit,
+        "upper_limit": row.upper_limit,
+        "readings": readings,
+        "measured_readings": values,
+        "mean": s.mean if values else None,
+        "std_dev": sigma,
+        "min_value": s.min_value if s else None,
+        "max_value": s.max_value if s else None,
+        "out_of_tolerance": s.out_of_tolerance if s else 0,
+        "yield_rate": round(1 - s.out_of_tolerance / readings, 4) if readings else None,
+        "cp": cp,
+        "cpk": cpk,
+        "updated_at": s.updated_at if s else None
+    }
@@ -0,0 +1,158 @@
+from datetime import date
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import shifts_fn
+
+
+def _log_filter(tenant_id: int, start_date: date, end_date: date, machine_id: Optional[int]):
+    criteria = [
+        models.ProductionLog.tenant_id == tenant_id,
+        models.ProductionLog.log_date.between(start_date, end_date),
+    ]
+    if machine_id is not None:
+        criteria.append(models.ProductionLog.machine_id == machine_id)
+    return criteria
+
+
+def _child_totals(db: Session, child, value_column, criteria, log_ids: np.ndarray) -> np.ndarray:
+    """Sum a child column per production log, aligned with the sorted log_ids array."""
+    rows = (
+        db.query(child.production_log_id, func.sum(value_column))
+        .join(models.ProductionLog, and_(
+            models.ProductionLog.id == child.production_log_id,
+            models.ProductionLog.log_date == child.log_date
+        ))
+        .filter(*criteria)
+        .group_by(child.production_log_id)
+        .all()
+    )
+    totals = np.zeros(len(log_ids), dtype=np.float64)
+    if rows:
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((r[1] or 0 for r in rows), dtype=np.float64, count=len(rows))
+        totals[np.searchsorted(log_ids, ids)] = values
+    return totals
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(numerator, dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def compute_oee(
+    db: Session,
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    machine_id: Optional[int] = None
+) -> List[dict]:
+    """
+    Availability, performance, quality and OEE per machine and shift over a date range.
+
+    Three queries pull the logs and their per-log downtime/rejection totals;
+    everything else is NumPy arrays keyed by log id:
+      availability = (planned - downtime) / planned   planned = shift duration
+      performance  = actual / target
+      quality      = (actual - rejected) / actual
+    Group values are ratios of summed numerators and denominators, so long
+    shifts and big runs weigh more than short ones.
+    """
+    criteria = _log_filter(tenant_id, start_date, end_date, machine_id)
+
+    logs = (
+        db.query(
+            models.ProductionLog.id,
+            models.ProductionLog.machine_id,
+            models.ProductionLog.shift_time_id,
+            models.ProductionLog.target_qty,
+            models.ProductionLog.actual_qty
+        )
+        .filter(*criteria)
+        .order_by(models.ProductionLog.id)
+        .all()
+    )
+    if not logs:
+        return []
+
+    n = len(logs)
+    log_ids = np.fromiter((r[0] for r in logs), dtype=np.int64, count=n)
+    machine_ids = np.fromiter((r[1] for r in logs), dtype=np.int64, count=n)
+    shift_time_ids = np.fromiter((r[2] for r in logs), dtype=np.int64, count=n)
+    target = np.fromiter((r[3] for r in logs), dtype=np.float64, count=n)
+    actual = np.fromiter((r[4] for r in logs), dtype=np.float64, count=n)
+
+    downtime = _child_totals(
+        db, models.ProductionDowntime, models.ProductionDowntime.duration_min,
+        criteria + [models.ProductionDowntime.log_date.between(start_date, end_date)], log_ids
+    )
+    rejected = _child_totals(
+        db, models.ProductionRejection, models.ProductionRejection.quantity,
+        criteria + [models.ProductionRejection.log_date.between(start_date, end_date)], log_ids
+    )
+
+    # Planned minutes and named shift per shift timing (overnight shifts handled by calculate_duration)
+    timings = (
+        db.query(
+            models.ShiftTiming.id,
+            models.ShiftTiming.tenant_shift_id,
+            models.ShiftTiming.shift_start,
+            models.ShiftTiming.shift_end
+        )
+        .filter(models.ShiftTiming.id.in_(np.unique(shift_time_ids).tolist()))
+        .all()
+    )
+    timing_ids = np.array(sorted(t.id for t in timings), dtype=np.int64)
+    by_id = {t.id: t for t in timings}
+    timing_minutes = np.array(
+        [shifts_fn.calculate_duration(by_id[i].shift_start, by_id[i].shift_end) * 60 for i in timing_ids],
+        dtype=np.float64
+    )
+    timing_shift = np.array([by_id[i].tenant_shift_id for i in timing_ids], dtype=np.int64)
+    timing_index = np.searchsorted(timing_ids, shift_time_ids)
+    planned = timing_minutes[timing_index]
+    tenant_shift_ids = timing_shift[timing_index]
+
+    # Group by (machine, shift) in one pass
+    keys = np.stack([machine_ids, tenant_shift_ids], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    size = len(groups)
+
+    def total(values):
+        return np.bincount(inverse, weights=values, minlength=size)
+
+    planned_sum = total(planned)
+    downtime_sum = total(np.minimum(downtime, planned))
+    target_sum = total(target)
+    actual_sum = total(actual)
+    rejected_sum = total(np.minimum(rejected, actual))
+    log_count = np.bincount(inverse, minlength=size)
+
+    availability = _ratio(planned_sum - downtime_sum, planned_sum)
+    performance = _ratio(actual_sum, target_sum)
+    quality = _ratio(actual_sum - rejected_sum, actual_sum)
+    oee = availability * performance * quality
+
+    return [
+        {
+            "machine_id": int(groups[g, 0]),
+            "tenant_shift_id": int(groups[g, 1]),
+            "log_count": int(log_count[g]),
+            "planned_min": float(planned_sum[g]),
+            "downtime_min": float(downtime_sum[g]),
+            "target_qty": int(target_sum[g]),
+            "actual_qty": int(actual_sum[g]),
+            "rejected_qty": int(rejected_sum[g]),
+            "availability": round(float(availability[g]), 4),
+            "performance": round(float(performance[g]), 4),
+            "quality": round(float(quality[g]), 4),
+            "oee": round(float(oee[g]), 4),
+        }
+        for g in range(size)
+    ]
@@ -0,0 +1,117 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Numeric, and_, cast, func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def _pareto(
+    db: Session,
+    child,
+    reason,
+    reason_column,
+    name_column,
+    value_column,
+    department_column,
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    machine_id: Optional[int],
+    mold_id: Optional[int],
+    department_id: Optional[int],
+    top_n: int
+) -> dict:
+    """
+    Group child rows by reason inside the database and rank them by total.
+    Percentages are taken over every reason in the range, so the cumulative
+    percentage of the last returned row tells how much the top N cover.
+    """
+    log = models.ProductionLog
+    totals = (
+        select(
+            reason.id.label("id"),
+            name_column.label("name"),
+            func.sum(value_column).label("total")
+        )
+        .select_from(child)
+        .join(log, and_(log.id == child.production_log_id, log.log_date == child.log_date))
+        .join(reason, reason.id == reason_column)
+        .where(
+            log.tenant_id == tenant_id,
+            log.log_date.between(start_date, end_date),
+            child.log_date.between(start_date, end_date)  # prunes child partitions
+        )
+        .group_by(reason.id, name_column)
+    )
+    if machine_id is not None:
+        totals = totals.where(log.machine_id == machine_id)
+    if mold_id is not None:
+        totals = totals.where(log.mold_id == mold_id)
+    if department_id is not None:
+        link = department_column.class_
+        totals = totals.where(reason.id.in_(
+            select(department_column).where(link.tenant_id == tenant_id, link.department_id == department_id)
+        ))
+    totals = totals.subquery()
+
+    grand_total = func.sum(totals.c.total).over()
+    running = func.sum(totals.c.total).over(order_by=(totals.c.total.desc(), totals.c.id))
+    ranked = (
+        select(
+            totals.c.id,
+            totals.c.name,
+            totals.c.total,
+            grand_total.label("grand_total"),
+            func.round(cast(100 * totals.c.total, Numeric) / grand_total, 2).label("percent"),
+            func.round(cast(100 * running, Numeric) / grand_total, 2).label("cumulative_percent")
+        )
+        .order_by(totals.c.total.desc(), totals.c.id)
+        .limit(top_n)
+    )
+    rows = db.execute(ranked).all()
+
+    return {
+        "grand_total": int(rows[0].grand_total) if rows else 0,
+        "items": [
+            {
+                "id": r.id,
+                "name": r.name,
+                "total": int(r.total),
+                "percent": float(r.percent),
+                "cumulative_percent": float(r.cumulative_percent)
+            }
+            for r in rows
+        ]
+    }
+
+
+def downtime_pareto(db: Session, tenant_id: int, start_date: date, end_date: date, machine_id: Optional[int] = None,
+                    mold_id: Optional[int] = None, department_id: Optional[int] = None, top_n: int = 10) -> dict:
+    """Downtime reasons ranked by summed duration_min."""
+    return _pareto(
+        db,
+        models.ProductionDowntime,
+        models.DownTime,
+        models.ProductionDowntime.downtime_id,
+        models.DownTime.downtime_name,
+        models.ProductionDowntime.duration_min,
+        models.DownTimeDepartment.downtime_id,
+        tenant_id, start_date, end_date, machine_id, mold_id, department_id, top_n
+    )
+
+
+def defect_pareto(db: Session, tenant_id: int, start_date: date, end_date: date, machine_id: Optional[int] = None,
+                  mold_id: Optional[int] = None, department_id: Optional[int] = None, top_n: int = 10) -> dict:
+    """Defects ranked by summed rejected quantity."""
+    return _pareto(
+        db,
+        models.ProductionRejection,
+        models.Defect,
+        models.ProductionRejection.defect_id,
+        models.Defect.defect_name,
+        models.ProductionRejection.quantity,
+        models.DefectDepartment.defect_id,
+        tenant_id, start_date, end_date, machine_id, mold_id, department_id, top_n
+    )
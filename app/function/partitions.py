@@ -0,0 +1,227 @@
+import re
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Parent first: children hold a foreign key to (production_log.id, log_date)
+PARTITIONED_TABLES = ("production_log", "production_downtime", "production_rejection")
+DEFAULT_MONTHS_AHEAD = 3
+
+_BOUND = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partitioned(db: Session) -> bool:
+    """True once production_log is a partitioned table (False for the old plain table)."""
+    relkind = db.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('production_log')")
+    ).scalar()
+    return relkind == "p"
+
+
+def monthly_partitions(db: Session, table: str) -> dict:
+    """{partition name: (from, to)} for the monthly partitions currently attached to table."""
+    rows = db.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": table}).all()
+    partitions = {}
+    for name, bound in rows:
+        match = _BOUND.search(bound or "")
+        if match:
+            partitions[name] = (date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2)))
+    return partitions
+
+
+def _default_months(db: Session) -> List[date]:
+    """Months that currently have rows parked in the default partition of production_log."""
+    return [
+        row[0] for row in db.execute(text(
+            f"SELECT DISTINCT date_trunc('month', log_date)::date FROM {default_partition_name('production_log')}"
+        )).all()
+    ]
+
+
+def _ensure_default(db: Session):
+    for table in PARTITIONED_TABLES:
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} PARTITION OF {table} DEFAULT"
+        ))
+
+
+def _create_month(db: Session, table: str, month: date):
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def _rehome_from_default(db: Session, months: List[date]):
+    """
+    Create partitions for months that already have rows in the default
+    partitions. A partition cannot be created while the default one holds rows
+    for its range, so the defaults are detached, the rows moved through the
+    parent (which routes them to the new partitions) and the defaults re-attached.
+    """
+    for table in reversed(PARTITIONED_TABLES):
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default_partition_name(table)}"))
+
+    for month in months:
+        bounds = {"lo": month, "hi": add_months(month, 1)}
+        for table in PARTITIONED_TABLES:
+            default = default_partition_name(table)
+            _create_month(db, table, month)
+            db.execute(text(
+                f"INSERT INTO {table} SELECT * FROM {default} WHERE log_date >= :lo AND log_date < :hi"
+            ), bounds)
+        for table in reversed(PARTITIONED_TABLES):
+            db.execute(text(
+                f"DELETE FROM {default_partition_name(table)} WHERE log_date >= :lo AND log_date < :hi"
+            ), bounds)
+
+    for table in PARTITIONED_TABLES:
+        db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default_partition_name(table)} DEFAULT"))
+
+
+def ensure_partitions(db: Session, start: date, end: date) -> List[str]:
+    """
+    Make sure every month from start to end (inclusive) has a partition on all
+    three tables, plus a default partition catching anything outside them.
+    Returns the names of the partitions created. Nothing is committed.
+    """
+    _ensure_default(db)
+
+    existing = set(monthly_partitions(db, "production_log"))
+    months, month = [], month_start(start)
+    while month <= end:
+        if partition_name("production_log", month) not in existing:
+            months.append(month)
+        month = add_months(month, 1)
+    if not months:
+        return []
+
+    parked = set(_default_months(db))
+    if parked.intersection(months):
+        _rehome_from_default(db, [m for m in months if m in parked])
+    for month in months:
+        if month not in parked:
+            for table in PARTITIONED_TABLES:
+                _create_month(db, table, month)
+
+    return [partition_name(table, m) for m in months for table in PARTITIONED_TABLES]
+
+
+def detach_partitions(db: Session, before: date) -> List[str]:
+    """
+    Detach monthly partitions whose range ends on or before `before`. The
+    detached tables are kept as standalone tables for archiving; their foreign
+    key to production_log is dropped since the referenced rows leave with them.
+    """
+    detached = []
+    months = sorted(
+        lo for lo, hi in monthly_partitions(db, "production_log").values() if hi <= before
+    )
+    for month in months:
+        for table in reversed(PARTITIONED_TABLES):
+            name = partition_name(table, month)
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+                continue
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            for (constraint,) in db.execute(text(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = to_regclass(:name) AND contype = 'f' "
+                "AND confrelid = to_regclass('production_log')"
+            ), {"name": name}).all():
+                db.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+            detached.append(name)
+    return detached
+
+
+def maintain(db: Session, months_ahead: int = DEFAULT_MONTHS_AHEAD, retain_months: Optional[int] = None) -> dict:
+    """
+    Create partitions from the current month up to months_ahead, give any month
+    that landed in the default partition (back-dated entries) its own partition,
+    and, when retain_months is set, detach partitions older than that.
+    """
+    today = date.today()
+    created = ensure_partitions(db, today, add_months(month_start(today), months_ahead))
+    for month in _default_months(db):
+        created += ensure_partitions(db, month, month)
+
+    detached = []
+    if retain_months is not None:
+        detached = detach_partitions(db, add_months(month_start(today), -retain_months))
+    return {"created": created, "detached": detached}
+
+
+def convert_existing(db: Session, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> bool:
+    """
+    One-off migration of plain production_log / production_downtime /
+    production_rejection tables to the partitioned layout: the old tables are
+    renamed, the new ones created from the models, rows copied (children get
+    log_date from their log), sequences moved past the copied ids and the old
+    tables dropped. Runs in the caller's transaction and takes exclusive locks,
+    so run it in a maintenance window. Returns False when already partitioned.
+    """
+    if is_partitioned(db):
+        return False
+
+    for table in PARTITIONED_TABLES:
+        old = f"{table}_unpartitioned"
+        db.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        # index and sequence names are schema wide, move them out of the way of the new tables
+        for (index,) in db.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t"
+        ), {"t": old}).all():
+            db.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+        sequence = db.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": old}).scalar()
+        if sequence:
+            db.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq_unpartitioned"))
+
+    tables = [models.Base.metadata.tables[t] for t in PARTITIONED_TABLES]
+    models.Base.metadata.create_all(bind=db.connection(), tables=tables)
+
+    first, last = db.execute(text("SELECT min(log_date), max(log_date) FROM production_log_unpartitioned")).one()
+    today = date.today()
+    ensure_partitions(db, first or today, max(last or today, add_months(month_start(today), months_ahead)))
+
+    log_columns = ", ".join(c.name for c in tables[0].columns)
+    db.execute(text(
+        f"INSERT INTO production_log ({log_columns}) SELECT {log_columns} FROM production_log_unpartitioned"
+    ))
+    for table in tables[1:]:
+        columns = [c.name for c in table.columns]
+        source = ", ".join("l.log_date" if c == "log_date" else f"c.{c}" for c in columns)
+        db.execute(text(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) SELECT {source} "
+            f"FROM {table.name}_unpartitioned c JOIN production_log_unpartitioned l ON l.id = c.production_log_id"
+        ))
+
+    for table in PARTITIONED_TABLES:
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(max(id), 0) + 1, false) FROM {table}"
+        ))
+    for table in reversed(PARTITIONED_TABLES):
+        db.execute(text(f"DROP TABLE {table}_unpartitioned"))
+    return True
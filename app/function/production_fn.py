@@ -0,0 +1,431 @@
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import Integer, column, delete, func, insert, literal, select, true, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from . import events, rollup, routing, shot_counter, status_board
+
+# Children (downtime / rejection) are only recorded below this efficiency
+EFFICIENCY_THRESHOLD = 95
+MAX_BATCH_SIZE = 500
+
+# Duplicate policy on uq_tenant_shift_date_mold_machine
+ON_DUPLICATE_REJECT = "reject"
+ON_DUPLICATE_REPLACE = "replace"
+
+
+def calculate_efficiency(actual_qty: int, target_qty: int) -> float:
+    """Return efficiency in percent, 0 when there is no target."""
+    return (actual_qty / target_qty * 100) if target_qty else 0
+
+
+def child_rows(payload: schemas.ProductionLogCreate, tenant_id: int, user_id: int, efficiency: float):
+    """Build de-duplicated downtime and rejection rows (without production_log_id)."""
+    downtimes, rejections = [], []
+    if efficiency >= EFFICIENCY_THRESHOLD:
+        return downtimes, rejections
+
+    seen = set()
+    for d in payload.downtime_entries or []:
+        if d.reason_id in seen:
+            continue
+        seen.add(d.reason_id)
+        downtimes.append({
+            "tenant_id": tenant_id,
+            "downtime_id": d.reason_id,
+            "duration_min": round(d.duration),
+            "created_by": user_id,
+            "updated_by": user_id
+        })
+
+    seen = set()
+    for r in payload.defect_entries or []:
+        if r.defect_type_id in seen:
+            continue
+        seen.add(r.defect_type_id)
+        rejections.append({
+            "tenant_id": tenant_id,
+            "defect_id": r.defect_type_id,
+            "quantity": r.quantity
+        })
+
+    return downtimes, rejections
+
+
+def after_write(db: Session, log_ids: List[int]):
+    """Bring the derived production tables in step with the written logs (same transaction)."""
+    rollup.refresh_logs(db, log_ids)
+
+
+def committed(tenant_id: int, payloads: List[dict], results: List[dict]):
+    """Side effects that must wait for the commit: cached views and live events."""
+    status_board.invalidate(tenant_id)
+    routing.production_written(tenant_id)
+    events.publish_writes("production_log", tenant_id, payloads, results)
+
+
+def _existing_logs(db: Session, tenant_id: int, keys: List[tuple]) -> dict:
+    """
+    {(shift_time_id, log_date, mold_id, machine_id): row} of the tenant's logs
+    with these natural keys, locked FOR UPDATE until the transaction ends. The
+    lock waits out a concurrent replace, so actual_qty is the latest committed
+    value and the shot counter delta taken from it is exact.
+    """
+    log = models.ProductionLog
+    rows = db.execute(
+        select(log.id, log.shift_time_id, log.log_date, log.mold_id, log.machine_id, log.actual_qty)
+        .where(
+            log.tenant_id == tenant_id,
+            tuple_(log.shift_time_id, log.log_date, log.mold_id, log.machine_id).in_(keys)
+        )
+        .order_by(log.id)  # stable row-lock order between transactions
+        .with_for_update()
+    ).all()
+    return {(r.shift_time_id, r.log_date, r.mold_id, r.machine_id): r for r in rows}
+
+
+def known_children(db: Session, tenant_id: int, logs: List[schemas.ProductionLogCreate]):
+    """The tenant's downtime reason ids and defect ids referenced by the logs, one query each."""
+    reason_ids = {d.reason_id for log in logs for d in log.downtime_entries or []}
+    defect_ids = {r.defect_type_id for log in logs for r in log.defect_entries or []}
+    reasons = {
+        rid for (rid,) in
+        db.query(models.DownTime.id).filter(models.DownTime.id.in_(reason_ids), models.DownTime.tenant_id == tenant_id)
+    } if reason_ids else set()
+    defects = {
+        did for (did,) in
+        db.query(models.Defect.id).filter(models.Defect.id.in_(defect_ids), models.Defect.tenant_id == tenant_id)
+    } if defect_ids else set()
+    return reasons, defects
+
+
+def unknown_child(log: schemas.ProductionLogCreate, reasons: set, defects: set):
+    """Rejection detail for the first downtime reason / defect not in the known sets, else None."""
+    for d in log.downtime_entries or []:
+        if d.reason_id not in reasons:
+            return f"Downtime reason {d.reason_id} not found for tenant"
+    for r in log.defect_entries or []:
+        if r.defect_type_id not in defects:
+            return f"Defect {r.defect_type_id} not found for tenant"
+    return None
+
+
+def _rejected(index: int, status_code: int, detail: str) -> dict:
+    return {"index": index, "status": "rejected", "status_code": status_code, "detail": detail}
+
+
+def validate_batch(db: Session, tenant_id: int, logs: List[schemas.ProductionLogCreate]):
+    """
+    Validate a batch of production logs with one query per rule
+    (shift, mold, mold-machine mapping, downtime reasons, defects).
+    Existing duplicates are left to the insert (ON CONFLICT), not looked up.
+    Returns (accepted, results) where accepted is a list of (index, payload, target_qty)
+    and results holds the rejection entry for every rejected index.
+    """
+    today = date.today()
+    now = datetime.now()
+    results = [None] * len(logs)
+
+    shift_ids = {l.shift_id for l in logs}
+    mold_ids = {l.mold_id for l in logs}
+    pairs = {(l.mold_id, l.machine_id) for l in logs}
+
+    shifts = dict(
+        db.query(models.ShiftTiming.id, models.ShiftTiming.shift_end)
+        .join(models.TenantShift)
+        .filter(
+            models.ShiftTiming.id.in_(shift_ids),
+            models.TenantShift.tenant_id == tenant_id
+        )
+        .all()
+    )
+
+    molds = dict(
+        db.query(models.Mold.id, models.Mold.target_shots)
+        .filter(
+            models.Mold.id.in_(mold_ids),
+            models.Mold.tenant_id == tenant_id
+        )
+        .all()
+    )
+
+    mapped = {
+        tuple(row) for row in
+        db.query(models.MoldMachine.mold_id, models.MoldMachine.machine_id)
+        .filter(
+            models.MoldMachine.tenant_id == tenant_id,
+            tuple_(models.MoldMachine.mold_id, models.MoldMachine.machine_id).in_(pairs)
+        )
+        .all()
+    }
+
+    reasons, defects = known_children(db, tenant_id, logs)
+
+    accepted = []
+    seen_keys = set()
+    for i, log in enumerate(logs):
+        key = (log.shift_id, log.log_date, log.mold_id, log.machine_id)
+        child_error = unknown_child(log, reasons, defects)
+
+        if log.tenant_id != tenant_id:
+            results[i] = _rejected(i, 403, "User not allowed for this tenant")
+        elif log.log_date > today:
+            results[i] = _rejected(i, 400, "Cannot create entry for future date")
+        elif log.shift_id not in shifts:
+            results[i] = _rejected(i, 404, "Shift not found for tenant")
+        elif datetime.combine(log.log_date, shifts[log.shift_id]) > now:
+            results[i] = _rejected(i, 400, "Cannot enter data for an advance shift")
+        elif log.mold_id not in molds:
+            results[i] = _rejected(i, 404, "Mold not found for tenant")
+        elif (log.mold_id, log.machine_id) not in mapped:
+            results[i] = _rejected(i, 400, "Mold and Machine are not mapped for this tenant")
+        elif child_error:
+            results[i] = _rejected(i, 404, child_error)
+        elif key in seen_keys:
+            results[i] = _rejected(i, 400, "Duplicate entry repeated within the batch")
+        else:
+            seen_keys.add(key)
+            accepted.append((i, log, log.target_qty or molds[log.mold_id]))
+
+    return accepted, results
+
+
+def write_batch(
+    db: Session,
+    tenant_id: int,
+    user_id: int,
+    logs: List[schemas.ProductionLogCreate],
+    on_duplicate: str = ON_DUPLICATE_REJECT
+) -> List[dict]:
+    """
+    Validate and insert a batch of production logs with their downtime and
+    rejection children. Nothing is committed; the caller owns the transaction.
+    With the "replace" policy existing logs are updated and their children replaced.
+    Returns one result entry per input log, in input order.
+    """
+    accepted, results = validate_batch(db, tenant_id, logs)
+    if not accepted:
+        return results
+
+    parent_rows = [{
+        "tenant_id": tenant_id,
+        "operator": user_id,
+        "shift_time_id": log.shift_id,
+        "log_date": log.log_date,
+        "mold_id": log.mold_id,
+        "machine_id": log.machine_id,
+        "actual_qty": log.actual_qty,
+        "target_qty": target_qty,
+        "created_by": user_id,
+        "updated_by": user_id
+    } for _, log, target_qty in accepted]
+
+    # One multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING: every log it
+    # returns was created here. Rows are matched back through the natural key
+    # because RETURNING order is not guaranteed.
+    stmt = pg_insert(models.ProductionLog).on_conflict_do_nothing(constraint="uq_tenant_shift_date_mold_machine")
+    inserted = {
+        (row.shift_time_id, row.log_date, row.mold_id, row.machine_id): row
+        for row in db.execute(
+            stmt.returning(
+                models.ProductionLog.id,
+                models.ProductionLog.shift_time_id,
+                models.ProductionLog.log_date,
+                models.ProductionLog.mold_id,
+                models.ProductionLog.machine_id
+            ),
+            parent_rows
+        ).all()
+    }
+
+    # The rest hit an existing entry: rejected, or overwritten with "replace"
+    conflicts = [
+        (log.shift_id, log.log_date, log.mold_id, log.machine_id)
+        for _, log, _ in accepted
+        if (log.shift_id, log.log_date, log.mold_id, log.machine_id) not in inserted
+    ]
+    existing = {}
+    if conflicts and on_duplicate == ON_DUPLICATE_REPLACE:
+        existing = _existing_logs(db, tenant_id, conflicts)
+
+    written, updates = [], []
+    for i, log, target_qty in accepted:
+        key = (log.shift_id, log.log_date, log.mold_id, log.machine_id)
+        if key in inserted:
+            written.append((i, log, target_qty, inserted[key].id, True, 0))
+        elif key in existing:
+            row = existing[key]
+            written.append((i, log, target_qty, row.id, False, row.actual_qty))
+            updates.append({
+                "id": row.id,
+                "log_date": row.log_date,
+                "operator": user_id,
+                "target_qty": target_qty,
+                "actual_qty": log.actual_qty,
+                "updated_by": user_id
+            })
+        elif on_duplicate == ON_DUPLICATE_REPLACE:
+            results[i] = _rejected(i, 409, "Entry was removed while being replaced, retry")
+        else:
+            results[i] = _rejected(i, 400, "Duplicate entry already exists for this tenant/date/shift/mold-machine")
+    if not written:
+        return results
+
+    if updates:
+        db.execute(update(models.ProductionLog), updates)
+        replaced = [(u["id"], u["log_date"]) for u in updates]
+        for model in (models.ProductionDowntime, models.ProductionRejection):
+            db.execute(delete(model).where(tuple_(model.production_log_id, model.log_date).in_(replaced)))
+
+    downtime_rows, rejection_rows, shots = [], [], []
+    for i, log, target_qty, log_id, created, previous_qty in written:
+        shots.append((log.mold_id, log.machine_id, log.actual_qty - previous_qty))
+        efficiency = calculate_efficiency(log.actual_qty, target_qty)
+        downtimes, rejections = child_rows(log, tenant_id, user_id, efficiency)
+        downtime_rows.extend({**d, "production_log_id": log_id, "log_date": log.log_date} for d in downtimes)
+        rejection_rows.extend({**r, "production_log_id": log_id, "log_date": log.log_date} for r in rejections)
+        results[i] = {
+            "index": i,
+            "status": "created" if created else "replaced",
+            "production_log_id": log_id,
+            "efficiency": efficiency,
+            "downtime_entries": len(downtimes),
+            "rejection_entries": len(rejections)
+        }
+
+    if downtime_rows:
+        db.execute(insert(models.ProductionDowntime), downtime_rows)
+    if rejection_rows:
+        db.execute(insert(models.ProductionRejection), rejection_rows)
+
+    shot_counter.add_shots(db, tenant_id, shots)
+    after_write(db, [entry[3] for entry in written])
+
+    return results
+
+
+# Child tables: (unique constraint, key column, value columns updated on replace)
+_CHILD_TABLES = {
+    "downtime": ("uq_production_downtime", "downtime_id", ["duration_min", "updated_by"]),
+    "rejection": ("uq_production_defect", "defect_id", ["quantity"]),
+}
+
+
+def _children_cte(log_cte, model, rows: List[dict], child: str, value_columns: List[str], replace: bool):
+    """INSERT ... SELECT of the child rows joined to the new parent (id, log_date), as a CTE."""
+    constraint, key_column, update_columns = _CHILD_TABLES[child]
+    rows_values = values(
+        *[column(c, Integer) for c in value_columns],
+        name=f"new_{child}_rows"
+    ).data([tuple(r[c] for c in value_columns) for r in rows])
+
+    constants = {k: v for k, v in rows[0].items() if k not in value_columns}
+    insert_columns = ["production_log_id", "log_date", *value_columns, *constants]
+    source = (
+        select(
+            log_cte.c.id,
+            log_cte.c.log_date,
+            *[rows_values.c[c] for c in value_columns],
+            *[literal(v, Integer) for v in constants.values()]
+        )
+        .select_from(log_cte)
+        .join(rows_values, true())
+    )
+    stmt = pg_insert(model).from_select(insert_columns, source)
+    if replace:
+        stmt = stmt.on_conflict_do_update(
+            constraint=constraint,
+            set_={c: stmt.excluded[c] for c in update_columns}
+        )
+    return stmt.returning(model.id).cte(f"new_{child}")
+
+
+def _stale_children_cte(log_cte, model, rows: List[dict], child: str):
+    """DELETE children of a replaced log that are not part of the new entry set, as a CTE."""
+    _, key_column, _ = _CHILD_TABLES[child]
+    stmt = delete(model).where(
+        tuple_(model.production_log_id, model.log_date).in_(select(log_cte.c.id, log_cte.c.log_date))
+    )
+    if rows:
+        stmt = stmt.where(getattr(model, key_column).not_in([r[key_column] for r in rows]))
+    return stmt.returning(model.id).cte(f"stale_{child}")
+
+
+def _count(cte):
+    return select(func.count()).select_from(cte).scalar_subquery()
+
+
+def _with_children(log_cte, downtimes: List[dict], rejections: List[dict], replace: bool):
+    """SELECT of (id, downtime count, rejection count) that runs the children CTEs off log_cte."""
+    columns, stale = [log_cte.c.id], []
+    for model, rows, child, value_columns in (
+        (models.ProductionDowntime, downtimes, "downtime", ["downtime_id", "duration_min"]),
+        (models.ProductionRejection, rejections, "rejection", ["defect_id", "quantity"]),
+    ):
+        if rows:
+            columns.append(_count(_children_cte(log_cte, model, rows, child, value_columns, replace)))
+        else:
+            columns.append(literal(0, Integer))
+        if replace:
+            stale.append(_count(_stale_children_cte(log_cte, model, rows, child)))
+    return select(*columns, *stale)
+
+
+def insert_log_with_children(
+    db: Session,
+    log_values: dict,
+    downtimes: List[dict],
+    rejections: List[dict],
+    on_duplicate: str = ON_DUPLICATE_REJECT
+):
+    """
+    Insert a production log and its downtime/rejection children in a single
+    statement (data-modifying CTEs chained on RETURNING id).
+
+    The insert is ON CONFLICT DO NOTHING on uq_tenant_shift_date_mold_machine,
+    so a returned row is a created log. On conflict "reject" gives up, and
+    "replace" updates the existing log in a second statement of the same shape
+    which also replaces its children.
+
+    Returns (production_log_id, created, downtime_count, rejection_count),
+    or None when the entry was rejected as a duplicate.
+    """
+    log = models.ProductionLog
+    stmt = (
+        pg_insert(log).values(**log_values)
+        .on_conflict_do_nothing(constraint="uq_tenant_shift_date_mold_machine")
+        .returning(log.id, log.log_date)
+    )
+    row = db.execute(_with_children(stmt.cte("new_log"), downtimes, rejections, replace=False)).first()
+    created, previous_qty = True, 0
+
+    if row is None:
+        if on_duplicate != ON_DUPLICATE_REPLACE:
+            return None
+        key = (log_values["shift_time_id"], log_values["log_date"], log_values["mold_id"], log_values["machine_id"])
+        existing = _existing_logs(db, log_values["tenant_id"], [key]).get(key)
+        if existing is None:
+            # removed since the insert conflicted, the key is free again
+            return insert_log_with_children(db, log_values, downtimes, rejections, on_duplicate)
+        stmt = (
+            update(log)
+            .where(log.id == existing.id, log.log_date == existing.log_date)
+            .values(
+                operator=log_values["operator"],
+                target_qty=log_values["target_qty"],
+                actual_qty=log_values["actual_qty"],
+                updated_by=log_values["updated_by"],
+                updated_at=func.now()
+            )
+            .returning(log.id, log.log_date)
+        )
+        row = db.execute(_with_children(stmt.cte("new_log"), downtimes, rejections, replace=True)).first()
+        created, previous_qty = False, existing.actual_qty
+
+    shot_counter.add_shots(db, log_values["tenant_id"], [
+        (log_values["mold_id"], log_values["machine_id"], log_values["actual_qty"] - previous_qty)
+    ])
+    return row[0], created, row[1], row[2]
@@ -0,0 +1,151 @@
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, func, select, true, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+ROLLUP_KEY = ["tenant_id", "machine_id", "mold_id", "log_date", "tenant_shift_id"]
+
+
+def _log_key_columns():
+    """Rollup key expressed over production_log joined to shift_timing."""
+    return [
+        models.ProductionLog.tenant_id,
+        models.ProductionLog.machine_id,
+        models.ProductionLog.mold_id,
+        models.ProductionLog.log_date,
+        models.ShiftTiming.tenant_shift_id,
+    ]
+
+
+def _logs():
+    return select().select_from(models.ProductionLog).join(
+        models.ShiftTiming, models.ShiftTiming.id == models.ProductionLog.shift_time_id
+    )
+
+
+def _child_of_log(child):
+    # log_date is the partition key on both sides, joining on it lets child partitions be pruned
+    return and_(child.production_log_id == models.ProductionLog.id, child.log_date == models.ProductionLog.log_date)
+
+
+def _rollup_key(model):
+    return tuple_(*[getattr(model, c) for c in ROLLUP_KEY])
+
+
+def _refresh(db: Session, log_filter: list, rollup_filter):
+    """
+    Recompute every rollup cell selected by log_filter from production_log and
+    its children. rollup_filter(model) selects the same cells on a rollup table,
+    they are deleted first so cells without logs left disappear.
+    """
+    key_columns = _log_key_columns()
+
+    for model in (models.ProductionRollupDowntime, models.ProductionRollupRejection, models.ProductionRollup):
+        db.execute(delete(model).where(*rollup_filter(model)))
+
+    # ---- totals per cell ----
+    downtime = (
+        select(func.coalesce(func.sum(models.ProductionDowntime.duration_min), 0).label("minutes"))
+        .where(
+            models.ProductionDowntime.production_log_id == models.ProductionLog.id,
+            models.ProductionDowntime.log_date == models.ProductionLog.log_date
+        )
+        .lateral("log_downtime")
+    )
+    rejection = (
+        select(func.coalesce(func.sum(models.ProductionRejection.quantity), 0).label("quantity"))
+        .where(
+            models.ProductionRejection.production_log_id == models.ProductionLog.id,
+            models.ProductionRejection.log_date == models.ProductionLog.log_date
+        )
+        .lateral("log_rejection")
+    )
+    totals = (
+        _logs()
+        .add_columns(
+            *key_columns,
+            func.sum(models.ProductionLog.target_qty),
+            func.sum(models.ProductionLog.actual_qty),
+            func.sum(downtime.c.minutes),
+            func.sum(rejection.c.quantity),
+            func.count()
+        )
+        .join(downtime, true())
+        .join(rejection, true())
+        .where(*log_filter)
+        .group_by(*key_columns)
+    )
+    stmt = pg_insert(models.ProductionRollup).from_select(
+        [*ROLLUP_KEY, "target_qty", "actual_qty", "downtime_min", "rejection_qty", "log_count"], totals
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=ROLLUP_KEY,
+        set_={c: stmt.excluded[c] for c in ("target_qty", "actual_qty", "downtime_min", "rejection_qty", "log_count")}
+    ))
+
+    # ---- downtime minutes by reason ----
+    by_reason = (
+        _logs()
+        .add_columns(*key_columns, models.ProductionDowntime.downtime_id, func.sum(models.ProductionDowntime.duration_min))
+        .join(models.ProductionDowntime, _child_of_log(models.ProductionDowntime))
+        .where(*log_filter)
+        .group_by(*key_columns, models.ProductionDowntime.downtime_id)
+    )
+    stmt = pg_insert(models.ProductionRollupDowntime).from_select([*ROLLUP_KEY, "downtime_id", "duration_min"], by_reason)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[*ROLLUP_KEY, "downtime_id"],
+        set_={"duration_min": stmt.excluded.duration_min}
+    ))
+
+    # ---- rejection quantity by defect ----
+    by_defect = (
+        _logs()
+        .add_columns(*key_columns, models.ProductionRejection.defect_id, func.sum(models.ProductionRejection.quantity))
+        .join(models.ProductionRejection, _child_of_log(models.ProductionRejection))
+        .where(*log_filter)
+        .group_by(*key_columns, models.ProductionRejection.defect_id)
+    )
+    stmt = pg_insert(models.ProductionRollupRejection).from_select([*ROLLUP_KEY, "defect_id", "quantity"], by_defect)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[*ROLLUP_KEY, "defect_id"],
+        set_={"quantity": stmt.excluded.quantity}
+    ))
+
+
+def refresh_logs(db: Session, log_ids: List[int]):
+    """
+    Incrementally refresh only the rollup cells touched by the given production
+    logs. Runs inside the caller's transaction, nothing is committed.
+    """
+    if not log_ids:
+        return
+    cells = (
+        _logs()
+        .add_columns(*_log_key_columns())
+        .where(models.ProductionLog.id.in_(log_ids))
+        .distinct()
+    )
+    # materialise the touched cells once, the same set drives every statement
+    touched = [tuple(row) for row in db.execute(cells).all()]
+    if not touched:
+        return
+    _refresh(
+        db,
+        [tuple_(*_log_key_columns()).in_(touched)],
+        lambda model: [_rollup_key(model).in_(touched)]
+    )
+
+
+def rebuild(db: Session, tenant_id: Optional[int] = None):
+    """Recompute the rollup tables from scratch, for one tenant or for all of them."""
+    if tenant_id is None:
+        _refresh(db, [], lambda model: [])
+    else:
+        _refresh(
+            db,
+            [models.ProductionLog.tenant_id == tenant_id],
+            lambda model: [model.tenant_id == tenant_id]
+        )
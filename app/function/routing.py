@@ -0,0 +1,303 @@
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import scheduler
+from .cache import DerivedCache
+
+# Invalidated by mold / machine / product / mapping writes in this process;
+# the TTL only bounds staleness from writes handled by other workers.
+ROUTING_TTL_SECONDS = 60 * 60
+
+_indexes = DerivedCache(ROUTING_TTL_SECONDS)
+# (day, mold ids with a production log that day) per tenant, dropped on production writes
+_active_molds = DerivedCache(ROUTING_TTL_SECONDS)
+
+
+def _csr(keys, values, n):
+    """Group values by key: (indptr, values) with values[indptr[k]:indptr[k + 1]] for key k."""
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return indptr, values[order]
+
+
+def _positions(ids, values):
+    """Positions of values in the sorted ids array, and which of them were found."""
+    values = np.asarray(values, dtype=np.int64)
+    at = np.searchsorted(ids, values)
+    found = at < len(ids)
+    found[found] = ids[at[found]] == values[found]
+    return at, found
+
+
+class RoutingIndex:
+    """
+    One tenant's product <-> mold <-> machine routes as integer adjacency.
+    Products, molds and machines are numbered by position in the sorted id
+    arrays. Both edge sets are kept in CSR form in both directions
+    (product->molds, mold->products, mold->machines, machine->molds), so a
+    neighbourhood is an array slice and whole-tenant questions are array
+    operations. Instances are never modified; with_edges() returns a new one.
+    """
+
+    def __init__(self, product_ids, product_nos, mold_ids, mold_nos, mold_yield,
+                 machine_ids, machine_codes, pm_product, pm_mold, mm_mold, mm_machine):
+        self.product_ids = product_ids
+        self.product_nos = product_nos
+        self.mold_ids = mold_ids
+        self.mold_nos = mold_nos
+        self.mold_yield = mold_yield  # pieces per shift: target_shots * cavities
+        self.machine_ids = machine_ids
+        self.machine_codes = machine_codes
+        n_products, n_molds, n_machines = len(product_ids), len(mold_ids), len(machine_ids)
+
+        self.pm_indptr, self.pm_mold = _csr(pm_product, pm_mold, n_products)
+        self.pm_product = np.repeat(np.arange(n_products), np.diff(self.pm_indptr))
+        self.mp_indptr, self.mp_product = _csr(pm_mold, pm_product, n_molds)
+        self.mm_indptr, self.mm_machine = _csr(mm_mold, mm_machine, n_molds)
+        self.mm_mold = np.repeat(np.arange(n_molds), np.diff(self.mm_indptr))
+        self.km_indptr, self.km_mold = _csr(mm_machine, mm_mold, n_machines)
+
+    @classmethod
+    def load(cls, db: Session, tenant_id: int) -> "RoutingIndex":
+        products = (
+            db.query(models.Product.id, models.Product.product_no)
+            .filter(models.Product.tenant_id == tenant_id)
+            .order_by(models.Product.id)
+            .all()
+        )
+        molds = (
+            db.query(models.Mold.id, models.Mold.mold_no, models.Mold.target_shots, models.Mold.cavities)
+            .filter(models.Mold.tenant_id == tenant_id)
+            .order_by(models.Mold.id)
+            .all()
+        )
+        machines = (
+            db.query(models.Machine.id, models.Machine.machine_code)
+            .filter(models.Machine.tenant_id == tenant_id)
+            .order_by(models.Machine.id)
+            .all()
+        )
+        product_mold = (
+            db.query(models.ProductMold.product_id, models.ProductMold.mold_id)
+            .join(models.Product, models.Product.id == models.ProductMold.product_id)
+            .filter(models.Product.tenant_id == tenant_id)
+            .all()
+        )
+        mold_machine = (
+            db.query(models.MoldMachine.mold_id, models.MoldMachine.machine_id)
+            .filter(models.MoldMachine.tenant_id == tenant_id)
+            .all()
+        )
+
+        product_ids = np.array([p.id for p in products], dtype=np.int64)
+        mold_ids = np.array([m.id for m in molds], dtype=np.int64)
+        machine_ids = np.array([k.id for k in machines], dtype=np.int64)
+
+        pm_product, ok_p = _positions(product_ids, [r.product_id for r in product_mold])
+        pm_mold, ok_m = _positions(mold_ids, [r.mold_id for r in product_mold])
+        mm_mold, ok_mm = _positions(mold_ids, [r.mold_id for r in mold_machine])
+        mm_machine, ok_k = _positions(machine_ids, [r.machine_id for r in mold_machine])
+        pm_keep, mm_keep = ok_p & ok_m, ok_mm & ok_k  # drop edges to another tenant's rows
+
+        return cls(
+            product_ids, [p.product_no for p in products],
+            mold_ids, [m.mold_no for m in molds],
+            np.array([max(m.target_shots, 0) * max(m.cavities, 0) for m in molds], dtype=np.int64),
+            machine_ids, [k.machine_code for k in machines],
+            pm_product[pm_keep], pm_mold[pm_keep], mm_mold[mm_keep], mm_machine[mm_keep]
+        )
+
+    def product_machine_pairs(self):
+        """(product, machine, mold) index triples, one per ProductMold x MoldMachine route."""
+        counts = np.diff(self.mm_indptr)[self.pm_mold]
+        edge = np.repeat(np.arange(len(self.pm_mold)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        machine = self.mm_machine[self.mm_indptr[self.pm_mold][edge] + offset]
+        return self.pm_product[edge], machine, self.pm_mold[edge]
+
+    def capacity_per_shift(self):
+        """
+        Per product: routed molds, reachable machines and pieces per shift if
+        the product had the shop to itself. A mold is one tool and a machine
+        runs one mold per shift, so a product gets at most as many molds at
+        once as it has machines; the highest-yield ones are counted (an upper
+        bound when several of its molds only fit the same machine).
+        """
+        n_products = len(self.product_ids)
+        n_machines = max(len(self.machine_ids), 1)
+        routed = np.diff(self.mm_indptr)[self.pm_mold] > 0
+
+        product, machine, _ = self.product_machine_pairs()
+        pairs = np.unique(product * n_machines + machine)
+        machines = np.bincount(pairs // n_machines, minlength=n_products)
+        molds = np.bincount(self.pm_product[routed], minlength=n_products)
+
+        edge_yield = np.where(routed, self.mold_yield[self.pm_mold], 0)
+        order = np.lexsort((-edge_yield, self.pm_product))
+        by_product = self.pm_product[order]
+        rank = np.arange(len(order)) - np.searchsorted(by_product, by_product)
+        counted = np.where(rank < machines[by_product], edge_yield[order], 0)
+        units = np.bincount(by_product, weights=counted, minlength=n_products).astype(np.int64)
+        return molds, machines, units
+
+    def with_edges(self, kind: str, added=(), removed=()) -> Optional["RoutingIndex"]:
+        """
+        Copy of the index with (id, id) edges added / removed, kind being
+        "product_mold" or "mold_machine". Nodes are shared with this index and
+        only the CSR arrays are rebuilt, no database round trip. Returns None
+        when an edge names a node this index does not know (rebuild instead).
+        """
+        if kind == "product_mold":
+            left_ids, right_ids = self.product_ids, self.mold_ids
+            left, right = self.pm_product, self.pm_mold
+        else:
+            left_ids, right_ids = self.mold_ids, self.machine_ids
+            left, right = self.mm_mold, self.mm_machine
+
+        def keys(edges):
+            edges = list(edges)
+            a, ok_a = _positions(left_ids, [e[0] for e in edges])
+            b, ok_b = _positions(right_ids, [e[1] for e in edges])
+            return (a * len(right_ids) + b) if (ok_a & ok_b).all() else None
+
+        add_keys, remove_keys = keys(added), keys(removed)
+        if add_keys is None or remove_keys is None:
+            return None
+        current = left * len(right_ids) + right
+        current = current[~np.isin(current, remove_keys)]
+        current = np.union1d(current, add_keys)
+        left, right = np.divmod(current, max(len(right_ids), 1))
+
+        if kind == "product_mold":
+            pm, mm = (left, right), (self.mm_mold, self.mm_machine)
+        else:
+            pm, mm = (self.pm_product, self.pm_mold), (left, right)
+        return RoutingIndex(
+            self.product_ids, self.product_nos, self.mold_ids, self.mold_nos, self.mold_yield,
+            self.machine_ids, self.machine_codes, *pm, *mm
+        )
+
+    def machines_for_product(self, product_id: int) -> Optional[List[dict]]:
+        """Machines that can make the product, each with the product's molds that fit it (None: unknown product)."""
+        p, found = _positions(self.product_ids, [product_id])
+        if not found[0]:
+            return None
+        molds = self.pm_mold[self.pm_indptr[p[0]]:self.pm_indptr[p[0] + 1]]
+        by_machine = {}
+        for m in molds:
+            for k in self.mm_machine[self.mm_indptr[m]:self.mm_indptr[m + 1]]:
+                by_machine.setdefault(int(k), []).append(int(self.mold_ids[m]))
+        return [
+            {"machine_id": int(self.machine_ids[k]), "machine_code": self.machine_codes[k], "mold_ids": mold_ids}
+            for k, mold_ids in sorted(by_machine.items())
+        ]
+
+    def products_for_machine(self, machine_id: int) -> Optional[List[dict]]:
+        """Products the machine can make, each with the molds that carry it there (None: unknown machine)."""
+        k, found = _positions(self.machine_ids, [machine_id])
+        if not found[0]:
+            return None
+        molds = self.km_mold[self.km_indptr[k[0]]:self.km_indptr[k[0] + 1]]
+        by_product = {}
+        for m in molds:
+            for p in self.mp_product[self.mp_indptr[m]:self.mp_indptr[m + 1]]:
+                by_product.setdefault(int(p), []).append(int(self.mold_ids[m]))
+        return [
+            {"product_id": int(self.product_ids[p]), "product_no": self.product_nos[p], "mold_ids": mold_ids}
+            for p, mold_ids in sorted(by_product.items())
+        ]
+
+    def idle_molds(self, active_mold_ids) -> List[dict]:
+        """Molds not in active_mold_ids, with how many machines and products they route to."""
+        at, found = _positions(self.mold_ids, list(active_mold_ids))
+        busy = np.zeros(len(self.mold_ids), dtype=bool)
+        busy[at[found]] = True
+        machines = np.diff(self.mm_indptr)
+        products = np.diff(self.mp_indptr)
+        return [
+            {
+                "mold_id": int(self.mold_ids[m]),
+                "mold_no": self.mold_nos[m],
+                "machines": int(machines[m]),
+                "products": int(products[m])
+            }
+            for m in np.flatnonzero(~busy)
+        ]
+
+
+def get_index(db: Session, tenant_id: int) -> RoutingIndex:
+    return _indexes.get_or_build(tenant_id, lambda: RoutingIndex.load(db, tenant_id))
+
+
+def capacity(db: Session, tenant_id: int, start_date: date, days: int, product_id: Optional[int] = None) -> dict:
+    """
+    Units each product can make in [start_date, start_date + days): pieces per
+    shift from the routing index times the shift timings running in the window.
+    Computed for every product at once; product_id only filters the output.
+    """
+    index = get_index(db, tenant_id)
+    slots = scheduler.shift_slots(db, tenant_id, start_date, days)
+    molds, machines, units = index.capacity_per_shift()
+
+    rows = range(len(index.product_ids))
+    if product_id is not None:
+        rows = np.flatnonzero(index.product_ids == product_id)
+    return {
+        "start_date": start_date,
+        "end_date": start_date + timedelta(days=days - 1),
+        "shifts": len(slots),
+        "shift_hours": round(sum(s["hours"] for s in slots), 2),
+        "products": [
+            {
+                "product_id": int(index.product_ids[i]),
+                "product_no": index.product_nos[i],
+                "molds": int(molds[i]),
+                "machines": int(machines[i]),
+                "units_per_shift": int(units[i]),
+                "capacity_qty": int(units[i]) * len(slots)
+            }
+            for i in rows
+        ]
+    }
+
+
+def idle_molds(db: Session, tenant_id: int, day: date) -> List[dict]:
+    """Molds of the tenant without a production log on day."""
+    def active():
+        return day, frozenset(
+            mold_id for (mold_id,) in
+            db.query(models.ProductionLog.mold_id)
+            .filter(models.ProductionLog.tenant_id == tenant_id, models.ProductionLog.log_date == day)
+            .distinct()
+        )
+
+    cached_day, mold_ids = _active_molds.get_or_build(tenant_id, active)
+    if cached_day != day:
+        cached_day, mold_ids = active()
+    return get_index(db, tenant_id).idle_molds(mold_ids)
+
+
+def invalidate(tenant_id: int):
+    """Call after a product, mold or machine write has committed."""
+    _indexes.invalidate(tenant_id)
+
+
+def edges_changed(tenant_id: int, kind: str, added: Iterable[Tuple[int, int]] = (), removed: Iterable[Tuple[int, int]] = ()):
+    """
+    Call after a ProductMold ("product_mold", (product_id, mold_id) pairs) or
+    MoldMachine ("mold_machine", (mold_id, machine_id) pairs) write has
+    committed. A cached index is patched in place of a reload; one that does
+    not know the nodes is dropped.
+    """
+    added, removed = list(added), list(removed)
+    _indexes.update(tenant_id, lambda index: index.with_edges(kind, added, removed))
+
+
+def production_written(tenant_id: int):
+    """Call after production logs have committed; idle molds are recomputed."""
+    _active_molds.invalidate(tenant_id)
@@ -0,0 +1,216 @@
+import logging
+import math
+import threading
+from collections import deque
+from datetime import date
+from typing import List
+
+import numpy as np
+from sqlalchemy import insert
+
+from .. import models
+from ..database import SessionLocal
+from .cache import TTLStore
+from .events import broker
+
+logger = logging.getLogger(__name__)
+
+MIN_BASELINE = 25  # measured readings before a dimension's mean/sigma are trusted
+WINDOW_TTL_SECONDS = 12 * 60 * 60
+
+RULE_BEYOND_3_SIGMA = "beyond_3_sigma"
+RULE_2_OF_3_BEYOND_2_SIGMA = "2_of_3_beyond_2_sigma"
+RULE_4_OF_5_BEYOND_1_SIGMA = "4_of_5_beyond_1_sigma"
+RULE_7_ON_ONE_SIDE = "7_on_one_side"
+RULE_6_TRENDING = "6_trending"
+RULE_14_ALTERNATING = "14_alternating"
+RULE_15_WITHIN_1_SIGMA = "15_within_1_sigma"
+RULE_8_BEYOND_1_SIGMA = "8_beyond_1_sigma"
+
+# longest rule (15 points) plus the point that shows where its run started
+BUFFER_SIZE = 16
+
+
+def _trailing(mask) -> int:
+    """Length of the run of True at the end of mask."""
+    if not len(mask) or mask.all():
+        return len(mask)
+    return int(np.argmin(mask[::-1]))
+
+
+def violations(z) -> List[str]:
+    """
+    Rules broken at the newest point of z (readings in sigma units from the
+    center, oldest first). Run rules fire once, when the run reaches its
+    length, so an ongoing run is not reported on every reading.
+    """
+    last = z[-1]
+    side = 1.0 if last >= 0 else -1.0
+    above = z * side
+    broken = []
+    if abs(last) > 3:
+        broken.append(RULE_BEYOND_3_SIGMA)
+    if abs(last) > 2 and np.count_nonzero(above[-3:] > 2) >= 2:
+        broken.append(RULE_2_OF_3_BEYOND_2_SIGMA)
+    if abs(last) > 1 and np.count_nonzero(above[-5:] > 1) >= 4:
+        broken.append(RULE_4_OF_5_BEYOND_1_SIGMA)
+    if last != 0 and _trailing(above > 0) == 7:
+        broken.append(RULE_7_ON_ONE_SIDE)
+
+    steps = np.diff(z)
+    if len(steps) and (_trailing(steps > 0) == 5 or _trailing(steps < 0) == 5):
+        broken.append(RULE_6_TRENDING)
+    if len(steps) > 1 and _trailing(steps[1:] * steps[:-1] < 0) == 12:
+        broken.append(RULE_14_ALTERNATING)
+
+    if _trailing(np.abs(z) < 1) == 15:
+        broken.append(RULE_15_WITHIN_1_SIGMA)
+    outside = _trailing(np.abs(z) > 1)
+    if outside == 8 and (z[-8:] > 0).any() and (z[-8:] < 0).any():
+        broken.append(RULE_8_BEYOND_1_SIGMA)
+    return broken
+
+
+class _Window:
+    """
+    The newest measured readings of one dimension, the (date, hour) of the
+    newest one, and how many readings the window has accounted for.
+    """
+
+    def __init__(self, points, seen: int):
+        self.values = deque((value for _, value in points), maxlen=BUFFER_SIZE)
+        self.newest = points[-1][0] if points else None
+        self.seen = seen
+
+
+_windows = TTLStore(WINDOW_TTL_SECONDS)
+_lock = threading.Lock()
+
+
+def forget(tenant_id: int, inspection_id: int):
+    """Drop the dimension's window; call after a reading was edited in place."""
+    _windows.pop((tenant_id, inspection_id))
+
+
+def _seed(db, inspection_id: int, exclude_ids: List[int]) -> list:
+    """The newest measured readings as ((date, hour), value), oldest first."""
+    result = models.ProductInspectionResult
+    rows = (
+        db.query(result.inspection_date, result.inspection_hour, result.measured_value)
+        .filter(
+            result.inspection_id == inspection_id,
+            result.measured_value.isnot(None),
+            result.id.notin_(exclude_ids)
+        )
+        .order_by(result.inspection_date.desc(), result.inspection_hour.desc())
+        .limit(BUFFER_SIZE)
+        .all()
+    )
+    return [((r.inspection_date, r.inspection_hour), r.measured_value) for r in reversed(rows)]
+
+
+def _baseline(stats, values: List[float]):
+    """
+    (count, mean, sigma) of the running stats without values, the readings
+    under test, which add_results has already folded in (the inverse of the
+    pairwise update). sigma is None below two readings.
+    """
+    batch = np.asarray(values, dtype=np.float64)
+    count = stats.value_count - len(batch)
+    if count < 2:
+        return count, None, None
+    mean = (stats.mean * stats.value_count - batch.sum()) / count
+    m2 = stats.m2 - batch.var() * len(batch) - (batch.mean() - mean) ** 2 * count * len(batch) / stats.value_count
+    return count, float(mean), math.sqrt(max(m2, 0.0) / (count - 1))
+
+
+def _check(db, tenant_id: int, readings: List[dict]) -> List[dict]:
+    by_dimension = {}
+    for reading in sorted(readings, key=lambda r: (r["inspection_date"], r["inspection_hour"])):
+        by_dimension.setdefault(reading["inspection_id"], []).append(reading)
+
+    stats = {
+        s.inspection_id: s for s in
+        db.query(models.InspectionStats)
+        .filter(models.InspectionStats.tenant_id == tenant_id, models.InspectionStats.inspection_id.in_(list(by_dimension)))
+    }
+
+    alerts = []
+    with _lock:
+        for inspection_id, new in by_dimension.items():
+            s = stats.get(inspection_id)
+            if s is None:
+                continue
+            count, center, sigma = _baseline(s, [r["measured_value"] for r in new])
+            if count < MIN_BASELINE or not sigma:
+                continue
+
+            key = (tenant_id, inspection_id)
+            window = _windows.get(key)
+            if window is None or window.seen + len(new) != s.value_count:
+                # first reading since start-up, or another worker / a delete got there first
+                window = _Window(_seed(db, inspection_id, [r["result_id"] for r in new]), s.value_count - len(new))
+                _windows.set(key, window)
+
+            late = False
+            for reading in new:
+                window.seen += 1
+                at = (reading["inspection_date"], reading["inspection_hour"])
+                if window.newest is not None and at < window.newest:
+                    # Backfilled or long-queued: not the newest point, so it is
+                    # not scored, and the next batch reseeds in date order
+                    late = True
+                    continue
+                window.values.append(reading["measured_value"])
+                window.newest = at
+                z = (np.fromiter(window.values, dtype=np.float64) - center) / sigma
+                for rule in violations(z):
+                    alerts.append({
+                        "tenant_id": tenant_id,
+                        "inspection_id": inspection_id,
+                        "result_id": reading["result_id"],
+                        "inspection_date": reading["inspection_date"],
+                        "inspection_hour": reading["inspection_hour"],
+                        "rule": rule,
+                        "measured_value": reading["measured_value"],
+                        "center": center,
+                        "sigma": sigma
+                    })
+            if late:
+                _windows.pop(key)
+    return alerts
+
+
+def evaluate(tenant_id: int, payloads: List[dict], results: List[dict]):
+    """
+    Run the rules over committed inspection results (payload dicts and their
+    write results, same order) against each dimension's in-process window,
+    centred on the running mean/sigma of the readings before them. Readings
+    older than the window's newest point are not scored. Violations are
+    stored as alerts and pushed to the tenant's subscribers. Never raises:
+    the readings are already committed.
+    """
+    readings = [
+        # write-behind payloads are JSON, so the date may come as a string
+        {**p, "inspection_date": date.fromisoformat(str(p["inspection_date"])), "result_id": r["result_id"]}
+        for p, r in zip(payloads, results)
+        if r and r.get("status") == "created" and p.get("measured_value") is not None
+    ]
+    if not readings:
+        return
+
+    db = SessionLocal()
+    try:
+        alerts = _check(db, tenant_id, readings)
+        if not alerts:
+            return
+        db.execute(insert(models.InspectionAlert), alerts)
+        db.commit()
+        broker.publish(tenant_id, [
+            {"type": "inspection_alert", **{k: v for k, v in a.items() if k != "tenant_id"}} for a in alerts
+        ])
+    except Exception:
+        db.rollback()
+        logger.exception("run-rule evaluation failed for tenant %s", tenant_id)
+    finally:
+        db.close()
@@ -0,0 +1,272 @@
+import time as clock
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import shifts_fn
+
+LOCAL_SEARCH_SECONDS = 3.0
+FREE = -1
+
+
+def shift_slots(db: Session, tenant_id: int, start_date: date, days: int) -> List[dict]:
+    """Every (day, shift timing) in the horizon, in chronological order."""
+    timings = (
+        db.query(models.ShiftTiming)
+        .join(models.TenantShift, models.TenantShift.id == models.ShiftTiming.tenant_shift_id)
+        .filter(models.TenantShift.tenant_id == tenant_id)
+        .order_by(models.ShiftTiming.shift_start)
+        .all()
+    )
+    slots = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for timing in timings:
+            if timing.weekday is None or timing.weekday == day.weekday():
+                slots.append({
+                    "log_date": day,
+                    "shift_time_id": timing.id,
+                    "tenant_shift_id": timing.tenant_shift_id,
+                    "hours": shifts_fn.calculate_duration(timing.shift_start, timing.shift_end)
+                })
+    return slots
+
+
+class _Plan:
+    """
+    Cells are (machine, slot). A cell runs one mold for one product and yields
+    target_shots * cavities pieces (target_shots is the per-shift shot target,
+    the same fallback production_log uses for target_qty). A mold is a single
+    tool, so it can occupy at most one machine per slot.
+    """
+
+    def __init__(self, n_machines, n_molds, n_slots, demand, yields, options):
+        self.demand = demand
+        self.yields = yields
+        self.options = options  # product -> [(mold, machine)]
+        self.cell_mold = [[FREE] * n_slots for _ in range(n_machines)]
+        self.cell_product = [[FREE] * n_slots for _ in range(n_machines)]
+        self.mold_at = [[FREE] * n_slots for _ in range(n_molds)]
+        self.produced = [0] * len(demand)
+        self.machines_for_mold = {}
+        for product_options in options:
+            for mold, machine in product_options:
+                self.machines_for_mold.setdefault(mold, set()).add(machine)
+
+    def unmet(self, p):
+        return max(0, self.demand[p] - self.produced[p])
+
+    def surplus(self, p):
+        return max(0, self.produced[p] - self.demand[p])
+
+    def place(self, k, s, m, p):
+        self.cell_mold[k][s] = m
+        self.cell_product[k][s] = p
+        self.mold_at[m][s] = k
+        self.produced[p] += self.yields[m]
+
+    def clear(self, k, s):
+        m, p = self.cell_mold[k][s], self.cell_product[k][s]
+        self.cell_mold[k][s] = self.cell_product[k][s] = FREE
+        self.mold_at[m][s] = FREE
+        self.produced[p] -= self.yields[m]
+        return m, p
+
+    def greedy(self, n_slots):
+        """
+        Tightest products first (demand over the most they could get), each
+        filled mold-by-machine in slot order so runs stay contiguous.
+        Higher-yield molds and machines that fit fewer molds come first.
+        """
+        machine_flex = {}
+        for product_options in self.options:
+            for mold, machine in product_options:
+                machine_flex.setdefault(machine, set()).add(mold)
+
+        def tightness(p):
+            reach = sum(self.yields[m] for m, _ in self.options[p]) * n_slots
+            return self.demand[p] / reach if reach else 0
+
+        for p in sorted(range(len(self.demand)), key=tightness, reverse=True):
+            candidates = sorted(self.options[p], key=lambda mk: (-self.yields[mk[0]], len(machine_flex[mk[1]])))
+            for m, k in candidates:
+                for s in range(n_slots):
+                    if not self.unmet(p):
+                        break
+                    if self.cell_mold[k][s] == FREE and self.mold_at[m][s] == FREE:
+                        self.place(k, s, m, p)
+                if not self.unmet(p):
+                    break
+
+    def _try_cell(self, p, m, k, s):
+        """Make (k, s) run mold m for product p if that lowers unmet demand."""
+        if self.mold_at[m][s] != FREE:
+            return False
+        gain = min(self.yields[m], self.unmet(p))
+        if self.cell_mold[k][s] == FREE:
+            self.place(k, s, m, p)
+            return True
+
+        m2, p2 = self.cell_mold[k][s], self.cell_product[k][s]
+        if p2 == p:
+            return False
+        # ejection: move the occupant to another free machine that takes its mold
+        for k2 in self.machines_for_mold[m2]:
+            if k2 != k and self.cell_mold[k2][s] == FREE:
+                self.clear(k, s)
+                self.place(k2, s, m2, p2)
+                self.place(k, s, m, p)
+                return True
+        # replacement: the occupant's product loses less than p gains
+        loss = min(self.yields[m2], max(0, self.demand[p2] - (self.produced[p2] - self.yields[m2])))
+        if gain > loss:
+            self.clear(k, s)
+            self.place(k, s, m, p)
+            return True
+        return False
+
+    def local_search(self, n_slots, deadline):
+        improved = True
+        while improved and clock.monotonic() < deadline:
+            improved = False
+            for p in range(len(self.demand)):
+                for m, k in self.options[p]:
+                    for s in range(n_slots):
+                        if not self.unmet(p):
+                            break
+                        if self._try_cell(p, m, k, s):
+                            improved = True
+                    if clock.monotonic() >= deadline:
+                        return
+        self.trim()
+
+    def trim(self):
+        """Free cells that only add surplus, latest slots first."""
+        cells = [
+            (s, k) for k, row in enumerate(self.cell_product) for s, p in enumerate(row) if p != FREE
+        ]
+        for s, k in sorted(cells, reverse=True):
+            p, m = self.cell_product[k][s], self.cell_mold[k][s]
+            if self.surplus(p) >= self.yields[m]:
+                self.clear(k, s)
+
+    def changeovers(self, k):
+        molds = [m for m in self.cell_mold[k] if m != FREE]
+        return sum(1 for a, b in zip(molds, molds[1:]) if a != b)
+
+
+def build_schedule(db: Session, tenant_id: int, start_date: date, days: int, demand: Dict[int, int]) -> dict:
+    """
+    Assign molds to machines for every shift in [start_date, start_date + days)
+    to cover demand (product_id -> pieces). Greedy construction followed by a
+    time-boxed local search (fill, eject-and-relocate, replace, trim surplus).
+    Products without a mold-machine route keep their full demand as unmet.
+    """
+    products = {
+        p.id: p for p in
+        db.query(models.Product.id, models.Product.product_no)
+        .filter(models.Product.tenant_id == tenant_id, models.Product.id.in_(list(demand)))
+    }
+    unknown = sorted(set(demand) - set(products))
+    if unknown:
+        raise ValueError(f"Unknown products for this tenant: {unknown}")
+
+    routes = (
+        db.query(
+            models.ProductMold.product_id,
+            models.Mold.id.label("mold_id"),
+            models.Mold.mold_no,
+            models.Mold.cavities,
+            models.Mold.target_shots,
+            models.Machine.id.label("machine_id"),
+            models.Machine.machine_code
+        )
+        .join(models.Mold, models.Mold.id == models.ProductMold.mold_id)
+        .join(models.MoldMachine, models.MoldMachine.mold_id == models.Mold.id)
+        .join(models.Machine, models.Machine.id == models.MoldMachine.machine_id)
+        .filter(
+            models.ProductMold.product_id.in_(list(demand)),
+            models.Mold.tenant_id == tenant_id,
+            models.MoldMachine.tenant_id == tenant_id,
+            models.Mold.target_shots > 0,
+            models.Mold.cavities > 0
+        )
+        .order_by(models.ProductMold.product_id, models.Mold.id, models.Machine.id)
+        .all()
+    )
+
+    product_ids = sorted(demand)
+    mold_ids = sorted({r.mold_id for r in routes})
+    machine_ids = sorted({r.machine_id for r in routes})
+    p_index = {pid: i for i, pid in enumerate(product_ids)}
+    m_index = {mid: i for i, mid in enumerate(mold_ids)}
+    k_index = {kid: i for i, kid in enumerate(machine_ids)}
+    mold_no = {r.mold_id: r.mold_no for r in routes}
+    machine_code = {r.machine_id: r.machine_code for r in routes}
+    yields = [0] * len(mold_ids)
+    options = [[] for _ in product_ids]
+    for r in routes:
+        yields[m_index[r.mold_id]] = r.target_shots * r.cavities
+        options[p_index[r.product_id]].append((m_index[r.mold_id], k_index[r.machine_id]))
+
+    slots = shift_slots(db, tenant_id, start_date, days)
+    plan = _Plan(len(machine_ids), len(mold_ids), len(slots), [demand[p] for p in product_ids], yields, options)
+    plan.greedy(len(slots))
+    plan.local_search(len(slots), clock.monotonic() + LOCAL_SEARCH_SECONDS)
+
+    hours = np.array([s["hours"] for s in slots], dtype=np.float64)
+    busy = np.array(plan.cell_mold, dtype=np.int64).reshape(len(machine_ids), len(slots)) != FREE
+    planned_hours = busy.astype(np.float64) @ hours if len(slots) else np.zeros(len(machine_ids))
+    available_hours = float(hours.sum())
+
+    assignments = [
+        {
+            "machine_id": machine_ids[k],
+            "machine_code": machine_code[machine_ids[k]],
+            "mold_id": mold_ids[m],
+            "mold_no": mold_no[mold_ids[m]],
+            "product_id": product_ids[plan.cell_product[k][s]],
+            "log_date": slots[s]["log_date"],
+            "shift_time_id": slots[s]["shift_time_id"],
+            "tenant_shift_id": slots[s]["tenant_shift_id"],
+            "hours": slots[s]["hours"],
+            "expected_qty": yields[m]
+        }
+        for s in range(len(slots))
+        for k in range(len(machine_ids))
+        for m in (plan.cell_mold[k][s],)
+        if m != FREE
+    ]
+    return {
+        "start_date": start_date,
+        "end_date": start_date + timedelta(days=days - 1),
+        "demand_qty": sum(plan.demand),
+        "planned_qty": sum(min(p, d) for p, d in zip(plan.produced, plan.demand)),
+        "unmet_qty": sum(plan.unmet(p) for p in range(len(product_ids))),
+        "changeovers": sum(plan.changeovers(k) for k in range(len(machine_ids))),
+        "products": [
+            {
+                "product_id": pid,
+                "product_no": products[pid].product_no,
+                "demand_qty": plan.demand[i],
+                "expected_qty": plan.produced[i],
+                "unmet_qty": plan.unmet(i)
+            }
+            for i, pid in enumerate(product_ids)
+        ],
+        "machines": [
+            {
+                "machine_id": kid,
+                "machine_code": machine_code[kid],
+                "planned_hours": round(float(planned_hours[k]), 2),
+                "available_hours": round(available_hours, 2),
+                "utilization": round(float(planned_hours[k]) / available_hours, 3) if available_hours else 0.0,
+                "changeovers": plan.changeovers(k)
+            }
+            for k, kid in enumerate(machine_ids)
+        ],
+        "assignments": assignments
+    }
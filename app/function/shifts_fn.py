@@ -5,6 +5,7 @@ from datetime import datetime, time, timedelta
 from typing import List
 
 from fastapi import HTTPException
+import numpy as np
 import pandas as pd
 
 from app import schemas
@@ -27,6 +28,23 @@ def calculate_duration(start, end) -> float:
     return (end_dt - start_dt).seconds / 3600  # hours
 
 
+def hourly_minutes(start, end):
+    """
+    Split a shift into clock hours. Returns (start_hour, minutes) where
+    minutes[k] is how many minutes of the shift fall in hour start_hour + k
+    (k runs past 23 for overnight shifts). Uses calculate_duration for length.
+    """
+    fmt = "%H:%M"
+    start_dt = datetime.strptime(_normalize_to_str(start), fmt)
+    start_min = start_dt.hour * 60 + start_dt.minute
+    end_min = start_min + round(calculate_duration(start, end) * 60)
+
+    start_hour = start_min // 60
+    edges = np.arange(start_hour, (end_min + 59) // 60 + 1) * 60
+    minutes = np.clip(np.minimum(edges[1:], end_min) - np.maximum(edges[:-1], start_min), 0, None)
+    return start_hour, minutes.astype(np.float64)
+
+
 def is_overlap(start1, end1, start2, end2) -> bool:
     """Check if two time ranges overlap, handling overnight shifts."""
     fmt = "%H:%M"
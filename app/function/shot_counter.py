@@ -0,0 +1,82 @@
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def add_shots(db: Session, tenant_id: int, deltas: Iterable[Tuple[int, int, int]]):
+    """
+    Add (mold_id, machine_id, shots) deltas to the lifetime counters with
+    additive upserts, so concurrent writers never lose an increment. Deltas are
+    negative when a replaced log lowered actual_qty. Keys are written in sorted
+    order to keep row-lock order stable between transactions. Nothing is committed.
+    """
+    per_mold, per_pair = defaultdict(int), defaultdict(int)
+    for mold_id, machine_id, shots in deltas:
+        per_mold[mold_id] += shots
+        per_pair[(mold_id, machine_id)] += shots
+
+    mold_rows = [
+        {"tenant_id": tenant_id, "mold_id": mold_id, "total_shots": shots}
+        for mold_id, shots in sorted(per_mold.items()) if shots
+    ]
+    if mold_rows:
+        stmt = pg_insert(models.MoldShotCounter)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["mold_id"],
+            set_={
+                "total_shots": models.MoldShotCounter.total_shots + stmt.excluded.total_shots,
+                "updated_at": func.now()
+            }
+        ), mold_rows)
+
+    pair_rows = [
+        {"tenant_id": tenant_id, "mold_id": mold_id, "machine_id": machine_id, "total_shots": shots}
+        for (mold_id, machine_id), shots in sorted(per_pair.items()) if shots
+    ]
+    if pair_rows:
+        stmt = pg_insert(models.MoldMachineShotCounter)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["mold_id", "machine_id"],
+            set_={
+                "total_shots": models.MoldMachineShotCounter.total_shots + stmt.excluded.total_shots,
+                "updated_at": func.now()
+            }
+        ), pair_rows)
+
+
+def rebuild(db: Session, tenant_id: Optional[int] = None):
+    """
+    Recompute the counters from the full production_log history, for one
+    tenant or for all of them. The maintenance baseline (serviced_at_shots)
+    is kept.
+    """
+    log = models.ProductionLog
+    log_filter = [] if tenant_id is None else [log.tenant_id == tenant_id]
+
+    def scoped(model):
+        return [] if tenant_id is None else [model.tenant_id == tenant_id]
+
+    db.execute(update(models.MoldShotCounter).where(*scoped(models.MoldShotCounter)).values(total_shots=0))
+    stmt = pg_insert(models.MoldShotCounter).from_select(
+        ["tenant_id", "mold_id", "total_shots"],
+        select(log.tenant_id, log.mold_id, func.sum(log.actual_qty))
+        .where(*log_filter)
+        .group_by(log.tenant_id, log.mold_id)
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["mold_id"],
+        set_={"total_shots": stmt.excluded.total_shots, "updated_at": func.now()}
+    ))
+
+    db.execute(delete(models.MoldMachineShotCounter).where(*scoped(models.MoldMachineShotCounter)))
+    db.execute(insert(models.MoldMachineShotCounter).from_select(
+        ["tenant_id", "mold_id", "machine_id", "total_shots"],
+        select(log.tenant_id, log.mold_id, log.machine_id, func.sum(log.actual_qty))
+        .where(*log_filter)
+        .group_by(log.tenant_id, log.mold_id, log.machine_id)
+    ))
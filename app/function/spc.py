@@ -0,0 +1,171 @@
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import models
+from .cache import DerivedCache
+
+# Safety net only, inspection writes invalidate the dimension right after commit
+SPC_TTL_SECONDS = 15 * 60
+SPC_MAX_CHARTS = 1000  # a chart holds up to one dict per subgroup in its window
+
+# Shewhart constants by subgroup size n (index = n): d2 = E[R]/sigma, and the
+# range chart limit factors D3/D4. A subgroup is a (date, shift timing) and
+# holds at most inspection_fn.MAX_INSPECTIONS_PER_SHIFT readings.
+_D2 = np.array([np.nan, np.nan, 1.128, 1.693, 2.059, 2.326, 2.534, 2.704, 2.847, 2.970, 3.078])
+_D3 = np.array([np.nan, np.nan, 0, 0, 0, 0, 0, 0.076, 0.136, 0.184, 0.223])
+_D4 = np.array([np.nan, np.nan, 3.267, 2.574, 2.282, 2.114, 2.004, 1.924, 1.864, 1.816, 1.777])
+MAX_SUBGROUP_SIZE = len(_D2) - 1
+
+# Keyed by (tenant_id, inspection_id, start_date, end_date), so the size bound
+# counts charts, whatever windows clients ask for. The windows of a dimension
+# share a generation: a write drops them all and a build in flight is not stored.
+_charts = DerivedCache(SPC_TTL_SECONDS, SPC_MAX_CHARTS, group=lambda key: key[:2])
+
+
+def invalidate(tenant_id: int, inspection_id: int):
+    """Drop every cached window of the dimension; call after its readings changed."""
+    _charts.invalidate_group((tenant_id, inspection_id))
+
+
+def _readings(db: Session, inspection_id: int, start_date: date, end_date: date):
+    result = models.ProductInspectionResult
+    return (
+        db.query(result.inspection_date, result.shift_timingid, result.measured_value)
+        .join(models.ShiftTiming, models.ShiftTiming.id == result.shift_timingid)
+        .filter(
+            result.inspection_id == inspection_id,
+            result.inspection_date.between(start_date, end_date),
+            result.measured_value.isnot(None)
+        )
+        .order_by(result.inspection_date, models.ShiftTiming.shift_start, result.shift_timingid, result.inspection_hour)
+        .all()
+    )
+
+
+def _ratio(numerator, denominator):
+    return round(float(numerator / denominator), 4) if denominator > 0 and np.isfinite(numerator) else None
+
+
+def capability(mean: float, sigma: float, lower: Optional[float], upper: Optional[float]):
+    """(C, Ck) for the given sigma: Cp/Cpk with within sigma, Pp/Ppk with overall sigma."""
+    if lower is not None and upper is not None:
+        spread = _ratio(upper - lower, 6 * sigma)
+        k = _ratio(min(upper - mean, mean - lower), 3 * sigma)
+    elif upper is not None:
+        spread, k = None, _ratio(upper - mean, 3 * sigma)
+    elif lower is not None:
+        spread, k = None, _ratio(mean - lower, 3 * sigma)
+    else:
+        spread = k = None
+    return spread, k
+
+
+def compute(dates, shift_ids, values, lower: Optional[float], upper: Optional[float]) -> dict:
+    """
+    X-bar/R chart and capability over readings already in subgroup order.
+    Subgroup sizes may differ, so within sigma is mean(R_i / d2(n_i)) and the
+    limits are per subgroup (X-bar: grand mean +- 3 sigma / sqrt(n_i); R:
+    D3/D4 * d2(n_i) * sigma), which reduces to A2*R-bar when all n_i match.
+    Subgroups of one reading have no range and stay out of the chart; Pp/Ppk
+    use every reading.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    shift_ids = np.asarray(shift_ids, dtype=np.int64)
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(values))
+
+    starts = np.flatnonzero(np.r_[True, (np.diff(ordinals) != 0) | (np.diff(shift_ids) != 0)]) if len(values) else np.array([], dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(values)])
+    keep = (sizes >= 2) & (sizes <= MAX_SUBGROUP_SIZE)
+
+    means = np.add.reduceat(values, starts) / sizes if len(starts) else np.array([])
+    ranges = np.maximum.reduceat(values, starts) - np.minimum.reduceat(values, starts) if len(starts) else np.array([])
+    starts, sizes, means, ranges = starts[keep], sizes[keep], means[keep], ranges[keep]
+
+    readings = len(values)
+    grand_mean = float(values.mean()) if readings else None
+    sigma_within = float(np.mean(ranges / _D2[sizes])) if len(sizes) else None
+    sigma_overall = float(values.std(ddof=1)) if readings > 1 else None
+
+    subgroups = []
+    if len(sizes):
+        x_half = 3 * sigma_within / np.sqrt(sizes)
+        x_lcl, x_ucl = grand_mean - x_half, grand_mean + x_half
+        r_center = _D2[sizes] * sigma_within
+        r_lcl, r_ucl = _D3[sizes] * r_center, _D4[sizes] * r_center
+        out = (means < x_lcl) | (means > x_ucl) | (ranges < r_lcl) | (ranges > r_ucl)
+        subgroups = [
+            {
+                "inspection_date": dates[s],
+                "shift_timingid": int(shift_ids[s]),
+                "size": int(n),
+                "mean": round(float(m), 6),
+                "range": round(float(r), 6),
+                "x_lcl": round(float(xl), 6),
+                "x_ucl": round(float(xu), 6),
+                "r_lcl": round(float(rl), 6),
+                "r_ucl": round(float(ru), 6),
+                "out_of_control": bool(o)
+            }
+            for s, n, m, r, xl, xu, rl, ru, o in zip(starts, sizes, means, ranges, x_lcl, x_ucl, r_lcl, r_ucl, out)
+        ]
+
+    cp = cpk = pp = ppk = None
+    if grand_mean is not None:
+        if sigma_within is not None:
+            cp, cpk = capability(grand_mean, sigma_within, lower, upper)
+        if sigma_overall is not None:
+            pp, ppk = capability(grand_mean, sigma_overall, lower, upper)
+
+    return {
+        "readings": readings,
+        "subgroup_count": len(subgroups),
+        "grand_mean": None if grand_mean is None else round(grand_mean, 6),
+        "mean_range": round(float(ranges.mean()), 6) if len(ranges) else None,
+        "sigma_within": None if sigma_within is None else round(sigma_within, 6),
+        "sigma_overall": None if sigma_overall is None else round(sigma_overall, 6),
+        "cp": cp,
+        "cpk": cpk,
+        "pp": pp,
+        "ppk": ppk,
+        "out_of_control_count": sum(1 for s in subgroups if s["out_of_control"]),
+        "subgroups": subgroups
+    }
+
+
+def _build(db: Session, inspection: models.ProductInspection, start_date: date, end_date: date) -> dict:
+    rows = _readings(db, inspection.id, start_date, end_date)
+    chart = compute(
+        [r.inspection_date for r in rows],
+        [r.shift_timingid for r in rows],
+        [r.measured_value for r in rows],
+        inspection.lower_limit,
+        inspection.upper_limit
+    )
+    return {
+        "inspection_id": inspection.id,
+        "dimension_name": inspection.dimension_name,
+        "lower_limit": inspection.lower_limit,
+        "upper_limit": inspection.upper_limit,
+        "start_date": start_date,
+        "end_date": end_date,
+        **chart
+    }
+
+
+def get_chart(db: Session, tenant_id: int, inspection_id: int, start_date: date, end_date: date) -> Optional[dict]:
+    """Cached chart for the tenant's dimension over [start_date, end_date]; None if it is not theirs."""
+    inspection = (
+        db.query(models.ProductInspection)
+        .filter(models.ProductInspection.id == inspection_id, models.ProductInspection.tenant_id == tenant_id)
+        .first()
+    )
+    if not inspection:
+        return None
+
+    return _charts.get_or_build(
+        (tenant_id, inspection_id, start_date, end_date),
+        lambda: _build(db, inspection, start_date, end_date)
+    )
@@ -0,0 +1,80 @@
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import production_fn
+from .cache import DerivedCache
+
+# Safety net only, writes invalidate the tenant's board right after commit
+BOARD_TTL_SECONDS = 5 * 60
+
+_boards = DerivedCache(BOARD_TTL_SECONDS)
+
+
+def invalidate(tenant_id: int):
+    """Drop the cached board; call after a production log write has committed."""
+    _boards.invalidate(tenant_id)
+
+
+def _latest_logs(db: Session, tenant_id: int):
+    """Latest log per machine: DISTINCT ON (machine_id), newest date then latest shift start."""
+    log = models.ProductionLog
+    return db.execute(
+        select(
+            log.machine_id,
+            log.mold_id,
+            models.Mold.mold_no,
+            log.log_date,
+            log.shift_time_id,
+            models.ShiftTiming.tenant_shift_id,
+            models.TenantShift.shift_name,
+            log.actual_qty,
+            log.target_qty,
+            log.operator,
+            models.User.user_name
+        )
+        .distinct(log.machine_id)
+        .join(models.Mold, models.Mold.id == log.mold_id)
+        .join(models.ShiftTiming, models.ShiftTiming.id == log.shift_time_id)
+        .join(models.TenantShift, models.TenantShift.id == models.ShiftTiming.tenant_shift_id)
+        .outerjoin(models.User, models.User.id == log.operator)
+        .where(log.tenant_id == tenant_id)
+        .order_by(log.machine_id, log.log_date.desc(), models.ShiftTiming.shift_start.desc(), log.id.desc())
+    ).all()
+
+
+def _build(db: Session, tenant_id: int) -> List[dict]:
+    latest = {row.machine_id: row for row in _latest_logs(db, tenant_id)}
+    machines = (
+        db.query(models.Machine.id, models.Machine.machine_code)
+        .filter(models.Machine.tenant_id == tenant_id)
+        .order_by(models.Machine.machine_code)
+        .all()
+    )
+    board = []
+    for machine in machines:
+        row = latest.get(machine.id)
+        entry = {"machine_id": machine.id, "machine_code": machine.machine_code}
+        if row is not None:
+            entry.update(
+                mold_id=row.mold_id,
+                mold_no=row.mold_no,
+                log_date=row.log_date,
+                shift_time_id=row.shift_time_id,
+                tenant_shift_id=row.tenant_shift_id,
+                shift_name=row.shift_name,
+                actual_qty=row.actual_qty,
+                target_qty=row.target_qty,
+                efficiency=production_fn.calculate_efficiency(row.actual_qty, row.target_qty),
+                operator_id=row.operator,
+                operator_name=row.user_name
+            )
+        board.append(entry)
+    return board
+
+
+def get_board(db: Session, tenant_id: int) -> List[dict]:
+    """Cached board for the tenant."""
+    return _boards.get_or_build(tenant_id, lambda: _build(db, tenant_id))
@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import shifts_fn
+
+HOURS_PER_WEEK = 7 * 24
+MAX_SHIFT_HOURS = 25  # hour buckets one shift can touch (24h + a partial first hour)
+
+
+def weekly_heatmap(db: Session, tenant_id: int, week_start: date, machine_id: Optional[int] = None) -> dict:
+    """
+    Machines x 168 hour-of-week matrices for the week starting on the Monday of
+    week_start. Every log's actual, target and downtime are spread over the clock
+    hours of its shift timing in proportion to the minutes the shift spends in
+    each hour; overnight shifts spill into the next day (logs from the Sunday
+    before spill into Monday morning). Utilization per cell is actual / target,
+    None where nothing was planned.
+    """
+    week_start = week_start - timedelta(days=week_start.weekday())
+    log = models.ProductionLog
+
+    machines_query = db.query(models.Machine.id, models.Machine.machine_code).filter(models.Machine.tenant_id == tenant_id)
+    if machine_id is not None:
+        machines_query = machines_query.filter(models.Machine.id == machine_id)
+    machines = machines_query.order_by(models.Machine.machine_code).all()
+
+    machine_ids = np.array([m.id for m in machines], dtype=np.int64)
+    actual_grid = np.zeros((len(machines), HOURS_PER_WEEK))
+    target_grid = np.zeros_like(actual_grid)
+    downtime_grid = np.zeros_like(actual_grid)
+
+    downtime = (
+        select(func.coalesce(func.sum(models.ProductionDowntime.duration_min), 0))
+        .where(
+            models.ProductionDowntime.production_log_id == log.id,
+            models.ProductionDowntime.log_date == log.log_date
+        )
+        .scalar_subquery()
+    )
+    logs = db.execute(
+        select(log.machine_id, log.shift_time_id, log.log_date, log.actual_qty, log.target_qty, downtime)
+        .where(
+            log.tenant_id == tenant_id,
+            log.machine_id.in_(machine_ids.tolist()),
+            log.log_date.between(week_start - timedelta(days=1), week_start + timedelta(days=6))
+        )
+    ).all()
+
+    if logs and len(machines):
+        n = len(logs)
+        log_machine = np.fromiter((r[0] for r in logs), dtype=np.int64, count=n)
+        log_timing = np.fromiter((r[1] for r in logs), dtype=np.int64, count=n)
+        day_offset = np.fromiter(((r[2] - week_start).days for r in logs), dtype=np.int64, count=n)
+        values = np.array([[r[3], r[4], r[5]] for r in logs], dtype=np.float64)
+
+        # One minute profile per shift timing, normalised to weights summing to 1
+        timing_ids = np.unique(log_timing)
+        timings = {
+            t.id: t for t in
+            db.query(models.ShiftTiming.id, models.ShiftTiming.shift_start, models.ShiftTiming.shift_end)
+            .filter(models.ShiftTiming.id.in_(timing_ids.tolist()))
+        }
+        start_hour = np.zeros(len(timing_ids), dtype=np.int64)
+        weights = np.zeros((len(timing_ids), MAX_SHIFT_HOURS))
+        for k, timing_id in enumerate(timing_ids):
+            hour, minutes = shifts_fn.hourly_minutes(timings[timing_id].shift_start, timings[timing_id].shift_end)
+            start_hour[k] = hour
+            if minutes.sum() > 0:
+                weights[k, :len(minutes)] = minutes / minutes.sum()
+
+        t = np.searchsorted(timing_ids, log_timing)
+        order = np.argsort(machine_ids)  # rows follow machine_code, not id
+        rows = order[np.searchsorted(machine_ids[order], log_machine)]
+
+        # (logs x buckets) absolute hour of week and share of the log in it
+        cols = (day_offset * 24 + start_hour[t])[:, None] + np.arange(MAX_SHIFT_HOURS)
+        share = weights[t]
+        inside = (cols >= 0) & (cols < HOURS_PER_WEEK) & (share > 0)
+        r = np.broadcast_to(rows[:, None], cols.shape)[inside]
+        c = cols[inside]
+        for grid, column in ((actual_grid, 0), (target_grid, 1), (downtime_grid, 2)):
+            np.add.at(grid, (r, c), (values[:, column][:, None] * share)[inside])
+
+    utilization = np.full_like(actual_grid, np.nan)
+    np.divide(actual_grid, target_grid, out=utilization, where=target_grid > 0)
+
+    return {
+        "week_start": week_start,
+        "machine_ids": [m.id for m in machines],
+        "machine_codes": [m.machine_code for m in machines],
+        "utilization": [[None if np.isnan(v) else round(float(v), 3) for v in row] for row in utilization],
+        "downtime_min": np.round(downtime_grid, 1).tolist()
+    }
@@ -0,0 +1,191 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+
+from .. import schemas
+from ..database import SessionLocal
+from . import inspection_fn, production_fn
+from .cache import TTLStore
+
+logger = logging.getLogger(__name__)
+
+TICKET_TTL_SECONDS = 6 * 60 * 60
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Accepts already structurally validated writes, acknowledges them with a
+    ticket and lets a single background thread validate and insert them in
+    batches (one transaction and one multi-row insert per tenant/user group;
+    a group that fails is retried write by write, so only the bad one fails).
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5, max_pending: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._tickets = TTLStore(TICKET_TTL_SECONDS, max_entries=max_pending * 10)
+        self._handlers = {}
+        self._thread: Optional[threading.Thread] = None
+        self._accepting = False
+
+    def register(self, kind: str, handler: Callable, on_commit: Callable):
+        """
+        handler(db, tenant_id, user_id, payloads, **options) -> one result dict per payload.
+        on_commit(tenant_id, payloads, results) runs once the batch is committed.
+        """
+        self._handlers[kind] = (handler, on_commit)
+
+    def submit(self, kind: str, tenant_id: int, user_id: int, payload: dict, **options) -> dict:
+        if not self._accepting:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Write queue is not accepting requests, submit without defer"
+            )
+
+        ticket = {
+            "ticket_id": uuid.uuid4().hex,
+            "kind": kind,
+            "tenant_id": tenant_id,
+            "status": "queued",
+            "queued_at": time.time(),
+            "result": None
+        }
+        self._tickets.set(ticket["ticket_id"], ticket)
+        try:
+            self._queue.put_nowait((ticket["ticket_id"], kind, tenant_id, user_id, payload, options))
+        except queue.Full:
+            self._tickets.pop(ticket["ticket_id"])
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Write queue is full, please retry later"
+            )
+        return ticket
+
+    def ticket(self, ticket_id: str) -> Optional[dict]:
+        return self._tickets.get(ticket_id)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._accepting = True
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """Stop accepting writes and drain everything already queued."""
+        self._accepting = False
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+        # Drain whatever is left after the stop marker
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._flush(batch[start:start + self.batch_size])
+
+    def _flush(self, batch):
+        groups = defaultdict(list)
+        for ticket_id, kind, tenant_id, user_id, payload, options in batch:
+            groups[(kind, tenant_id, user_id, tuple(sorted(options.items())))].append((ticket_id, payload))
+
+        for group, items in groups.items():
+            try:
+                self._write(*group, items)
+            except Exception as e:
+                logger.exception("write-behind flush failed for %s (tenant %s)", group[0], group[1])
+                if len(items) == 1:
+                    self._fail(items, e)
+                    continue
+                # One bad write must not fail the whole group: retry each on its own
+                for item in items:
+                    try:
+                        self._write(*group, [item])
+                    except Exception as e:
+                        logger.exception("write-behind ticket %s failed", item[0])
+                        self._fail([item], e)
+
+    def _write(self, kind, tenant_id, user_id, options, items):
+        """Write the items in one transaction; raises (rolled back) when the handler fails."""
+        handler, on_commit = self._handlers[kind]
+        payloads = [p for _, p in items]
+        db = SessionLocal()
+        try:
+            results = handler(db, tenant_id, user_id, payloads, **dict(options))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for (ticket_id, _), result in zip(items, results):
+            self._finish(ticket_id, "failed" if result["status"] == "rejected" else "done", result)
+        try:
+            on_commit(tenant_id, payloads, results)
+        except Exception:
+            # committed already, so the tickets stand and nothing is retried
+            logger.exception("write-behind post-commit hook failed for %s (tenant %s)", kind, tenant_id)
+
+    def _fail(self, items, error: Exception):
+        for ticket_id, _ in items:
+            self._finish(ticket_id, "failed", {"status": "rejected", "status_code": 500, "detail": str(error)})
+
+    def _finish(self, ticket_id: str, state: str, result: dict):
+        ticket = self._tickets.get(ticket_id)
+        if ticket is not None:
+            # "index" is the position inside the worker batch, meaningless to the client
+            result = {k: v for k, v in result.items() if k != "index"}
+            self._tickets.replace(ticket_id, {**ticket, "status": state, "finished_at": time.time(), "result": result})
+
+
+def _write_production_logs(db, tenant_id, user_id, payloads, on_duplicate=production_fn.ON_DUPLICATE_REJECT):
+    logs = [schemas.ProductionLogCreate.model_validate(p) for p in payloads]
+    return production_fn.write_batch(db, tenant_id, user_id, logs, on_duplicate)
+
+
+def _write_inspection_results(db, tenant_id, user_id, payloads):
+    rows = [schemas.ProductInspectionResultCreate.model_validate(p) for p in payloads]
+    return inspection_fn.write_results(db, tenant_id, user_id, rows)
+
+
+write_queue = WriteBehindQueue()
+write_queue.register("production_log", _write_production_logs, production_fn.committed)
+write_queue.register("inspection_result", _write_inspection_results, inspection_fn.committed)
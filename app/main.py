@@ -1,10 +1,13 @@
  
+import logging
+
 from fastapi import FastAPI, Request
 
 # from app.routers import tenant
 from . import models
-from .database import engine
-from .routers import (fadmin,auth,admin,tenant,tenant_user,shifts,declaration,product,inspection,inspection_result,mold,machine,mold_machine,production)
+from .database import engine, SessionLocal
+from .routers import (fadmin,auth,admin,tenant,tenant_user,shifts,declaration,product,inspection,inspection_result,mold,machine,mold_machine,production,write_queue,events,planning,data_quality,spc)
+from .function import partitions, write_behind
 from .config import settings
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
@@ -47,8 +50,40 @@ app.include_router(mold.router)
 app.include_router(machine.router)
 app.include_router(mold_machine.router)
 app.include_router(production.router)
+app.include_router(write_queue.router)
+app.include_router(events.router)
+app.include_router(planning.router)
+app.include_router(data_quality.router)
+app.include_router(spc.router)
+
 
+# ---------------Ends-----------------------------
 
+# ------------ background workers ---------------
+@app.on_event("startup")
+def start_workers():
+    write_behind.write_queue.start()
+
+
+@app.on_event("startup")
+def ensure_partitions():
+    # upcoming months must exist before the first insert lands in them
+    db = SessionLocal()
+    try:
+        if partitions.is_partitioned(db):
+            partitions.maintain(db)
+            db.commit()
+    except Exception:
+        db.rollback()
+        logging.getLogger(__name__).exception("production_log partition maintenance failed")
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def stop_workers():
+    # drains the write-behind queue before the process exits
+    write_behind.write_queue.stop()
 # ---------------Ends-----------------------------
 
 
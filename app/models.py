@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, DateTime, Enum, Integer, String, Boolean, ForeignKey, Float, BigInteger,
-    Sequence, Date, Time, UniqueConstraint, Index, func
+    Sequence, Date, Time, UniqueConstraint, Index, ForeignKeyConstraint, func
 )
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.orm import relationship
@@ -443,6 +443,8 @@ class ProductInspection(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     drawing_id = Column(Integer, ForeignKey('product_drawing.id', ondelete='CASCADE'), nullable=False)
+    # Denormalized from product_drawing -> product so tenant filters need no joins
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
     dimension_name = Column(String, nullable=False)
     inspection_type = Column(Enum("dimensional", "gauge", name="inspection_type_enum"), nullable=False)
     # For dimensional inspection
@@ -464,6 +466,7 @@ class ProductInspection(Base):
 
     __table_args__ = (
         UniqueConstraint('drawing_id', 'dimension_name', name='uix_product_dimension'),
+        Index('ix_product_inspection_tenant_drawing', 'tenant_id', 'drawing_id'),
     )
 
 
@@ -479,6 +482,9 @@ class ProductInspectionResult(Base):
     inspection_id = Column(Integer, ForeignKey('product_inspection.id', ondelete='CASCADE'), nullable=False)
     inspector_id = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     shift_timingid = Column(Integer, ForeignKey('shift_timing.id', ondelete='SET NULL'), nullable=True)
+    # Denormalized from product_inspection, written with the result
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    drawing_id = Column(Integer, ForeignKey('product_drawing.id', ondelete='CASCADE'), nullable=False)
 
     measured_value = Column(Float, nullable=True)
     go_no_go = Column(Boolean, nullable=True)
@@ -496,8 +502,11 @@ class ProductInspectionResult(Base):
     users = relationship("User", back_populates="inspection_result")
     shifts_timings = relationship("ShiftTiming", back_populates="inspection_result")
 
+    # One reading per dimension (inspection) and hour; see function/inspection_fn.py
     __table_args__ = (
-        UniqueConstraint('shift_timingid', 'inspection_date', 'inspection_hour', name='uix_shift_hourly_unique'),
+        UniqueConstraint('inspection_id', 'inspection_date', 'inspection_hour', name='uix_inspection_hourly_unique'),
+        Index('ix_product_inspection_result_tenant_date', 'tenant_id', 'inspection_date', 'id'),
+        Index('ix_product_inspection_result_tenant_drawing', 'tenant_id', 'drawing_id', 'inspection_date'),
     )
 
 
@@ -640,13 +649,15 @@ class MoldMachine(Base):
 class ProductionLog(Base):
     __tablename__ = "production_log"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Range partitioned by month on log_date (see function/partitions.py), so
+    # log_date is part of the primary key and of every unique constraint.
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
     operator = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     shift_time_id = Column(Integer, ForeignKey("shift_timing.id"), nullable=False)
     target_qty = Column(Integer, nullable=False)
     actual_qty = Column(Integer, nullable=False)
-    log_date  = Column(Date, nullable=False)
+    log_date  = Column(Date, primary_key=True, nullable=False)
     mold_id = Column(Integer, ForeignKey("mold.id"), nullable=False)
     machine_id = Column(Integer, ForeignKey("machine.id"), nullable=False)
     created_by = Column(Integer)
@@ -669,6 +680,9 @@ class ProductionLog(Base):
             "tenant_id", "shift_time_id", "log_date", "mold_id", "machine_id",
             name="uq_tenant_shift_date_mold_machine"
         ),
+        Index("ix_production_log_tenant_date_id", "tenant_id", "log_date", "id"),  # keyset pagination
+        Index("ix_production_log_tenant_machine_date", "tenant_id", "machine_id", log_date.desc()),  # status board
+        {"postgresql_partition_by": "RANGE (log_date)"},
     )
 
 # Production Log for shifts ends here
@@ -678,9 +692,10 @@ class ProductionLog(Base):
 class ProductionDowntime(Base):
     __tablename__ = "production_downtime"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
-    production_log_id = Column(Integer, ForeignKey("production_log.id"), nullable=False)
+    production_log_id = Column(Integer, nullable=False)
+    log_date = Column(Date, primary_key=True, nullable=False)  # partition key, copied from the parent log
     downtime_id = Column(Integer, ForeignKey("down_time.id"), nullable=False)  # lookup downtime reasons
     duration_min = Column(Integer, nullable=False)
     created_by = Column(Integer)
@@ -694,7 +709,11 @@ class ProductionDowntime(Base):
     production_log = relationship("ProductionLog", back_populates="downtimes")
 
     __table_args__ = (
-        UniqueConstraint("production_log_id", "downtime_id", name="uq_production_downtime"),
+        ForeignKeyConstraint(
+            ["production_log_id", "log_date"], ["production_log.id", "production_log.log_date"]
+        ),
+        UniqueConstraint("production_log_id", "log_date", "downtime_id", name="uq_production_downtime"),
+        {"postgresql_partition_by": "RANGE (log_date)"},
     )
 
 # Production Log for defects ends here
@@ -703,9 +722,10 @@ class ProductionDowntime(Base):
 class ProductionRejection(Base):
     __tablename__ = "production_rejection"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
-    production_log_id = Column(Integer, ForeignKey("production_log.id"), nullable=False)
+    production_log_id = Column(Integer, nullable=False)
+    log_date = Column(Date, primary_key=True, nullable=False)  # partition key, copied from the parent log
     defect_id = Column(Integer, ForeignKey("defect.id"), nullable=False)  # lookup defects
     quantity = Column(Integer, nullable=False)
 
@@ -714,5 +734,202 @@ class ProductionRejection(Base):
     defect = relationship("Defect", back_populates="rejections")
 
     __table_args__ = (
-        UniqueConstraint("production_log_id", "defect_id", name="uq_production_defect"),
-    )
\ No newline at end of file
+        ForeignKeyConstraint(
+            ["production_log_id", "log_date"], ["production_log.id", "production_log.log_date"]
+        ),
+        UniqueConstraint("production_log_id", "log_date", "defect_id", name="uq_production_defect"),
+        {"postgresql_partition_by": "RANGE (log_date)"},
+    )
+
+# Production rollups starts here
+# One row per tenant x machine x mold x date x shift, kept in step with
+# production_log by the write path (see function/rollup.py)
+
+class ProductionRollup(Base):
+    __tablename__ = "production_rollup"
+
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), primary_key=True)
+    machine_id = Column(Integer, ForeignKey("machine.id", ondelete='CASCADE'), primary_key=True)
+    mold_id = Column(Integer, ForeignKey("mold.id", ondelete='CASCADE'), primary_key=True)
+    log_date = Column(Date, primary_key=True)
+    tenant_shift_id = Column(Integer, ForeignKey("tenant_shift.id", ondelete='CASCADE'), primary_key=True)
+    target_qty = Column(BigInteger, nullable=False, default=0)
+    actual_qty = Column(BigInteger, nullable=False, default=0)
+    downtime_min = Column(BigInteger, nullable=False, default=0)
+    rejection_qty = Column(BigInteger, nullable=False, default=0)
+    log_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_production_rollup_tenant_date', 'tenant_id', 'log_date'),
+    )
+
+
+class ProductionRollupDowntime(Base):
+    __tablename__ = "production_rollup_downtime"
+
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), primary_key=True)
+    machine_id = Column(Integer, ForeignKey("machine.id", ondelete='CASCADE'), primary_key=True)
+    mold_id = Column(Integer, ForeignKey("mold.id", ondelete='CASCADE'), primary_key=True)
+    log_date = Column(Date, primary_key=True)
+    tenant_shift_id = Column(Integer, ForeignKey("tenant_shift.id", ondelete='CASCADE'), primary_key=True)
+    downtime_id = Column(Integer, ForeignKey("down_time.id", ondelete='CASCADE'), primary_key=True)
+    duration_min = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_production_rollup_downtime_tenant_date', 'tenant_id', 'log_date'),
+    )
+
+
+class ProductionRollupRejection(Base):
+    __tablename__ = "production_rollup_rejection"
+
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), primary_key=True)
+    machine_id = Column(Integer, ForeignKey("machine.id", ondelete='CASCADE'), primary_key=True)
+    mold_id = Column(Integer, ForeignKey("mold.id", ondelete='CASCADE'), primary_key=True)
+    log_date = Column(Date, primary_key=True)
+    tenant_shift_id = Column(Integer, ForeignKey("tenant_shift.id", ondelete='CASCADE'), primary_key=True)
+    defect_id = Column(Integer, ForeignKey("defect.id", ondelete='CASCADE'), primary_key=True)
+    quantity = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_production_rollup_rejection_tenant_date', 'tenant_id', 'log_date'),
+    )
+
+# Production rollups ends here
+
+# Mold shot counters starts here
+# Lifetime shots (sum of production_log.actual_qty) per mold and per
+# mold x machine, kept in step by the write path (see function/shot_counter.py)
+
+class MoldShotCounter(Base):
+    __tablename__ = "mold_shot_counter"
+
+    mold_id = Column(Integer, ForeignKey("mold.id", ondelete='CASCADE'), primary_key=True)
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    total_shots = Column(BigInteger, nullable=False, default=0)
+    serviced_at_shots = Column(BigInteger, nullable=False, default=0)  # total_shots at the last maintenance
+    serviced_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_mold_shot_counter_tenant_shots', 'tenant_id', 'total_shots'),
+    )
+
+
+class MoldMachineShotCounter(Base):
+    __tablename__ = "mold_machine_shot_counter"
+
+    mold_id = Column(Integer, ForeignKey("mold.id", ondelete='CASCADE'), primary_key=True)
+    machine_id = Column(Integer, ForeignKey("machine.id", ondelete='CASCADE'), primary_key=True)
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    total_shots = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_mold_machine_shot_counter_tenant', 'tenant_id'),
+    )
+
+# Mold shot counters ends here
+
+# Data quality scanner starts here
+# Batch checks over production_log and its children (see function/data_quality.py).
+# Findings carry the log's (production_log_id, log_date) without a foreign key
+# so detaching an old production_log partition is never blocked; a rescan of
+# the range replaces them.
+
+class DataQualityScan(Base):
+    __tablename__ = "data_quality_scan"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    scanned_logs = Column(BigInteger, nullable=False, default=0)
+    finding_count = Column(BigInteger, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_by = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # one scan in flight per tenant
+        Index(
+            'uq_data_quality_scan_active', 'tenant_id', unique=True,
+            postgresql_where=text("status IN ('queued', 'running')")
+        ),
+    )
+
+
+class DataQualityFinding(Base):
+    __tablename__ = "data_quality_finding"
+
+    id = Column(BigInteger, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    production_log_id = Column(Integer, nullable=False)
+    log_date = Column(Date, nullable=False)
+    rule = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    limit = Column(Float, nullable=False)
+    scan_id = Column(Integer, ForeignKey('data_quality_scan.id', ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'log_date', 'production_log_id', 'rule', name='uq_data_quality_finding'),
+        Index('ix_data_quality_finding_tenant_rule', 'tenant_id', 'rule', 'log_date'),
+    )
+
+# Data quality scanner ends here
+
+# Inspection running stats starts here
+# Lifetime count / mean / M2 (Welford) / min / max / out-of-tolerance per
+# inspection dimension, kept in step by the result write paths
+# (see function/inspection_stats.py)
+
+class InspectionStats(Base):
+    __tablename__ = "inspection_stats"
+
+    inspection_id = Column(Integer, ForeignKey('product_inspection.id', ondelete='CASCADE'), primary_key=True)
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    reading_count = Column(BigInteger, nullable=False, default=0)  # every result, gauge ones included
+    value_count = Column(BigInteger, nullable=False, default=0)  # results with a measured_value
+    mean = Column(Float, nullable=False, default=0)
+    m2 = Column(Float, nullable=False, default=0)  # sum of squared deviations from mean
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    out_of_tolerance = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_inspection_stats_tenant', 'tenant_id'),
+    )
+
+# Inspection running stats ends here
+
+# Inspection alerts starts here
+# Run-rule (Western Electric / Nelson) violations raised as readings arrive
+# (see function/run_rules.py). result_id has no FK so deleting a reading
+# keeps its alert history.
+
+class InspectionAlert(Base):
+    __tablename__ = "inspection_alert"
+
+    id = Column(BigInteger, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey('tenant.id', ondelete='CASCADE'), nullable=False)
+    inspection_id = Column(Integer, ForeignKey('product_inspection.id', ondelete='CASCADE'), nullable=False)
+    result_id = Column(Integer, nullable=False)
+    inspection_date = Column(Date, nullable=False)
+    inspection_hour = Column(Integer, nullable=False)
+    rule = Column(String, nullable=False)
+    measured_value = Column(Float, nullable=False)
+    center = Column(Float, nullable=False)
+    sigma = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_inspection_alert_tenant_created', 'tenant_id', 'created_at'),
+        Index('ix_inspection_alert_inspection_created', 'inspection_id', 'created_at'),
+    )
+
+# Inspection alerts ends here
@@ -0,0 +1,94 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import models, schemas, oauth2
+from ..function import user, tenant, data_quality
+from ..database import get_db
+
+router = APIRouter(prefix="/data-quality", tags=["Data Quality"])
+
+
+# ---------------- START A SCAN ----------------
+@router.post("/scans", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.DataQualityScanOut)
+def start_scan(
+    payload: schemas.DataQualityScanCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """
+    Queue a scan of the tenant's production logs (optionally limited to a date
+    range). It runs after the response is sent; poll GET /scans/{id}.
+    """
+    try:
+        user.get_user_status(current_user)
+        tenant.user_role_admin(current_user)
+        if payload.start_date and payload.end_date and payload.start_date > payload.end_date:
+            raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+        scan = data_quality.start_scan(
+            db, current_user.tenant_id, current_user.id, payload.start_date, payload.end_date
+        )
+        background_tasks.add_task(data_quality.run_scan, scan.id)
+        return scan
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+# ---------------- SCAN STATUS ----------------
+@router.get("/scans/{scan_id}", response_model=schemas.DataQualityScanOut)
+def get_scan(
+    scan_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    scan = db.query(models.DataQualityScan).filter(
+        models.DataQualityScan.id == scan_id,
+        models.DataQualityScan.tenant_id == current_user.tenant_id
+    ).first()
+    if not scan:
+        raise HTTPException(status_code=404, detail=f"Scan {scan_id} not found")
+    return scan
+
+
+# ---------------- FINDINGS ----------------
+@router.get("/findings", response_model=List[schemas.DataQualityFindingOut])
+def list_findings(
+    rule: Optional[str] = Query(None, description=", ".join(data_quality.RULES)),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """Current findings, newest logs first."""
+    user.get_user_status(current_user)
+    if rule is not None and rule not in data_quality.RULES:
+        raise HTTPException(status_code=400, detail=f"Unknown rule {rule}")
+
+    finding = models.DataQualityFinding
+    query = db.query(finding).filter(finding.tenant_id == current_user.tenant_id)
+    if rule is not None:
+        query = query.filter(finding.rule == rule)
+    if start_date is not None:
+        query = query.filter(finding.log_date >= start_date)
+    if end_date is not None:
+        query = query.filter(finding.log_date <= end_date)
+    return (
+        query.order_by(finding.log_date.desc(), finding.production_log_id.desc(), finding.rule)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
@@ -0,0 +1,62 @@
+import asyncio
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from starlette.concurrency import run_in_threadpool
+
+from .. import oauth2
+from ..database import SessionLocal
+from ..function import user
+from ..function.events import broker
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+def _authenticate(token: str) -> int:
+    """Return the tenant id of an active, verified user, raise otherwise."""
+    db = SessionLocal()
+    try:
+        current_user = oauth2.get_current_user(token, db)
+        user.get_user_status(current_user)
+        return current_user.tenant_id
+    finally:
+        db.close()
+
+
+@router.websocket("/ws")
+async def production_events(websocket: WebSocket, token: str = Query(..., description="Access token")):
+    """
+    Push channel for the caller's tenant: one JSON message per committed
+    production log or inspection result, and per run-rule alert (browsers cannot set headers on a
+    WebSocket, so the access token comes as a query parameter).
+    """
+    try:
+        tenant_id = await run_in_threadpool(_authenticate, token)
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = broker.subscribe(tenant_id)
+
+    async def forward():
+        try:
+            while True:
+                await websocket.send_text(await queue.get())
+        except Exception:
+            return  # socket closed while sending
+
+    async def watch():
+        # clients only listen; a receive returns once the socket is closed
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        except WebSocketDisconnect:
+            return
+
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(watch())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        broker.unsubscribe(tenant_id, queue)
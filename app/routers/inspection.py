@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
 from typing import List
 from .. import models, schemas, database, oauth2
-from ..function import user,tenant
+from ..function import user,tenant,spc,inspection_stats
 from ..database import get_db
 router = APIRouter(
     prefix="/product-inspections",
@@ -78,6 +78,7 @@ def create_product_inspections_bulk(
 
         # Step 6: Add required columns
         df["drawing_id"] = request.drawing_id
+        df["tenant_id"] = tenant_id
         df["created_by"] = current_user.id
         df["updated_by"] = current_user.id
 
@@ -199,8 +200,8 @@ def update_product_inspection(
                 detail=f"No data found for inspection ID {inspection_id}"
             )
 
-        # Step 3: Tenant ownership check (adjust attribute names as per your models)
-        if inspection.product_drawings.products.tenant_id != tenant_id:
+        # Step 3: Tenant ownership check
+        if inspection.tenant_id != tenant_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Inspection ID {inspection_id} does not belong to your tenant."
@@ -211,10 +212,16 @@ def update_product_inspection(
         update_model_from_dict(inspection, update_data)
 
         inspection.updated_by = current_user.id
+        if "lower_limit" in update_data or "upper_limit" in update_data:
+            # out-of-tolerance counts depend on the limits
+            db.flush()
+            inspection_stats.rebuild(db, inspection_id=inspection_id)
 
         # Step 5: Commit and refresh
         db.commit()
         db.refresh(inspection)
+        # Limits feed Cp/Cpk
+        spc.invalidate(tenant_id, inspection_id)
 
         return inspection
 
@@ -243,12 +250,13 @@ def delete_product_inspection(
         tenant_id = current_user.tenant.id
 
         inspection = (
-            db.query(models.ProductInspection).join(models.ProductDrawing).join(models.Product).join(models.Tenant).filter(models.ProductInspection.id == inspection_id, models.Tenant.id == tenant_id).first()
+            db.query(models.ProductInspection).filter(models.ProductInspection.id == inspection_id, models.ProductInspection.tenant_id == tenant_id).first()
         )
         if not inspection:
             raise HTTPException(status_code=404, detail="Inspection not found or access denied")
         db.delete(inspection)
         db.commit()
+        spc.invalidate(tenant_id, inspection_id)
         return{"deleted_id":inspection_id}
 
     except IntegrityError as e:
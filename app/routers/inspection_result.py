@@ -1,11 +1,12 @@
 import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse
 from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
-from typing import List
+from typing import List, Optional
 from .. import models, schemas, database, oauth2
-from ..function import user,tenant,timeapp
+from ..function import user,tenant,timeapp,idempotency,write_behind,inspection_fn,inspection_stats,run_rules,spc
 from ..database import get_db
 from datetime import date, time, datetime
 from psycopg2.errors import UniqueViolation
@@ -23,87 +24,108 @@ router = APIRouter(prefix="/inspection-results", tags=["Inspection Results"])
 @router.post("/record", response_model=schemas.ProductInspectionResultResponse)
 def create_inspection_result(
     payload: schemas.ProductInspectionResultCreate,
+    defer: bool = Query(False, description="Acknowledge with a ticket and write in the background"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(oauth2.get_current_user)
 ):
+    if defer:
+        action = lambda: _defer_inspection_result(payload, current_user)
+    else:
+        action = lambda: _create_inspection_result(payload, db, current_user)
+
+    # A retried submission with the same Idempotency-Key gets the stored response back
+    return idempotency.run(
+        idempotency_key,
+        f"inspection-result:{current_user.tenant_id}:{current_user.id}",
+        {"payload": payload.model_dump(mode="json", exclude_unset=True), "defer": defer},
+        action
+    )
 
-    tenant_id = current_user.tenant_id
-
-    # 1️⃣ Validate Inspector Exists
-    inspector = db.query(models.User).filter(
-        models.User.id == payload.inspector_id,
-        models.User.tenant_id == tenant_id
-    ).first()
-    if not inspector:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Inspector ID {payload.inspector_id} does not exist for this tenant."
-        )
 
-    # 2️⃣ Validate ShiftTiming via TenantShift -> Tenant
-    shift_timing = db.query(models.ShiftTiming).join(models.TenantShift).filter(
-        models.ShiftTiming.id == payload.shift_timingid,
-        models.TenantShift.tenant_id == tenant_id
-    ).first()
-    if not shift_timing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid shift_timingid for this tenant."
-        )
+def _defer_inspection_result(payload: schemas.ProductInspectionResultCreate, current_user: models.User):
+    # Only structural validation (schema) here, the write-behind worker runs the full validation
+    ticket = write_behind.write_queue.submit(
+        "inspection_result",
+        current_user.tenant_id,
+        current_user.id,
+        payload.model_dump(mode="json")
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"message": "Inspection result queued", "ticket_id": ticket["ticket_id"], "status": ticket["status"]}
+    )
 
-    # 3️⃣ Validate inspection hour is within shift time (handle overnight shifts)
-    inspection_hour = payload.inspection_hour
-    inspection_time_obj = time(inspection_hour, 0)
 
-    if not timeapp.is_time_in_shift_range(inspection_time_obj, shift_timing.shift_start, shift_timing.shift_end):
+def _create_inspection_result(
+    payload: schemas.ProductInspectionResultCreate,
+    db: Session,
+    current_user: models.User
+):
+    # Same set-based validation as the bulk endpoint, for a batch of one
+    try:
+        result = inspection_fn.write_results(db, current_user.tenant_id, current_user.id, [payload])[0]
+        if result["status"] == "rejected":
+            db.rollback()
+            raise HTTPException(status_code=result["status_code"], detail=result["detail"])
+        db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Inspection hour {inspection_hour:02d}:00 is outside shift time range "
-                   f"{shift_timing.shift_start.strftime('%H:%M')} - {shift_timing.shift_end.strftime('%H:%M')}."
+            detail=f"Database error: {str(e)}"
         )
 
-    # 4️⃣ Ensure max 8 inspections per shift
-    count_existing = db.query(models.ProductInspectionResult).filter(
-        models.ProductInspectionResult.shift_timingid == payload.shift_timingid,
-        models.ProductInspectionResult.inspection_date == payload.inspection_date
-    ).count()
-    if count_existing >= 8:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Maximum inspection count (8) reached for this shift."
-        )
+    inspection_fn.committed(current_user.tenant_id, [payload.model_dump()], [result])
+    new_result = db.get(models.ProductInspectionResult, result["result_id"])
+    return schemas.ProductInspectionResultResponse.model_validate(new_result)
 
-    # 5️⃣ Check for duplicate inspection for same inspection_id, date, and hour
-    duplicate = db.query(models.ProductInspectionResult).filter(
-        models.ProductInspectionResult.inspection_id == payload.inspection_id,
-        models.ProductInspectionResult.inspection_date == payload.inspection_date,
-        models.ProductInspectionResult.inspection_hour == payload.inspection_hour
-    ).first()
-    if duplicate:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Duplicate inspection result detected."
-        )
-
-    # 6️⃣ Create inspection result
-    new_result = models.ProductInspectionResult(
-        **payload.model_dump(),
-        created_by=current_user.id,
-        updated_by=current_user.id
-    )
 
-    db.add(new_result)
+@router.post("/record/bulk", status_code=status.HTTP_201_CREATED)
+def create_inspection_results_bulk(
+    payload: List[schemas.ProductInspectionResultCreate],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    """
+    Record a whole shift of readings (every dimension x hour) in one call.
+    The batch is validated with one query per rule and the accepted rows are
+    inserted with a single multi-row INSERT; each row gets its own result.
+    """
     try:
+        user.get_user_status(current_user)
+        if not payload:
+            raise HTTPException(status_code=400, detail="No inspection results provided")
+        if len(payload) > inspection_fn.MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch size exceeds the limit of {inspection_fn.MAX_BATCH_SIZE} inspection results"
+            )
+
+        results = inspection_fn.write_results(db, current_user.tenant_id, current_user.id, payload)
         db.commit()
-        db.refresh(new_result)
+        inspection_fn.committed(current_user.tenant_id, [p.model_dump() for p in payload], results)
+
+        return {
+            "message": "Inspection results processed",
+            "created_count": sum(1 for r in results if r["status"] == "created"),
+            "rejected_count": sum(1 for r in results if r["status"] == "rejected"),
+            "results": results
+        }
+
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Integrity error: {str(e.orig)}")
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Database error: {str(e)}"
-        )
-
-    return new_result
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 # @router.post("/record", response_model=schemas.ProductInspectionResultResponse)
 # def create_inspection_result(
@@ -310,7 +332,10 @@ def update_result(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(oauth2.get_current_user)
 ):
-    result = db.query(models.ProductInspectionResult).filter(models.ProductInspectionResult.id == result_id).first()
+    result = db.query(models.ProductInspectionResult).filter(
+        models.ProductInspectionResult.id == result_id,
+        models.ProductInspectionResult.tenant_id == current_user.tenant_id
+    ).first()
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Result not found")
 
@@ -330,32 +355,34 @@ def update_result(
                 )
             )
 
-    # Update fields
+    # Update fields; the old reading leaves the running stats and the new one joins
+    previous = inspection_stats.snapshot(db, [result_id])
     for key, value in update_data.items():
         setattr(result, key, value)
     result.updated_by = current_user.id
 
-    # Check for duplicates if inspection_id, inspection_date, inspection_hour or shift_timingid changed
+    # Check for duplicates if inspection_id, inspection_date or inspection_hour changed
     # Prepare filters excluding current record id
     inspection_id = update_data.get("inspection_id", result.inspection_id)
     inspection_date = update_data.get("inspection_date", result.inspection_date)
-    shift_timingid = update_data.get("shift_timingid", result.shift_timingid)
 
     duplicate = db.query(models.ProductInspectionResult).filter(
         models.ProductInspectionResult.inspection_id == inspection_id,
         models.ProductInspectionResult.inspection_date == inspection_date,
         models.ProductInspectionResult.inspection_hour == inspection_hour,
-        models.ProductInspectionResult.shift_timingid == shift_timingid,
         models.ProductInspectionResult.id != result_id
     ).first()
 
     if duplicate:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Duplicate entry for this shift, date, and hour."
+            detail="Duplicate entry for this dimension, date, and hour."
         )
 
     try:
+        db.flush()
+        inspection_stats.remove_results(db, previous)
+        inspection_stats.add_results(db, [result_id])
         db.commit()
         db.refresh(result)
     except IntegrityError as e:
@@ -365,6 +392,8 @@ def update_result(
             detail=f"Database integrity error: {str(e.orig)}"
         )
 
+    spc.invalidate(current_user.tenant_id, result.inspection_id)
+    run_rules.forget(current_user.tenant_id, result.inspection_id)
     return result
 
 
@@ -379,7 +408,13 @@ def get_all_results(
 ):
     user.get_user_status(current_user)
     tenant_id = current_user.tenant_id
-    all_records = db.query(models.ProductInspectionResult).join(models.ProductInspection).join(models.ProductDrawing).join(models.Product).filter(models.Product.tenant_id == tenant_id).offset(skip).limit(limit).all()
+    # Served from ix_product_inspection_result_tenant_date, newest first
+    all_records = (
+        db.query(models.ProductInspectionResult)
+        .filter(models.ProductInspectionResult.tenant_id == tenant_id)
+        .order_by(models.ProductInspectionResult.inspection_date.desc(), models.ProductInspectionResult.id.desc())
+        .offset(skip).limit(limit).all()
+    )
     # all_records = db.query(models.ProductInspectionResult).filter(models.ProductInspectionResult.inspection.drawing.product.tenant_id == tenant_id).all()
     # return db.query(models.ProductInspectionResult).offset(skip).limit(limit).all()
     return all_records
@@ -390,7 +425,7 @@ def get_all_results(
 def get_result(result_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_user)):
     user.get_user_status(current_user)
     tenant_id = current_user.tenant_id
-    record = db.query(models.ProductInspectionResult).join(models.ProductInspection).join(models.ProductDrawing).join(models.Product).filter(models.Product.tenant_id == tenant_id).filter(models.ProductInspectionResult.id == result_id).first()
+    record = db.query(models.ProductInspectionResult).filter(models.ProductInspectionResult.tenant_id == tenant_id, models.ProductInspectionResult.id == result_id).first()
     if not record:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Result not found with id: {result_id} not belonging to this tenant {tenant_id}")
     return record
@@ -401,9 +436,13 @@ def get_result(result_id: int, db: Session = Depends(get_db), current_user: mode
 def delete_result(result_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_user)):
     user.get_user_status(current_user)
     tenant_id = current_user.tenant_id
-    record = db.query(models.ProductInspectionResult).join(models.ProductInspection).join(models.ProductDrawing).join(models.Product).filter(models.Product.tenant_id == tenant_id).filter(models.ProductInspectionResult.id == result_id).first()
+    record = db.query(models.ProductInspectionResult).filter(models.ProductInspectionResult.tenant_id == tenant_id, models.ProductInspectionResult.id == result_id).first()
     if not record:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Result not found with id: {result_id} not belonging to this tenant {tenant_id}")
+    previous = inspection_stats.snapshot(db, [result_id])
     db.delete(record)
+    db.flush()
+    inspection_stats.remove_results(db, previous)
     db.commit()
+    spc.invalidate(tenant_id, record.inspection_id)
     return  
\ No newline at end of file
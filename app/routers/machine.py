@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
 from typing import List
 from .. import models, schemas, database, oauth2
-from ..function import user,tenant,timeapp
+from ..function import user,tenant,timeapp,status_board,routing
 from ..database import get_db
 from datetime import date, time, datetime
 from psycopg2.errors import UniqueViolation
@@ -47,6 +47,8 @@ def create_machine(
         db.add(new_machine)
         db.commit()
         db.refresh(new_machine)
+        status_board.invalidate(tenant_id)
+        routing.invalidate(tenant_id)
 
         return {"message": "Machine created successfully", "machine": schemas.MachineOut.model_validate(new_machine)}
 
@@ -63,6 +65,29 @@ def create_machine(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+# ---------------- STATUS BOARD ----------------
+@router.get("/status-board", status_code=status.HTTP_200_OK, response_model=List[schemas.MachineStatusOut])
+def machine_status_board(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """
+    Latest production log per machine (mold, shift, efficiency, operator) for
+    the shop-floor board. Served from a per-tenant cache that production log
+    and machine writes invalidate; machines without any log have null fields.
+    """
+    try:
+        user.get_user_status(current_user)
+        return status_board.get_board(db, current_user.tenant_id)
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
 # ---------------- UPDATE (PUT) ----------------
 @router.put("/editmachine", status_code=status.HTTP_200_OK)
 def update_machine(
@@ -103,6 +128,8 @@ def update_machine(
         db.add(existing_machine)
         db.commit()
         db.refresh(existing_machine)
+        status_board.invalidate(tenant_id)
+        routing.invalidate(tenant_id)
 
         return {"message": "Machine updated successfully", "updated machine": schemas.MachineOut.model_validate(existing_machine)}
 
@@ -156,6 +183,8 @@ def delete_machine(
 
         db.delete(machine)
         db.commit()
+        status_board.invalidate(tenant_id)
+        routing.invalidate(tenant_id)
 
         return {"message": "Machine deleted successfully"}
 
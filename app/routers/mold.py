@@ -1,13 +1,14 @@
 import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
 from typing import List
 
 from app.function.mold import get_product_and_mold
 from .. import models, schemas, database, oauth2
-from ..function import user,tenant,timeapp
+from ..function import user,tenant,timeapp,routing
 from ..database import get_db
 from datetime import date, time, datetime
 from psycopg2.errors import UniqueViolation
@@ -33,6 +34,7 @@ def create_mold(mold: schemas.MoldCreate, db: Session = Depends(get_db), current
       db.add(new_mold)
       db.commit()
       db.refresh(new_mold)
+      routing.invalidate(tenant_id)
       return {"message": "Mold created successfully", "mold": new_mold}
     except HTTPException as he:
       raise he
@@ -79,6 +81,7 @@ def update_mold(
 
         db.commit()
         db.refresh(existing_mold)
+        routing.invalidate(tenant_id)
 
         return {
             "message": "Mold updated successfully",
@@ -132,6 +135,7 @@ def delete_mold(
 
         db.delete(existing_mold)
         db.commit()
+        routing.invalidate(tenant_id)
 
         return {
             "message": "Mold deleted successfully"
@@ -218,6 +222,7 @@ def create_product_mold(
         db.add(new_pm)
         db.commit()
         db.refresh(new_pm)
+        routing.edges_changed(tenant_id, "product_mold", added=[(product.id, mold.id)])
 
         return {
             "message": "Product-Mold created successfully",
@@ -284,12 +289,14 @@ def update_product_mold(
                 detail="This Product-Mold mapping already exists"
             )
 
+        previous = (pm.product_id, pm.mold_id)
         pm.product_id = product.id
         pm.mold_id = mold.id
         pm.updated_by = current_user.id
 
         db.commit()
         db.refresh(pm)
+        routing.edges_changed(tenant_id, "product_mold", added=[(product.id, mold.id)], removed=[previous])
 
         return schemas.ProductMoldOut(
             id=pm.id,
@@ -371,6 +378,98 @@ def list_product_molds(
         for pm in mappings
     ]
 
+# 🔹 Lifetime shot counters (kept up to date by the production log write path)
+
+def _shot_counters(db: Session, tenant_id: int, mold_id: int = None, due_threshold: int = None, limit: int = None):
+    counter = models.MoldShotCounter
+    total = func.coalesce(counter.total_shots, 0)
+    since_service = total - func.coalesce(counter.serviced_at_shots, 0)
+    query = (
+        db.query(models.Mold.id, models.Mold.mold_no, total.label("total_shots"),
+                 since_service.label("shots_since_service"), counter.serviced_at)
+        .outerjoin(counter, counter.mold_id == models.Mold.id)
+        .filter(models.Mold.tenant_id == tenant_id)
+        .order_by(total.desc(), models.Mold.id)
+    )
+    if mold_id is not None:
+        query = query.filter(models.Mold.id == mold_id)
+    if due_threshold is not None:
+        query = query.filter(since_service >= due_threshold)
+    if limit:
+        query = query.limit(limit)
+    rows = query.all()
+
+    machines = {}
+    if rows:
+        for pair in db.query(models.MoldMachineShotCounter).filter(
+            models.MoldMachineShotCounter.tenant_id == tenant_id,
+            models.MoldMachineShotCounter.mold_id.in_([r.id for r in rows])
+        ).order_by(models.MoldMachineShotCounter.total_shots.desc()):
+            machines.setdefault(pair.mold_id, []).append(
+                schemas.MoldMachineShotsOut(machine_id=pair.machine_id, total_shots=pair.total_shots)
+            )
+
+    return [
+        schemas.MoldShotCounterOut(
+            mold_id=r.id,
+            mold_no=r.mold_no,
+            total_shots=r.total_shots,
+            shots_since_service=r.shots_since_service,
+            serviced_at=r.serviced_at,
+            machines=machines.get(r.id, [])
+        )
+        for r in rows
+    ]
+
+
+@router.get("/shot-counters", response_model=list[schemas.MoldShotCounterOut])
+def list_shot_counters(
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    return _shot_counters(db, current_user.tenant_id, limit=limit)
+
+
+@router.get("/shot-counters/maintenance-due", response_model=list[schemas.MoldShotCounterOut])
+def list_maintenance_due(
+    threshold: int = Query(..., ge=1, description="Shots since the last service at which a mold is due"),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    return _shot_counters(db, current_user.tenant_id, due_threshold=threshold)
+
+
+@router.post("/shot-counters/{mold_id}/serviced", response_model=schemas.MoldShotCounterOut)
+def mark_mold_serviced(
+    mold_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    try:
+        user.get_user_status(current_user)
+        tenant.user_role_admin(current_user)
+        tenant_id = current_user.tenant_id
+        mold = db.query(models.Mold).filter(models.Mold.id == mold_id, models.Mold.tenant_id == tenant_id).first()
+        if not mold:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Mold with id {mold_id} not found")
+
+        stmt = pg_insert(models.MoldShotCounter).values(tenant_id=tenant_id, mold_id=mold_id, serviced_at=func.now())
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["mold_id"],
+            set_={"serviced_at_shots": models.MoldShotCounter.total_shots, "serviced_at": func.now()}
+        ))
+        db.commit()
+        return _shot_counters(db, tenant_id, mold_id=mold_id)[0]
+    except HTTPException as he:
+        raise he
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}")
+
+
 @router.get("/{pm_id}", response_model=schemas.ProductMoldOut)
 def get_product_mold(
     pm_id: int,
@@ -7,7 +7,7 @@ from typing import List
 
 from app.function.mold import get_product_and_mold
 from .. import models, schemas, database, oauth2
-from ..function import mold_mach, user,tenant,timeapp,mold_mach
+from ..function import mold_mach, user,tenant,timeapp,mold_mach,routing
 from ..database import get_db
 from datetime import date, time, datetime
 from psycopg2.errors import UniqueViolation
@@ -56,6 +56,7 @@ def create_mold_machine(
         db.add(new_mold_machine)
         db.commit()
         db.refresh(new_mold_machine)
+        routing.edges_changed(tenant_id, "mold_machine", added=[(mold.id, machine.id)])
 
         return {
             "message": "Mold Machine created successfully",
@@ -90,6 +91,8 @@ def update_mold_machine(
   if not mapping:
         raise HTTPException(status_code=404, detail="Mold Machine mapping not found")
 
+  previous = (mapping.mold_id, mapping.machine_id)
+
     # If updating mold
   if update_data.mold_no:
         mold = mold_mach.get_entity(db, models.Mold, current_user, "mold_no", update_data.mold_no, "Mold")
@@ -103,6 +106,10 @@ def update_mold_machine(
   mapping.updated_by = current_user.id
   db.commit()
   db.refresh(mapping)
+  routing.edges_changed(
+    current_user.tenant_id, "mold_machine",
+    added=[(mapping.mold_id, mapping.machine_id)], removed=[previous]
+  )
   return mapping
 
 
@@ -125,8 +132,10 @@ def delete_mold_machine(
   if not mapping:
     raise HTTPException(status_code=404, detail=f"Mold Machine mapping not found for tenant {current_user.tenant.tenant_name}")
 
+  removed = (mapping.mold_id, mapping.machine_id)
   db.delete(mapping)
   db.commit()
+  routing.edges_changed(tenant_id, "mold_machine", removed=[removed])
   return {"message": "Mold Machine mapping deleted successfully"}
 
 @router.get("/",status_code=status.HTTP_200_OK,response_model=List[schemas.MoldMachineOut])
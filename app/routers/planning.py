@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import schemas, oauth2
+from ..function import user, scheduler, routing
+from ..database import get_db
+
+router = APIRouter(prefix="/planning", tags=["Planning"])
+
+
+# ---------------- MOLD-MACHINE SCHEDULE ----------------
+@router.post("/schedule", status_code=status.HTTP_200_OK, response_model=schemas.ScheduleOut)
+def create_schedule(
+    payload: schemas.ScheduleRequest,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """
+    Plan which mold runs on which machine in every shift of the horizon so the
+    product demand is covered, using the ProductMold / MoldMachine routes and
+    each mold's per-shift target. Nothing is stored; the plan and its expected
+    output per product and machine are returned.
+    """
+    try:
+        user.get_user_status(current_user)
+
+        demand = defaultdict(int)
+        for item in payload.demand:
+            demand[item.product_id] += item.quantity
+
+        return scheduler.build_schedule(db, current_user.tenant_id, payload.start_date, payload.days, dict(demand))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+# ---------------- CAPACITY ----------------
+@router.get("/capacity", status_code=status.HTTP_200_OK, response_model=schemas.CapacityOut)
+def product_capacity(
+    start_date: date = Query(..., description="First day of the window"),
+    days: int = Query(7, ge=1, le=31),
+    product_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """
+    How many units of each product the routes (ProductMold -> Mold ->
+    MoldMachine) allow in the window, if the product ran alone. Served from the
+    tenant's cached routing index.
+    """
+    try:
+        user.get_user_status(current_user)
+        return routing.capacity(db, current_user.tenant_id, start_date, days, product_id)
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+# ---------------- ROUTING LOOKUPS ----------------
+@router.get("/routing/products/{product_id}/machines", response_model=List[schemas.RoutingMachineOut])
+def machines_for_product(
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """Machines that can make the product (through any of its molds)."""
+    user.get_user_status(current_user)
+    machines = routing.get_index(db, current_user.tenant_id).machines_for_product(product_id)
+    if machines is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product {product_id} not found")
+    return machines
+
+
+@router.get("/routing/machines/{machine_id}/products", response_model=List[schemas.RoutingProductOut])
+def products_for_machine(
+    machine_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """Products the machine can make (through any mold mapped to it)."""
+    user.get_user_status(current_user)
+    products = routing.get_index(db, current_user.tenant_id).products_for_machine(machine_id)
+    if products is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Machine {machine_id} not found")
+    return products
+
+
+@router.get("/routing/molds/idle", response_model=List[schemas.IdleMoldOut])
+def idle_molds(
+    day: Optional[date] = Query(None, description="Defaults to today"),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """Molds with no production log on the day."""
+    user.get_user_status(current_user)
+    return routing.idle_molds(db, current_user.tenant_id, day or date.today())
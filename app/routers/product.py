@@ -4,7 +4,7 @@ import pandas as pd
 from sqlalchemy import tuple_
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from ..function import tenant,user
+from ..function import tenant,user,routing
 from sqlalchemy import func, tuple_
 
 from .. import schemas,oauth2,models
@@ -56,6 +56,7 @@ def create_product(
         db.add(new_product)
         db.commit()
         db.refresh(new_product)
+        routing.invalidate(tenant_id)
 
         return new_product
 
@@ -116,6 +117,7 @@ def update_product(
 
         db.commit()
         db.refresh(product)
+        routing.invalidate(tenant_id)
 
         return product
         
@@ -175,6 +177,7 @@ def delete_product(
         # 3️⃣ Delete product
         db.delete(product)
         db.commit() 
+        routing.invalidate(current_user.tenant_id)
         return {"message":  "Product deleted successfully."}
   
     except HTTPException as he:
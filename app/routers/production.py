@@ -1,13 +1,13 @@
 from datetime import date, datetime
 from operator import and_
-from typing import List
-from fastapi import Response, status,HTTPException,Depends,APIRouter
-import pandas as pd
+from typing import List, Literal, Optional
+from fastapi import Header, Query, Response, status,HTTPException,Depends,APIRouter
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import ValidationError
 from sqlalchemy import tuple_
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from ..function import tenant,user
+from ..function import tenant,user,production_fn,idempotency,write_behind,oee,export_fn,pareto,utilization,gaps
 
 from .. import schemas,oauth2,models
 # from ..function import ad
@@ -23,8 +23,55 @@ router = APIRouter(
 @router.post("/production-log/")
 def create_production_log(
     payload: schemas.ProductionLogCreate,
+    on_duplicate: schemas.OnDuplicatePolicy = Query(
+        production_fn.ON_DUPLICATE_REJECT,
+        description="reject: fail on an existing tenant/date/shift/mold-machine entry, replace: overwrite it"
+    ),
+    defer: bool = Query(False, description="Acknowledge with a ticket and write in the background"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    if defer:
+        action = lambda: _defer_production_log(payload, on_duplicate, current_user)
+    else:
+        action = lambda: _create_production_log(payload, on_duplicate, db, current_user)
+
+    # A retried submission with the same Idempotency-Key gets the stored response back
+    return idempotency.run(
+        idempotency_key,
+        f"production-log:{current_user.tenant_id}:{current_user.id}",
+        {"payload": payload.model_dump(mode="json", exclude_unset=True), "on_duplicate": on_duplicate, "defer": defer},
+        action
+    )
+
+
+def _defer_production_log(payload: schemas.ProductionLogCreate, on_duplicate: str, current_user: models.User):
+    # Only structural checks here, the write-behind worker runs the full validation
+    if current_user.tenant_id != payload.tenant_id:
+        raise HTTPException(status_code=403, detail="User not allowed for this tenant")
+    if payload.log_date > date.today():
+        raise HTTPException(status_code=400, detail="Cannot create entry for future date")
+
+    ticket = write_behind.write_queue.submit(
+        "production_log",
+        current_user.tenant_id,
+        current_user.id,
+        payload.model_dump(mode="json"),
+        on_duplicate=on_duplicate
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"message": "Production log queued", "ticket_id": ticket["ticket_id"], "status": ticket["status"]}
+    )
+
+
+def _create_production_log(
+    payload: schemas.ProductionLogCreate,
+    on_duplicate: str,
+    db: Session,
+    current_user: models.User
 ):
     try:
         # -------------------
@@ -84,97 +131,124 @@ def create_production_log(
         if not mold_machine:
             raise HTTPException(status_code=400, detail="Mold and Machine are not mapped for this tenant {current_user.tenant.tenant_name}")
 
+        # Downtime reasons and defects must be the tenant's own
+        child_error = production_fn.unknown_child(payload, *production_fn.known_children(db, payload.tenant_id, [payload]))
+        if child_error:
+            raise HTTPException(status_code=404, detail=child_error)
+
+        # -------------------
+        # 5. Efficiency calculation
+        # -------------------
+        efficiency = production_fn.calculate_efficiency(payload.actual_qty, target_qty)
+
         # -------------------
-        # 5. Prevent duplicate entry
+        # 6. Insert Production Log + Downtime & Rejections (if efficiency < 95%)
+        #    in one statement / one transaction. Duplicates are resolved by
+        #    ON CONFLICT according to on_duplicate (no read first).
         # -------------------
-        existing_log = db.query(models.ProductionLog).filter(
-            models.ProductionLog.tenant_id == payload.tenant_id,
-            models.ProductionLog.log_date == payload.log_date,
-            models.ProductionLog.shift_time_id == payload.shift_id,
-            models.ProductionLog.mold_id == payload.mold_id,
-            models.ProductionLog.machine_id == payload.machine_id
-            ).first()
-        if existing_log:
+        downtimes, rejections = production_fn.child_rows(payload, payload.tenant_id, current_user.id, efficiency)
+        written = production_fn.insert_log_with_children(
+            db,
+            {
+                "tenant_id": payload.tenant_id,
+                "operator": current_user.id,
+                "shift_time_id": payload.shift_id,
+                "log_date": payload.log_date,
+                "mold_id": payload.mold_id,
+                "machine_id": payload.machine_id,
+                "actual_qty": payload.actual_qty,
+                "target_qty": target_qty,
+                "created_by": current_user.id,
+                "updated_by": current_user.id
+            },
+            downtimes,
+            rejections,
+            on_duplicate
+        )
+        if written is None:
+            db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Duplicate entry already exists for this tenant/date/shift/mold-machine"
             )
+        new_log_id, created, downtime_count, rejection_count = written
+        production_fn.after_write(db, [new_log_id])
+        db.commit()
 
-        # -------------------
-        # 6. Insert Production Log
-        # -------------------
-        new_log = models.ProductionLog(
-            tenant_id=payload.tenant_id,
-            operator=current_user.id,
-            shift_time_id=payload.shift_id,
-            log_date=payload.log_date,
-            mold_id=payload.mold_id,
-            machine_id=payload.machine_id,
-            actual_qty=payload.actual_qty,
-            target_qty=target_qty,
-            created_by=current_user.id,
-            updated_by=current_user.id
+        production_fn.committed(current_user.tenant_id, [payload.model_dump()], [{
+            "status": "created" if created else "replaced",
+            "production_log_id": new_log_id,
+            "efficiency": efficiency
+        }])
+
+        return {
+            "message": "Production log created successfully" if created else "Production log replaced successfully",
+            "production_log_id": new_log_id,
+            "efficiency": efficiency,
+            "downtime_entries": downtime_count,
+            "rejection_entries": rejection_count
+        }
+
+    except HTTPException as he:
+        raise he
+    except ValidationError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except IntegrityError as ie:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Integrity error: {str(ie.orig)}"
         )
-        db.add(new_log)
-        db.commit()
-        db.refresh(new_log)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
 
+@router.post("/production-log/batch", status_code=status.HTTP_201_CREATED)
+def create_production_logs_batch(
+    payload: List[schemas.ProductionLogCreate],
+    on_duplicate: schemas.OnDuplicatePolicy = Query(
+        production_fn.ON_DUPLICATE_REJECT,
+        description="reject: fail on an existing tenant/date/shift/mold-machine entry, replace: overwrite it"
+    ),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    try:
         # -------------------
-        # 7. Efficiency calculation
+        # 1. User validation
         # -------------------
-        efficiency = (payload.actual_qty / target_qty * 100) if target_qty else 0
+        user.get_user_status(current_user)
+        if not current_user:
+            raise HTTPException(status_code=401, detail="Unauthorized user")
+
+        if not payload:
+            raise HTTPException(status_code=400, detail="No production logs provided")
+        if len(payload) > production_fn.MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch size exceeds the limit of {production_fn.MAX_BATCH_SIZE} production logs"
+            )
 
         # -------------------
-        # 8. Bulk Insert Downtime & Rejections (if efficiency < 95%)
+        # 2. Set-based validation + insert in one transaction
         # -------------------
-        downtime_count = 0
-        rejection_count = 0
-        if efficiency < 95:
-            # Downtimes
-            if payload.downtime_entries:
-                df_downtime = pd.DataFrame([{
-                    "tenant_id": payload.tenant_id,
-                    "production_log_id": new_log.id,
-                    "downtime_id": d.reason_id,
-                    "duration_min": d.duration,
-                    "created_by": current_user.id
-                } for d in payload.downtime_entries])
-
-                df_downtime.drop_duplicates(
-                    subset=["tenant_id", "production_log_id", "downtime_id"],
-                    inplace=True
-                )
-
-                df_downtime.to_sql("production_downtime", db.bind, if_exists="append", index=False)
-
-            # Defects/Rejections
-            if payload.defect_entries:
-                df_rejection = pd.DataFrame([{
-                    "tenant_id": payload.tenant_id,
-                    "production_log_id": new_log.id,
-                    "defect_id": r.defect_type_id,
-                    "quantity": r.quantity
-                } for r in payload.defect_entries])
-
-                df_rejection.drop_duplicates(
-                    subset=["tenant_id", "production_log_id", "defect_id"],
-                    inplace=True
-                )
-
-                df_rejection.to_sql("production_rejection", db.bind, if_exists="append", index=False)
+        results = production_fn.write_batch(db, current_user.tenant_id, current_user.id, payload, on_duplicate)
+        db.commit()
+        production_fn.committed(current_user.tenant_id, [p.model_dump() for p in payload], results)
 
         return {
-            "message": "Production log created successfully",
-            "production_log_id": new_log.id,
-            "efficiency": efficiency,
-            "downtime_entries": len(payload.downtime_entries or []),
-            "rejection_entries": len(payload.defect_entries or [])
+            "message": "Production log batch processed",
+            "created_count": sum(1 for r in results if r["status"] == "created"),
+            "replaced_count": sum(1 for r in results if r["status"] == "replaced"),
+            "rejected_count": sum(1 for r in results if r["status"] == "rejected"),
+            "results": results
         }
 
     except HTTPException as he:
         raise he
-    except ValidationError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
     except IntegrityError as ie:
         db.rollback()
         raise HTTPException(
@@ -185,7 +259,258 @@ def create_production_log(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+MAX_PAGE_SIZE = 500
+
+
+def _parse_cursor(cursor: str):
+    """Cursor format is "<log_date>_<id>" of the last row on the previous page."""
+    try:
+        log_date, log_id = cursor.split("_", 1)
+        return date.fromisoformat(log_date), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/production-log", response_model=schemas.ProductionLogPage)
+def get_production_logs(
+    start_date: Optional[date] = Query(None, description="First log date (inclusive)"),
+    end_date: Optional[date] = Query(None, description="Last log date (inclusive)"),
+    machine_id: Optional[int] = Query(None),
+    mold_id: Optional[int] = Query(None),
+    shift_id: Optional[int] = Query(None, description="Shift timing ID"),
+    operator_id: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+
+    query = db.query(models.ProductionLog).filter(models.ProductionLog.tenant_id == current_user.tenant_id)
+    if start_date is not None:
+        query = query.filter(models.ProductionLog.log_date >= start_date)
+    if end_date is not None:
+        query = query.filter(models.ProductionLog.log_date <= end_date)
+    if machine_id is not None:
+        query = query.filter(models.ProductionLog.machine_id == machine_id)
+    if mold_id is not None:
+        query = query.filter(models.ProductionLog.mold_id == mold_id)
+    if shift_id is not None:
+        query = query.filter(models.ProductionLog.shift_time_id == shift_id)
+    if operator_id is not None:
+        query = query.filter(models.ProductionLog.operator == operator_id)
+    if cursor:
+        # Keyset: continue strictly after the last (log_date, id) seen
+        query = query.filter(
+            tuple_(models.ProductionLog.log_date, models.ProductionLog.id) > tuple_(*_parse_cursor(cursor))
+        )
+
+    try:
+        logs = (
+            query
+            .options(selectinload(models.ProductionLog.downtimes), selectinload(models.ProductionLog.rejections))
+            .order_by(models.ProductionLog.log_date, models.ProductionLog.id)
+            .limit(limit + 1)
+            .all()
+        )
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = f"{logs[-1].log_date.isoformat()}_{logs[-1].id}"
+
+    return schemas.ProductionLogPage(
+        items=[schemas.ProductionLogOut.model_validate(log) for log in logs],
+        next_cursor=next_cursor
+    )
+
+
+@router.get("/production-log/export")
+def export_production_logs(
+    start_date: date = Query(..., description="First log date (inclusive)"),
+    end_date: date = Query(..., description="Last log date (inclusive)"),
+    machine_id: Optional[int] = Query(None),
+    mold_id: Optional[int] = Query(None),
+    format: Literal["csv", "parquet"] = Query("csv"),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+
+    stmt = export_fn.export_statement(current_user.tenant_id, start_date, end_date, machine_id, mold_id)
+    filename = f"production_{start_date.isoformat()}_{end_date.isoformat()}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "parquet":
+        if not export_fn.parquet_available():
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Parquet export needs pyarrow installed on the server, use format=csv"
+            )
+        return StreamingResponse(export_fn.stream_parquet(stmt), media_type="application/vnd.apache.parquet", headers=headers)
+
+    return StreamingResponse(export_fn.stream_csv(stmt), media_type="text/csv", headers=headers)
+
+
+@router.get("/rollup", response_model=List[schemas.ProductionRollupOut])
+def get_production_rollup(
+    start_date: date = Query(..., description="First log date (inclusive)"),
+    end_date: date = Query(..., description="Last log date (inclusive)"),
+    machine_id: Optional[int] = Query(None),
+    mold_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    tenant_id = current_user.tenant_id
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+
+    def scoped(model):
+        query = db.query(model).filter(
+            model.tenant_id == tenant_id,
+            model.log_date.between(start_date, end_date)
+        )
+        if machine_id is not None:
+            query = query.filter(model.machine_id == machine_id)
+        if mold_id is not None:
+            query = query.filter(model.mold_id == mold_id)
+        return query
+
+    def key(row):
+        return (row.machine_id, row.mold_id, row.log_date, row.tenant_shift_id)
+
+    downtime_by_cell = {}
+    for row in scoped(models.ProductionRollupDowntime).all():
+        downtime_by_cell.setdefault(key(row), {})[row.downtime_id] = row.duration_min
+    rejection_by_cell = {}
+    for row in scoped(models.ProductionRollupRejection).all():
+        rejection_by_cell.setdefault(key(row), {})[row.defect_id] = row.quantity
+
+    cells = scoped(models.ProductionRollup).order_by(
+        models.ProductionRollup.log_date,
+        models.ProductionRollup.machine_id,
+        models.ProductionRollup.tenant_shift_id
+    ).all()
+    return [
+        schemas.ProductionRollupOut(
+            machine_id=c.machine_id,
+            mold_id=c.mold_id,
+            log_date=c.log_date,
+            tenant_shift_id=c.tenant_shift_id,
+            target_qty=c.target_qty,
+            actual_qty=c.actual_qty,
+            downtime_min=c.downtime_min,
+            rejection_qty=c.rejection_qty,
+            log_count=c.log_count,
+            efficiency=production_fn.calculate_efficiency(c.actual_qty, c.target_qty),
+            downtime_by_reason=downtime_by_cell.get(key(c), {}),
+            rejection_by_defect=rejection_by_cell.get(key(c), {})
+        )
+        for c in cells
+    ]
+
+
+@router.get("/oee", response_model=List[schemas.OeeOut])
+def get_oee(
+    start_date: date = Query(..., description="First log date (inclusive)"),
+    end_date: date = Query(..., description="Last log date (inclusive)"),
+    machine_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+
+    try:
+        return oee.compute_oee(db, current_user.tenant_id, start_date, end_date, machine_id)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/heatmap", response_model=schemas.UtilizationHeatmapOut)
+def get_utilization_heatmap(
+    week_start: date = Query(..., description="Any date in the week, the Monday of that week is used"),
+    machine_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    try:
+        return utilization.weekly_heatmap(db, current_user.tenant_id, week_start, machine_id)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/missing-entries", response_model=schemas.MissingEntriesOut)
+def get_missing_entries(
+    start_date: date = Query(..., description="First log date (inclusive)"),
+    end_date: date = Query(..., description="Last log date (inclusive), capped at today"),
+    machine_id: Optional[int] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    end_date = min(end_date, date.today())
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date (and not in the future)")
+
+    try:
+        return gaps.missing_entries(db, current_user.tenant_id, start_date, end_date, machine_id, limit)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+def _pareto_endpoint(fn, start_date, end_date, machine_id, mold_id, department_id, top_n, db, current_user):
+    user.get_user_status(current_user)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+
+    try:
+        return fn(db, current_user.tenant_id, start_date, end_date, machine_id, mold_id, department_id, top_n)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/pareto/downtime", response_model=schemas.ParetoOut)
+def get_downtime_pareto(
+    start_date: date = Query(..., description="First log date (inclusive)"),
+    end_date: date = Query(..., description="Last log date (inclusive)"),
+    machine_id: Optional[int] = Query(None),
+    mold_id: Optional[int] = Query(None),
+    department_id: Optional[int] = Query(None, description="Only downtime reasons assigned to this department"),
+    top_n: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    return _pareto_endpoint(pareto.downtime_pareto, start_date, end_date, machine_id, mold_id, department_id, top_n, db, current_user)
+
+
+@router.get("/pareto/defects", response_model=schemas.ParetoOut)
+def get_defect_pareto(
+    start_date: date = Query(..., description="First log date (inclusive)"),
+    end_date: date = Query(..., description="Last log date (inclusive)"),
+    machine_id: Optional[int] = Query(None),
+    mold_id: Optional[int] = Query(None),
+    department_id: Optional[int] = Query(None, description="Only defects assigned to this department"),
+    top_n: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    return _pareto_endpoint(pareto.defect_pareto, start_date, end_date, machine_id, mold_id, department_id, top_n, db, current_user)
+
+
 # @router.post("/production-log/")
 # def create_production_log(
 #     payload: schemas.ProductionLogCreate,
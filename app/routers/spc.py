@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import models, schemas, oauth2
+from ..function import user, spc, inspection_stats
+from ..database import get_db
+
+router = APIRouter(prefix="/spc", tags=["SPC"])
+
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 366
+
+
+# ---------------- X-BAR/R CHART AND CAPABILITY ----------------
+@router.get("/dimensions/{inspection_id}", status_code=status.HTTP_200_OK, response_model=schemas.SpcChartOut)
+def dimension_chart(
+    inspection_id: int,
+    start_date: Optional[date] = Query(None, description=f"Defaults to {DEFAULT_WINDOW_DAYS} days before end_date"),
+    end_date: Optional[date] = Query(None, description="Defaults to today"),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """
+    X-bar/R control chart and Cp/Cpk/Pp/Ppk of one inspection dimension over
+    the window. Subgroups are the readings of one shift on one date; limits
+    come from the dimension's lower/upper limit. Cached per dimension and
+    window until a reading of the dimension changes.
+    """
+    try:
+        user.get_user_status(current_user)
+
+        end_date = end_date or date.today()
+        start_date = start_date or end_date - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+        if (end_date - start_date).days >= MAX_WINDOW_DAYS:
+            raise HTTPException(status_code=400, detail=f"Window exceeds the limit of {MAX_WINDOW_DAYS} days")
+
+        chart = spc.get_chart(db, current_user.tenant_id, inspection_id, start_date, end_date)
+        if chart is None:
+            raise HTTPException(status_code=404, detail=f"Inspection {inspection_id} not found for this tenant")
+        return chart
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+# ---------------- LIFETIME STATS ----------------
+@router.get("/dimensions/{inspection_id}/lifetime", status_code=status.HTTP_200_OK, response_model=schemas.SpcLifetimeOut)
+def dimension_lifetime(
+    inspection_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """
+    Lifetime count, mean, standard deviation, extremes, yield and Cp/Cpk of
+    one dimension, read from its running stats row (kept in step by every
+    result write) instead of the raw readings.
+    """
+    try:
+        user.get_user_status(current_user)
+
+        summary = inspection_stats.lifetime(db, current_user.tenant_id, inspection_id)
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f"Inspection {inspection_id} not found for this tenant")
+        return summary
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+# ---------------- RUN-RULE ALERTS ----------------
+@router.get("/alerts", status_code=status.HTTP_200_OK, response_model=List[schemas.InspectionAlertOut])
+def list_alerts(
+    inspection_id: Optional[int] = Query(None),
+    rule: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user)
+):
+    """Newest run-rule violations first (Western Electric / Nelson, raised as readings arrive)."""
+    try:
+        user.get_user_status(current_user)
+
+        query = db.query(models.InspectionAlert).filter(models.InspectionAlert.tenant_id == current_user.tenant_id)
+        if inspection_id is not None:
+            query = query.filter(models.InspectionAlert.inspection_id == inspection_id)
+        if rule is not None:
+            query = query.filter(models.InspectionAlert.rule == rule)
+        return query.order_by(models.InspectionAlert.created_at.desc(), models.InspectionAlert.id.desc()).limit(limit).all()
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from .. import models, oauth2
+from ..function import user, write_behind
+
+router = APIRouter(prefix="/write-queue", tags=["Write Queue"])
+
+
+@router.get("/tickets/{ticket_id}", status_code=status.HTTP_200_OK)
+def get_ticket(
+    ticket_id: str,
+    current_user: models.User = Depends(oauth2.get_current_user)
+):
+    user.get_user_status(current_user)
+    ticket = write_behind.write_queue.ticket(ticket_id)
+    if not ticket or ticket["tenant_id"] != current_user.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ticket {ticket_id} not found for tenant {current_user.tenant.tenant_name}"
+        )
+    return ticket
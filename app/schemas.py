@@ -530,6 +530,11 @@ class ProductionLogCreate(ProductionLogBase):
     downtime_entries: Optional[List[DowntimeEntry]] = Field(default_factory=list, description="List of downtime entries")
     defect_entries: Optional[List[DefectEntry]] = Field(default_factory=list, description="List of defect entries")
 
+# ------------------------
+# Duplicate policy for uq_tenant_shift_date_mold_machine
+# ------------------------
+OnDuplicatePolicy = Literal["reject", "replace"]
+
 # ------------------------
 # Production Log Response Schema
 # ------------------------
@@ -539,3 +544,363 @@ class ProductionLogResponse(ProductionLogBase):
     model_config = {
         "from_attributes": True  # Allows reading from ORM/SQLAlchemy objects
     }
+
+# ------------------------
+# Production Log read schemas (log with its downtime and rejection children)
+# ------------------------
+class ProductionLogDowntimeOut(BaseModel):
+    downtime_id: int
+    duration_min: int
+
+    model_config = {"from_attributes": True}
+
+
+class ProductionLogRejectionOut(BaseModel):
+    defect_id: int
+    quantity: int
+
+    model_config = {"from_attributes": True}
+
+
+class ProductionLogOut(BaseModel):
+    id: int
+    shift_time_id: int
+    log_date: date
+    mold_id: int
+    machine_id: int
+    operator: Optional[int] = None
+    target_qty: int
+    actual_qty: int
+    created_at: datetime
+    updated_at: datetime
+    downtimes: List[ProductionLogDowntimeOut] = []
+    rejections: List[ProductionLogRejectionOut] = []
+
+    model_config = {"from_attributes": True}
+
+
+class ProductionLogPage(BaseModel):
+    items: List[ProductionLogOut]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to fetch the next page, null on the last page")
+
+# ------------------------
+# Production Rollup Schema (one cell per tenant x machine x mold x date x shift)
+# ------------------------
+class ProductionRollupOut(BaseModel):
+    machine_id: int
+    mold_id: int
+    log_date: date
+    tenant_shift_id: int
+    target_qty: int
+    actual_qty: int
+    downtime_min: int
+    rejection_qty: int
+    log_count: int
+    efficiency: float
+    downtime_by_reason: Dict[int, int] = Field(default_factory=dict, description="downtime_id -> minutes")
+    rejection_by_defect: Dict[int, int] = Field(default_factory=dict, description="defect_id -> quantity")
+
+
+# ------------------------
+# OEE Schema (one row per machine x shift over the requested date range)
+# ------------------------
+class OeeOut(BaseModel):
+    machine_id: int
+    tenant_shift_id: int
+    log_count: int
+    planned_min: float
+    downtime_min: float
+    target_qty: int
+    actual_qty: int
+    rejected_qty: int
+    availability: float
+    performance: float
+    quality: float
+    oee: float
+
+
+# ------------------------
+# Pareto Schemas (downtime reasons / defects ranked by total)
+# ------------------------
+class ParetoItem(BaseModel):
+    id: int
+    name: str
+    total: int
+    percent: float
+    cumulative_percent: float
+
+
+class ParetoOut(BaseModel):
+    grand_total: int = Field(..., description="Total over every reason in the range, not only the top N")
+    items: List[ParetoItem]
+
+
+# ------------------------
+# Mold Shot Counter Schemas
+# ------------------------
+class MoldMachineShotsOut(BaseModel):
+    machine_id: int
+    total_shots: int
+
+
+class MoldShotCounterOut(BaseModel):
+    mold_id: int
+    mold_no: str
+    total_shots: int
+    shots_since_service: int
+    serviced_at: Optional[datetime] = None
+    machines: List[MoldMachineShotsOut] = []
+
+
+# ------------------------
+# Utilization Heatmap Schema (machines x 168 hours of the week, Monday 00:00 first)
+# ------------------------
+class UtilizationHeatmapOut(BaseModel):
+    week_start: date
+    machine_ids: List[int]
+    machine_codes: List[str]
+    utilization: List[List[Optional[float]]] = Field(..., description="actual / target per machine and hour, null when nothing was planned")
+    downtime_min: List[List[float]]
+
+
+# ------------------------
+# Missing Production Log (compliance gap) Schemas
+# ------------------------
+class MissingEntry(BaseModel):
+    log_date: date
+    shift_time_id: int
+    tenant_shift_id: int
+    mold_id: int
+    machine_id: int
+
+
+class MissingEntriesOut(BaseModel):
+    total_missing: int = Field(..., description="All missing cells in the range, items holds at most limit of them")
+    items: List[MissingEntry]
+
+
+# ------------------------
+# Machine Status Board Schema (latest production log per machine)
+# ------------------------
+class MachineStatusOut(BaseModel):
+    machine_id: int
+    machine_code: str
+    mold_id: Optional[int] = None
+    mold_no: Optional[str] = None
+    log_date: Optional[date] = None
+    shift_time_id: Optional[int] = None
+    tenant_shift_id: Optional[int] = None
+    shift_name: Optional[str] = None
+    actual_qty: Optional[int] = None
+    target_qty: Optional[int] = None
+    efficiency: Optional[float] = None
+    operator_id: Optional[int] = None
+    operator_name: Optional[str] = None
+
+
+# ------------------------
+# Mold-Machine Schedule Schemas (plan for the next days from product demand)
+# ------------------------
+class ScheduleDemand(BaseModel):
+    product_id: int
+    quantity: conint(gt=0)
+
+
+class ScheduleRequest(BaseModel):
+    start_date: date
+    days: conint(ge=1, le=31) = 7
+    demand: conlist(ScheduleDemand, min_length=1, max_length=1000)
+
+
+class ScheduleAssignment(BaseModel):
+    machine_id: int
+    machine_code: str
+    mold_id: int
+    mold_no: str
+    product_id: int
+    log_date: date
+    shift_time_id: int
+    tenant_shift_id: int
+    hours: float
+    expected_qty: int
+
+
+class ScheduleProduct(BaseModel):
+    product_id: int
+    product_no: str
+    demand_qty: int
+    expected_qty: int
+    unmet_qty: int
+
+
+class ScheduleMachine(BaseModel):
+    machine_id: int
+    machine_code: str
+    planned_hours: float
+    available_hours: float
+    utilization: float
+    changeovers: int
+
+
+class ScheduleOut(BaseModel):
+    start_date: date
+    end_date: date
+    demand_qty: int
+    planned_qty: int = Field(..., description="Expected output counted up to each product's demand")
+    unmet_qty: int
+    changeovers: int
+    products: List[ScheduleProduct]
+    machines: List[ScheduleMachine]
+    assignments: List[ScheduleAssignment]
+
+
+# ------------------------
+# Capacity Schemas (units per product over a window, from product -> mold -> machine routes)
+# ------------------------
+class CapacityProduct(BaseModel):
+    product_id: int
+    product_no: str
+    molds: int = Field(..., description="Molds of the product that fit at least one machine")
+    machines: int = Field(..., description="Machines reachable through those molds")
+    units_per_shift: int
+    capacity_qty: int
+
+
+class CapacityOut(BaseModel):
+    start_date: date
+    end_date: date
+    shifts: int
+    shift_hours: float
+    products: List[CapacityProduct]
+
+
+# ------------------------
+# Routing Index Schemas (product <-> mold <-> machine lookups)
+# ------------------------
+class RoutingMachineOut(BaseModel):
+    machine_id: int
+    machine_code: str
+    mold_ids: List[int] = Field(..., description="Molds of the product that fit this machine")
+
+
+class RoutingProductOut(BaseModel):
+    product_id: int
+    product_no: str
+    mold_ids: List[int] = Field(..., description="Molds of this product that fit the machine")
+
+
+class IdleMoldOut(BaseModel):
+    mold_id: int
+    mold_no: str
+    machines: int
+    products: int
+
+
+# ------------------------
+# Data Quality Scanner Schemas
+# ------------------------
+class DataQualityScanCreate(BaseModel):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+class DataQualityScanOut(BaseModel):
+    id: int
+    start_date: Optional[date]
+    end_date: Optional[date]
+    status: str
+    scanned_logs: int
+    finding_count: int
+    error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class DataQualityFindingOut(BaseModel):
+    production_log_id: int
+    log_date: date
+    rule: str
+    value: float
+    limit: float
+    scan_id: Optional[int]
+    created_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+# ------------------------
+# SPC Schemas (X-bar/R and capability per inspection dimension)
+# ------------------------
+class SpcSubgroupOut(BaseModel):
+    inspection_date: date
+    shift_timingid: int
+    size: int
+    mean: float
+    range: float
+    x_lcl: float
+    x_ucl: float
+    r_lcl: float
+    r_ucl: float
+    out_of_control: bool
+
+
+class SpcChartOut(BaseModel):
+    inspection_id: int
+    dimension_name: str
+    lower_limit: Optional[float]
+    upper_limit: Optional[float]
+    start_date: date
+    end_date: date
+    readings: int
+    subgroup_count: int
+    grand_mean: Optional[float]
+    mean_range: Optional[float]
+    sigma_within: Optional[float]
+    sigma_overall: Optional[float]
+    cp: Optional[float]
+    cpk: Optional[float]
+    pp: Optional[float]
+    ppk: Optional[float]
+    out_of_control_count: int
+    subgroups: List[SpcSubgroupOut]
+
+
+class SpcLifetimeOut(BaseModel):
+    inspection_id: int
+    dimension_name: str
+    lower_limit: Optional[float]
+    upper_limit: Optional[float]
+    readings: int
+    measured_readings: int
+    mean: Optional[float]
+    std_dev: Optional[float]
+    min_value: Optional[float]
+    max_value: Optional[float]
+    out_of_tolerance: int
+    yield_rate: Optional[float] = Field(None, description="Share of readings within tolerance (and not no-go)")
+    cp: Optional[float] = Field(None, description="From the lifetime standard deviation (long-term, Pp in AIAG terms)")
+    cpk: Optional[float] = Field(None, description="From the lifetime standard deviation (long-term, Ppk in AIAG terms)")
+    updated_at: Optional[datetime]
+
+
+class InspectionAlertOut(BaseModel):
+    id: int
+    inspection_id: int
+    result_id: int
+    inspection_date: date
+    inspection_hour: int
+    rule: str
+    measured_value: float
+    center: float
+    sigma: float
+    created_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
@@ -0,0 +1,164 @@
+import argparse
+from datetime import date
+
+from app.database import SessionLocal
+from app import models
+from app.function import data_quality, inspection_fn, inspection_stats, partitions, rollup, shot_counter
+
+
+def rebuild_rollups(args):
+    db = SessionLocal()
+    try:
+        rollup.rebuild(db, args.tenant_id)
+        db.commit()
+        print("Production rollups rebuilt" + (f" for tenant {args.tenant_id}" if args.tenant_id else ""))
+    finally:
+        db.close()
+
+
+def rebuild_shot_counters(args):
+    db = SessionLocal()
+    try:
+        shot_counter.rebuild(db, args.tenant_id)
+        db.commit()
+        print("Mold shot counters rebuilt" + (f" for tenant {args.tenant_id}" if args.tenant_id else ""))
+    finally:
+        db.close()
+
+
+def rebuild_inspection_stats(args):
+    db = SessionLocal()
+    try:
+        inspection_stats.rebuild(db, args.tenant_id, args.inspection_id)
+        db.commit()
+        print("Inspection running stats rebuilt" + (f" for tenant {args.tenant_id}" if args.tenant_id else "")
+              + (f" for inspection {args.inspection_id}" if args.inspection_id else ""))
+    finally:
+        db.close()
+
+
+def maintain_partitions(args):
+    db = SessionLocal()
+    try:
+        result = partitions.maintain(db, args.months_ahead, args.retain_months)
+        db.commit()
+        print(f"Created {len(result['created'])} partition(s): {', '.join(result['created']) or '-'}")
+        print(f"Detached {len(result['detached'])} partition(s): {', '.join(result['detached']) or '-'}")
+    finally:
+        db.close()
+
+
+def partition_production_log(args):
+    db = SessionLocal()
+    try:
+        if partitions.convert_existing(db, args.months_ahead):
+            db.commit()
+            print("production_log, production_downtime and production_rejection are now partitioned by log_date")
+        else:
+            print("production_log is already partitioned, nothing to do")
+    finally:
+        db.close()
+
+
+def scan_data_quality(args):
+    db = SessionLocal()
+    try:
+        tenant_ids = [args.tenant_id] if args.tenant_id else [t.id for t in db.query(models.Tenant.id).order_by(models.Tenant.id)]
+        for tenant_id in tenant_ids:
+            try:
+                scan = data_quality.start_scan(db, tenant_id, None, args.start_date, args.end_date)
+            except ValueError as e:
+                print(f"Tenant {tenant_id}: skipped, {e}")
+                continue
+            data_quality.run_scan(scan.id)
+            db.refresh(scan)
+            print(f"Tenant {tenant_id}: {scan.status}, {scan.scanned_logs} log(s) scanned, {scan.finding_count} finding(s)")
+    finally:
+        db.close()
+
+
+def per_dimension_inspection_keys(args):
+    db = SessionLocal()
+    try:
+        if inspection_fn.use_per_dimension_keys(db):
+            db.commit()
+            print("product_inspection_result is now unique per inspection, date and hour")
+        else:
+            print("product_inspection_result already uses the per-dimension key, nothing to do")
+    finally:
+        db.close()
+
+
+def denormalize_inspection_tenant(args):
+    db = SessionLocal()
+    try:
+        backfilled = inspection_fn.denormalize_tenant(db, args.batch_size)
+        print(f"product_inspection and product_inspection_result carry tenant_id; {backfilled} result(s) backfilled")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("rebuild-rollups", help="Recompute the production rollup tables from production_log")
+    cmd.add_argument("--tenant-id", type=int, default=None)
+    cmd.set_defaults(func=rebuild_rollups)
+
+    cmd = commands.add_parser("rebuild-shot-counters", help="Recompute the mold shot counters from production_log")
+    cmd.add_argument("--tenant-id", type=int, default=None)
+    cmd.set_defaults(func=rebuild_shot_counters)
+
+    cmd = commands.add_parser(
+        "rebuild-inspection-stats",
+        help="Recompute the per-dimension running inspection stats from product_inspection_result"
+    )
+    cmd.add_argument("--tenant-id", type=int, default=None)
+    cmd.add_argument("--inspection-id", type=int, default=None)
+    cmd.set_defaults(func=rebuild_inspection_stats)
+
+    cmd = commands.add_parser(
+        "maintain-partitions",
+        help="Create upcoming monthly production_log partitions and optionally detach old ones"
+    )
+    cmd.add_argument("--months-ahead", type=int, default=partitions.DEFAULT_MONTHS_AHEAD)
+    cmd.add_argument("--retain-months", type=int, default=None,
+                     help="Detach partitions that ended more than this many months ago")
+    cmd.set_defaults(func=maintain_partitions)
+
+    cmd = commands.add_parser(
+        "partition-production-log",
+        help="One-off: convert the plain production tables to monthly partitions (takes exclusive locks)"
+    )
+    cmd.add_argument("--months-ahead", type=int, default=partitions.DEFAULT_MONTHS_AHEAD)
+    cmd.set_defaults(func=partition_production_log)
+
+    cmd = commands.add_parser(
+        "scan-data-quality",
+        help="Check production logs against the data quality rules and store the findings (schedule via cron)"
+    )
+    cmd.add_argument("--tenant-id", type=int, default=None)
+    cmd.add_argument("--start-date", type=date.fromisoformat, default=None)
+    cmd.add_argument("--end-date", type=date.fromisoformat, default=None)
+    cmd.set_defaults(func=scan_data_quality)
+
+    cmd = commands.add_parser(
+        "per-dimension-inspection-keys",
+        help="One-off: make inspection results unique per dimension and hour instead of per shift hour"
+    )
+    cmd.set_defaults(func=per_dimension_inspection_keys)
+
+    cmd = commands.add_parser(
+        "denormalize-inspection-tenant",
+        help="One-off: add and backfill tenant_id/drawing_id on the inspection tables, then index them"
+    )
+    cmd.add_argument("--batch-size", type=int, default=inspection_fn.BACKFILL_BATCH_SIZE)
+    cmd.set_defaults(func=denormalize_inspection_tenant)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import math
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import models
+from app.function import inspection_stats, run_rules, spc
+
+DAY = date(2026, 9, 1)
+
+
+def _chart(groups, lower=9.5, upper=11.0):
+    """spc.compute over subgroups given as lists of readings, one date each."""
+    dates, shifts, values = [], [], []
+    for n, readings in enumerate(groups):
+        dates += [DAY + timedelta(days=n)] * len(readings)
+        shifts += [1] * len(readings)
+        values += readings
+    return spc.compute(dates, shifts, values, lower, upper)
+
+
+# spc.compute
+
+def test_compute_two_subgroups_of_five():
+    a = [10.0, 10.2, 9.8, 10.1, 9.9]
+    b = [10.3, 10.5, 10.1, 10.4, 10.2]
+    chart = _chart([a, b])
+
+    sigma = 0.4 / 2.326  # both ranges are 0.4, d2(5) = 2.326
+    everything = np.array(a + b)
+    assert chart["readings"] == 10
+    assert chart["subgroup_count"] == 2
+    assert chart["grand_mean"] == pytest.approx(10.15)
+    assert chart["mean_range"] == pytest.approx(0.4)
+    assert chart["sigma_within"] == pytest.approx(sigma, abs=1e-6)
+    assert chart["sigma_overall"] == pytest.approx(everything.std(ddof=1), abs=1e-6)
+    assert chart["cp"] == pytest.approx(1.5 / (6 * sigma), abs=1e-4)
+    assert chart["cpk"] == pytest.approx(0.65 / (3 * sigma), abs=1e-4)
+    assert chart["pp"] == pytest.approx(1.5 / (6 * everything.std(ddof=1)), abs=1e-4)
+
+    first, second = chart["subgroups"]
+    assert (first["size"], first["mean"], first["range"]) == (5, pytest.approx(10.0), pytest.approx(0.4))
+    assert second["mean"] == pytest.approx(10.3)
+    assert first["x_ucl"] == pytest.approx(10.15 + 3 * sigma / math.sqrt(5), abs=1e-6)
+    assert first["x_lcl"] == pytest.approx(10.15 - 3 * sigma / math.sqrt(5), abs=1e-6)
+    assert first["r_lcl"] == 0
+    assert first["r_ucl"] == pytest.approx(2.114 * 0.4, abs=1e-6)
+    assert chart["out_of_control_count"] == 0
+
+
+def test_compute_limits_per_subgroup_size():
+    chart = _chart([[10.0, 10.2], [10.1, 10.4, 10.0]])
+
+    sigma = (0.2 / 1.128 + 0.4 / 1.693) / 2
+    two, three = chart["subgroups"]
+    assert chart["sigma_within"] == pytest.approx(sigma, abs=1e-6)
+    assert two["x_ucl"] - two["x_lcl"] == pytest.approx(6 * sigma / math.sqrt(2), abs=1e-5)
+    assert three["x_ucl"] - three["x_lcl"] == pytest.approx(6 * sigma / math.sqrt(3), abs=1e-5)
+    assert two["r_ucl"] == pytest.approx(3.267 * 1.128 * sigma, abs=1e-5)
+    assert three["r_ucl"] == pytest.approx(2.574 * 1.693 * sigma, abs=1e-5)
+
+
+def test_compute_flags_out_of_control_subgroup():
+    chart = _chart([[10.0, 10.1, 9.9]] * 4 + [[11.0, 11.1, 10.9]])
+    assert [s["out_of_control"] for s in chart["subgroups"]] == [False] * 4 + [True]
+    assert chart["out_of_control_count"] == 1
+
+
+def test_compute_without_readings():
+    chart = spc.compute([], [], [], 9.5, 11.0)
+    assert chart["readings"] == 0
+    assert chart["subgroups"] == []
+    assert chart["grand_mean"] is None
+    assert chart["mean_range"] is None
+    assert chart["sigma_within"] is None and chart["sigma_overall"] is None
+    assert chart["cp"] is None and chart["pp"] is None
+
+
+def test_compute_single_reading_has_no_subgroup_or_capability():
+    chart = spc.compute([DAY], [1], [10.2], 9.5, 11.0)
+    assert chart["readings"] == 1
+    assert chart["subgroup_count"] == 0
+    assert chart["grand_mean"] == pytest.approx(10.2)
+    assert chart["sigma_within"] is None and chart["sigma_overall"] is None
+    assert chart["cpk"] is None and chart["ppk"] is None
+
+
+# run_rules.violations: rules fire once, when a run reaches its length
+
+def _fires(z):
+    return run_rules.violations(np.array(z, dtype=np.float64))
+
+
+def test_beyond_3_sigma():
+    assert _fires([0, 0, 3.5]) == [run_rules.RULE_BEYOND_3_SIGMA]
+    assert _fires([0, 0, -3.5]) == [run_rules.RULE_BEYOND_3_SIGMA]
+
+
+def test_2_of_3_beyond_2_sigma():
+    assert _fires([0, 2.5, 0.5, 2.2]) == [run_rules.RULE_2_OF_3_BEYOND_2_SIGMA]
+    assert run_rules.RULE_2_OF_3_BEYOND_2_SIGMA not in _fires([0, 2.5, 0.5, -2.2])
+
+
+def test_4_of_5_beyond_1_sigma():
+    assert _fires([0, 1.5, 1.2, 0.5, 1.1, 1.3]) == [run_rules.RULE_4_OF_5_BEYOND_1_SIGMA]
+
+
+def test_7_on_one_side_fires_once():
+    assert _fires([-1] + [0.5] * 7) == [run_rules.RULE_7_ON_ONE_SIDE]
+    assert _fires([-1] + [0.5] * 8) == []
+
+
+def test_6_trending_fires_once():
+    assert _fires([-1, 0, 0.1, 0.2, 0.3, 0.4]) == [run_rules.RULE_6_TRENDING]
+    assert _fires([-1, 0, 0.1, 0.2, 0.3, 0.4, 0.5]) == []
+
+
+def test_14_alternating_fires_once():
+    alternating = [(-1) ** i * 0.5 for i in range(15)]
+    assert run_rules.RULE_14_ALTERNATING in _fires(alternating[:14])
+    assert run_rules.RULE_14_ALTERNATING not in _fires(alternating)
+
+
+def test_15_within_1_sigma_fires_once():
+    calm = [0.1 * (-1) ** i * (i % 3) for i in range(16)]
+    assert _fires([2] + calm[:15]) == [run_rules.RULE_15_WITHIN_1_SIGMA]
+    assert _fires([2] + calm) == []
+
+
+def test_8_beyond_1_sigma_needs_both_sides():
+    both_sides = [1.5 * (-1) ** (i // 3) for i in range(8)]
+    assert _fires([0] + both_sides) == [run_rules.RULE_8_BEYOND_1_SIGMA]
+    assert run_rules.RULE_8_BEYOND_1_SIGMA not in _fires([0] + [1.5] * 8)
+
+
+def test_baseline_takes_the_batch_back_out():
+    rng = np.random.default_rng(7)
+    before, batch = rng.normal(10, 0.1, 40), [10.4, 9.7]
+    merged = np.concatenate([before, batch])
+    stats = SimpleNamespace(value_count=len(merged), mean=merged.mean(), m2=merged.var() * len(merged))
+
+    count, center, sigma = run_rules._baseline(stats, batch)
+    assert count == 40
+    assert center == pytest.approx(before.mean())
+    assert sigma == pytest.approx(before.std(ddof=1))
+
+
+# inspection_stats: incremental updates match a rebuild from the raw results
+
+def _dimension(db):
+    tenant = models.Tenant(tenant_name="Stats", tenant_code="stats", address="-", is_verified=True)
+    db.add(tenant)
+    db.flush()
+    product = models.Product(tenant_id=tenant.id, product_name="P", product_no="P1")
+    db.add(product)
+    db.flush()
+    drawing = models.ProductDrawing(product_id=product.id, drawing_no="D1")
+    db.add(drawing)
+    db.flush()
+    inspection = models.ProductInspection(
+        drawing_id=drawing.id, tenant_id=tenant.id, dimension_name="length",
+        inspection_type="dimensional", lower_limit=9.8, upper_limit=10.2
+    )
+    db.add(inspection)
+    db.flush()
+    return inspection
+
+
+def _add(db, inspection, values, start_hour=0):
+    rows = [
+        models.ProductInspectionResult(
+            inspection_id=inspection.id, tenant_id=inspection.tenant_id, drawing_id=inspection.drawing_id,
+            measured_value=value, go_no_go=True if value is None else None,
+            inspection_date=DAY + timedelta(days=(start_hour + n) // 24), inspection_hour=(start_hour + n) % 24
+        )
+        for n, value in enumerate(values)
+    ]
+    db.add_all(rows)
+    db.flush()
+    inspection_stats.add_results(db, [r.id for r in rows])
+    return rows
+
+
+def _stats(db, inspection):
+    db.expire_all()
+    row = db.get(models.InspectionStats, inspection.id)
+    return {c: getattr(row, c) for c in inspection_stats.COLUMNS[2:]}
+
+
+def _assert_matches_rebuild(db, inspection):
+    incremental = _stats(db, inspection)
+    inspection_stats.rebuild(db, inspection_id=inspection.id)
+    rebuilt = _stats(db, inspection)
+    assert incremental == {c: pytest.approx(v, abs=1e-9) for c, v in rebuilt.items()}
+
+
+def test_stats_match_rebuild_after_inserts_and_deletes(db):
+    inspection = _dimension(db)
+    rng = np.random.default_rng(11)
+    first = _add(db, inspection, rng.normal(10, 0.1, 30).tolist() + [None, 9.5])
+    second = _add(db, inspection, rng.normal(10.05, 0.1, 25).tolist() + [10.6], start_hour=40)
+    _assert_matches_rebuild(db, inspection)
+
+    # the removed readings include both extremes and a gauge-only result
+    gone = [first[-1], second[-1], first[-2], first[0], second[3]]
+    parts = inspection_stats.snapshot(db, [r.id for r in gone])
+    for r in gone:
+        db.delete(r)
+    db.flush()
+    inspection_stats.remove_results(db, parts)
+    _assert_matches_rebuild(db, inspection)
+
+
+def test_stats_match_rebuild_after_edit(db):
+    inspection = _dimension(db)
+    rows = _add(db, inspection, [10.0, 10.1, 9.9, 10.05, 9.95])
+
+    parts = inspection_stats.snapshot(db, [rows[1].id])
+    rows[1].measured_value = 10.7
+    db.flush()
+    inspection_stats.remove_results(db, parts)
+    inspection_stats.add_results(db, [rows[1].id])
+    _assert_matches_rebuild(db, inspection)
+
+
+def test_stats_empty_after_every_reading_is_removed(db):
+    inspection = _dimension(db)
+    rows = _add(db, inspection, [10.0, 10.3])
+
+    parts = inspection_stats.snapshot(db, [r.id for r in rows])
+    for r in rows:
+        db.delete(r)
+    db.flush()
+    inspection_stats.remove_results(db, parts)
+    stats = _stats(db, inspection)
+    assert (stats["reading_count"], stats["value_count"], stats["mean"], stats["m2"]) == (0, 0, 0.0, 0.0)
+    assert stats["min_value"] is None and stats["max_value"] is None